@@ -0,0 +1,59 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView dont les méthodes (get, patch...) sont des coroutines : sous ASGI, la
+    requête n'occupe aucun thread pendant les lectures en base (ORM asynchrone).
+    L'authentification passe par aauthenticate quand la classe la fournit
+    (authentication.py), sinon par un thread ; permissions, négociation et rendu
+    sont ceux de DRF, sans E/S. Toutes les méthodes d'une vue doivent être
+    asynchrones (contrainte de Django). Sous WSGI, Django exécute la vue dans une
+    boucle par requête : même comportement, sans gain.
+    """
+
+    async def perform_async_authentication(self, request):
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth = await authenticator.aauthenticate(request)
+                else:
+                    user_auth = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+        request._not_authenticated()
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.perform_async_authentication(request)
+            self.initial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        # Rendu dans la boucle : Django n'a plus à le confier à un thread
+        if hasattr(self.response, 'render'):
+            self.response.render()
+        return self.response
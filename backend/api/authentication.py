@@ -0,0 +1,216 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import UserProfile
+
+# Caches propres à chaque processus : l'invalidation (receivers.py) n'atteint que le
+# worker qui a fait l'écriture, les autres gardent l'ancien rôle jusqu'à l'expiration
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+PROCESS_LOCAL_ROLE_TIMEOUT = 5
+
+# État d'un utilisateur qui conditionne ses autorisations, mis en cache par utilisateur
+Role = namedtuple('Role', ('version', 'is_admin', 'is_staff', 'is_active'))
+
+
+def role_cache_timeout():
+    """
+    Durée de vie (s) d'un rôle en cache : ROLE_CACHE_TIMEOUT avec un cache partagé
+    (Redis, Memcached...), au plus PROCESS_LOCAL_ROLE_TIMEOUT avec un cache local à
+    chaque worker, pour qu'un admin rétrogradé perde ses droits partout en quelques
+    secondes et non à l'expiration.
+    """
+    timeout = getattr(settings, 'ROLE_CACHE_TIMEOUT', 24 * 3600)
+    if settings.CACHES.get('default', {}).get('BACKEND') in PROCESS_LOCAL_CACHES:
+        return min(timeout, PROCESS_LOCAL_ROLE_TIMEOUT)
+    return timeout
+
+
+def _role_key(user_id):
+    return f'role:{user_id}'
+
+
+def remember_role(profile, user=None):
+    user = user or profile.user
+    role = Role(profile.role_version, profile.is_admin, user.is_staff, user.is_active)
+    cache.set(_role_key(profile.user_id), tuple(role), role_cache_timeout())
+
+
+def forget_role(user_id):
+    cache.delete(_role_key(user_id))
+
+
+def cached_role(user_id):
+    role = cache.get(_role_key(user_id))
+    return Role(*role) if role is not None else None
+
+
+def current_role(user_id):
+    """Role courant d'un utilisateur : cache, sinon une requête."""
+    role = cached_role(user_id)
+    if role is None:
+        values = UserProfile.objects.filter(user_id=user_id).values_list(
+            'role_version', 'is_admin', 'user__is_staff', 'user__is_active'
+        ).first()
+        if values is None:
+            return None
+        role = Role(*values)
+        cache.set(_role_key(user_id), tuple(role), role_cache_timeout())
+    return role
+
+
+def tokens_for_user(user, profile=None):
+    """
+    Jetons JWT portant l'identité (username, is_staff) et le rôle (is_admin et
+    sa version), vérifiés par JWTRoleAuthentication et StatelessJWTAuthentication.
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.get_username()
+    refresh['is_staff'] = user.is_staff
+    if profile is None:
+        try:
+            profile = user.profile
+        except ObjectDoesNotExist:
+            pass
+    if profile is not None:
+        refresh['is_admin'] = profile.is_admin
+        refresh['role_version'] = profile.role_version
+        remember_role(profile, user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+class JWTRoleAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication qui résout le rôle une fois par requête, sans lire le profil :
+    le rôle du jeton est retenu si sa version est toujours la version en cache,
+    sinon le rôle courant du cache l'emporte. Le résultat est posé sur
+    user.token_role, lu par permissions.user_is_admin.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None:
+            return None
+        user, token = result
+        role = current_role(user.pk)
+        if role is not None:
+            is_admin = role.is_admin
+            if token.get('role_version') == role.version:
+                is_admin = bool(token.get('is_admin'))
+            user.token_role = is_admin
+        return user, token
+
+    def header_token(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return self.get_validated_token(raw_token)
+
+    async def aauthenticate(self, request):
+        """
+        Équivalent asynchrone (vues de asynchronous.py) : l'utilisateur et son profil
+        sont lus en une requête par l'ORM asynchrone, le rôle est celui du profil.
+        """
+        token = self.header_token(request)
+        if token is None:
+            return None
+        try:
+            user_id = token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        try:
+            user = await self.user_model.objects.select_related('profile').aget(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        try:
+            user.token_role = user.profile.is_admin
+        except ObjectDoesNotExist:
+            pass
+        return user, token
+
+
+class ClaimsUser(TokenUser):
+    """Utilisateur construit depuis les claims du jeton (id, username, is_staff, is_admin)."""
+
+    def __init__(self, token):
+        super().__init__(token)
+        self.token_role = bool(token.get('is_admin'))
+
+
+class StatelessJWTAuthentication(JWTRoleAuthentication):
+    """
+    Voie rapide pour les vues de lecture (catalogue, recherche) : sur GET/HEAD/OPTIONS,
+    l'utilisateur est un ClaimsUser construit depuis le jeton, sans requête, si le
+    cache confirme que le jeton est à jour (même version de rôle, is_admin et
+    is_staff, compte actif). Sinon, et pour toute écriture, l'utilisateur est lu en
+    base comme avec JWTRoleAuthentication.
+
+    request.user n'est alors pas une instance de User : réservé aux vues qui ne
+    l'utilisent que pour les permissions.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def claims_user(self, token):
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        role = cached_role(user_id) if user_id is not None else None
+        claims = Role(token.get('role_version'), token.get('is_admin'), token.get('is_staff'), True)
+        if role is None or role != claims:
+            return None
+        return ClaimsUser(token)
+
+    def authenticate(self, request):
+        if request.method not in self.SAFE_METHODS:
+            return super().authenticate(request)
+        token = self.header_token(request)
+        if token is None:
+            return None
+        user = self.claims_user(token)
+        if user is None:
+            return super().authenticate(request)
+        return user, token
+
+    async def aauthenticate(self, request):
+        if request.method not in self.SAFE_METHODS:
+            return await super().aauthenticate(request)
+        token = self.header_token(request)
+        if token is None:
+            return None
+        user = self.claims_user(token)
+        if user is None:
+            return await super().aauthenticate(request)
+        return user, token
+
+
+class QueryTokenAuthentication(StatelessJWTAuthentication):
+    """
+    StatelessJWTAuthentication qui accepte aussi le jeton d'accès en paramètre
+    `token`, pour les flux EventSource (le navigateur n'y envoie pas d'en-tête).
+    Vues asynchrones seulement (aauthenticate).
+    """
+
+    def header_token(self, request):
+        token = super().header_token(request)
+        if token is None and request.query_params.get('token'):
+            token = self.get_validated_token(request.query_params['token'].encode())
+        return token
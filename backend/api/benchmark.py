@@ -0,0 +1,345 @@
+"""
+Banc d'essai de l'API : jeu de données réaliste et scénarios joués par le client
+de test Django (commande benchmark_api). Chaque requête passe par tous les
+middlewares, l'authentification JWT et les vues, comme en production.
+
+run_concurrent compare les deux interfaces de Django sur les vues asynchrones :
+WSGI (client de test, un thread par connexion simultanée) et ASGI (AsyncClient,
+une boucle pour toutes). Le client de test ne passe pas par le réseau : la
+comparaison porte sur le coût du traitement et sa tenue sous concurrence.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.utils import timezone
+
+from .authentication import tokens_for_user
+from .instrumentation import QueryRecorder, percentile
+from .models import Bus, Location, Reservation, Route, Schedule, UserProfile
+from .seats import mask, to_bytes, to_int
+
+CITIES = [
+    'Casablanca', 'Rabat', 'Marrakech', 'Fès', 'Tanger', 'Agadir', 'Meknès', 'Oujda',
+    'Kénitra', 'Tétouan', 'Safi', 'El Jadida', 'Nador', 'Béni Mellal', 'Essaouira', 'Ouarzazate',
+]
+
+BATCH_SIZE = 5000
+
+
+def seed(rng, locations=32, buses=200, routes=120, schedules=50_000, users=2000,
+         reservations=100_000, days=60):
+    """
+    Remplit la base : gares réparties sur CITIES, trajets entre villes, horaires
+    à venir sur `days` jours, clients et réservations (places décomptées des horaires).
+    Retourne les villes desservies par au moins un trajet, pour les scénarios.
+    """
+    stations = Location.objects.bulk_create([
+        Location(city=CITIES[i % len(CITIES)], address=f'Gare routière {i}') for i in range(locations)
+    ])
+    fleet = Bus.objects.bulk_create([
+        Bus(plate_number=f'BENCH-{i}', capacity=rng.choice((30, 50, 60)), model=rng.choice(('Irizar', 'Setra', 'Volvo')))
+        for i in range(buses)
+    ])
+    network = []
+    while len(network) < routes:
+        departure, arrival = rng.sample(stations, 2)
+        if departure.city == arrival.city:
+            continue
+        duration = rng.randrange(45, 600)
+        network.append(Route(
+            name=f'{departure.city} - {arrival.city}',
+            departure_location=departure,
+            arrival_location=arrival,
+            distance=Decimal(duration),
+            duration=duration,
+            price=Decimal(rng.randrange(40, 400)),
+        ))
+    network = Route.objects.bulk_create(network)
+
+    # Les réservations sont tirées avant l'insertion pour écrire des places cohérentes
+    origin = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    planned = []
+    for _ in range(schedules):
+        route, bus = rng.choice(network), rng.choice(fleet)
+        departure_time = origin + timedelta(minutes=5 * rng.randrange(days * 24 * 12))
+        planned.append(Schedule(
+            bus=bus,
+            departure_location=route.departure_location,
+            arrival_location=route.arrival_location,
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(minutes=route.duration),
+            price=route.price,
+            available_seats=bus.capacity,
+        ))
+    bookings = []
+    for _ in range(reservations):
+        schedule = rng.choice(planned)
+        seats = min(rng.choice((1, 1, 1, 2, 2, 3, 4)), schedule.available_seats)
+        if not seats:
+            continue
+        status = rng.choices(('pending', 'confirmed', 'cancelled'), (1, 6, 1))[0]
+        numbers = []
+        if status != 'cancelled':
+            first = schedule.bus.capacity - schedule.available_seats + 1
+            numbers = list(range(first, first + seats))
+            schedule.seat_map = to_bytes(to_int(schedule.seat_map) | mask(numbers))
+            schedule.available_seats -= seats
+        bookings.append((schedule, seats, numbers, status))
+    Schedule.objects.bulk_create(planned, batch_size=BATCH_SIZE)
+
+    customers = User.objects.bulk_create([
+        User(username=f'bench-{i}', email=f'bench-{i}@example.com', password='!') for i in range(users)
+    ], batch_size=BATCH_SIZE)
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, full_name=user.username, phone='0600000000') for user in customers
+    ], batch_size=BATCH_SIZE)
+    Reservation.objects.bulk_create([
+        Reservation(
+            user=rng.choice(customers),
+            schedule=schedule,
+            number_of_seats=seats,
+            seat_numbers=numbers,
+            status=status,
+            total_price=schedule.price * seats,
+        )
+        for schedule, seats, numbers, status in bookings
+    ], batch_size=BATCH_SIZE)
+
+    admin = User.objects.create(username='bench-admin', is_staff=True, password='!')
+    UserProfile.objects.create(user=admin, full_name='Administrateur', phone='0000000000', is_admin=True)
+    # Statistiques à jour pour le planificateur, comme sur une base de production
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return sorted({route.departure_location.city for route in network} | {route.arrival_location.city for route in network})
+
+
+class Scenarios:
+    """
+    Scénarios nommés, chacun jouant une requête HTTP. Les réservations créées par
+    `book` sont annulées par `cancel`.
+    """
+    NAMES = ('search', 'search_index', 'journeys', 'book', 'cancel', 'my_reservations', 'admin_reservations', 'dashboard')
+
+    def __init__(self, rng, cities, days=60):
+        self.rng = rng
+        self.cities = cities
+        self.days = days
+        self.client = Client()
+        self.users = list(User.objects.select_related('profile').filter(profile__is_admin=False).order_by('id')[:200])
+        self.admin = User.objects.select_related('profile').get(username='bench-admin')
+        self.schedule_ids = list(
+            Schedule.objects.filter(available_seats__gte=4).order_by('?').values_list('id', flat=True)[:2000]
+        )
+        self.tokens = {}
+        self.booked = []
+
+    def headers(self, user):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = f"Bearer {tokens_for_user(user)['access']}"
+        return {'HTTP_AUTHORIZATION': self.tokens[user.pk]}
+
+    def customer(self):
+        return self.rng.choice(self.users)
+
+    def trip(self):
+        departure, arrival = self.rng.sample(self.cities, 2)
+        date = timezone.localdate() + timedelta(days=self.rng.randrange(self.days))
+        return {'departure': departure, 'arrival': arrival, 'date': date.isoformat()}
+
+    def search(self):
+        return self.client.get('/api/schedules/', self.trip(), **self.headers(self.customer()))
+
+    def search_index(self):
+        return self.client.get('/api/search/schedules/', self.trip(), **self.headers(self.customer()))
+
+    def journeys(self):
+        return self.client.get('/api/journeys/', self.trip(), **self.headers(self.customer()))
+
+    def book(self):
+        user = self.customer()
+        response = self.client.post('/api/reservations/', {
+            'schedule': self.rng.choice(self.schedule_ids),
+            'number_of_seats': 1,
+        }, content_type='application/json', **self.headers(user))
+        if response.status_code == 201:
+            self.booked.append((user, response.json()['id']))
+        return response
+
+    def cancel(self):
+        if not self.booked:
+            self.book()
+        user, reservation_id = self.booked.pop()
+        return self.client.post(f'/api/reservations/{reservation_id}/cancel/', **self.headers(user))
+
+    def my_reservations(self):
+        return self.client.get('/api/reservations/user/', **self.headers(self.customer()))
+
+    def admin_reservations(self):
+        return self.client.get('/api/reservations/', **self.headers(self.admin))
+
+    def dashboard(self):
+        return self.client.get('/api/stats/dashboard/', **self.headers(self.admin))
+
+    # Lectures servies par les vues asynchrones : (chemin, paramètres, en-têtes)
+    CONCURRENT_NAMES = ('search_index', 'my_reservations', 'current_user')
+
+    def read_request(self, name):
+        # En-têtes passés par headers= : AsyncClient ne lit pas les clés HTTP_* de extra
+        headers = {'Authorization': self.headers(self.customer())['HTTP_AUTHORIZATION']}
+        if name == 'search_index':
+            return '/api/search/schedules/', self.trip(), headers
+        if name == 'my_reservations':
+            return '/api/reservations/user/', {}, headers
+        return '/api/auth/user/', {}, headers
+
+
+def run_scenario(scenarios, name, requests):
+    """Joue `requests` fois un scénario et retourne ses mesures."""
+    play = getattr(scenarios, name)
+    timings, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        recorder = QueryRecorder()
+        begin = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = play()
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        timings.append((time.perf_counter() - begin) * 1000)
+        queries.append(recorder.count)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    queries.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'queries_p50': percentile(queries, 50),
+        'queries_max': queries[-1],
+    }
+
+
+def run(rng, cities, names=Scenarios.NAMES, requests=200, warmup=10, days=60):
+    scenarios = Scenarios(rng, cities, days)
+    report = {}
+    for name in names:
+        # Échauffement : index en mémoire, caches et jetons hors mesure
+        run_scenario(scenarios, name, warmup)
+        report[name] = run_scenario(scenarios, name, requests)
+    return report
+
+
+def _summary(timings, errors, elapsed, concurrency):
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'concurrency': concurrency,
+        'errors': errors,
+        'throughput': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+    }
+
+
+def _play_wsgi(requests, concurrency):
+    def worker(share):
+        client, timings, errors = Client(), [], 0
+        try:
+            for path, params, headers in share:
+                begin = time.perf_counter()
+                response = client.get(path, params, headers=headers)
+                timings.append((time.perf_counter() - begin) * 1000)
+                errors += response.status_code >= 400
+        finally:
+            connections.close_all()
+        return timings, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, [requests[i::concurrency] for i in range(concurrency)]))
+    return [timing for timings, _ in results for timing in timings], sum(errors for _, errors in results)
+
+
+async def _play_asgi(requests, concurrency):
+    client, timings, errors = AsyncClient(), [], 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play(path, params, headers):
+        nonlocal errors
+        async with slots:
+            begin = time.perf_counter()
+            response = await client.get(path, params, headers=headers)
+            timings.append((time.perf_counter() - begin) * 1000)
+            errors += response.status_code >= 400
+
+    try:
+        await asyncio.gather(*(play(*request) for request in requests))
+    finally:
+        await sync_to_async(connections.close_all)()
+    return timings, errors
+
+
+def run_concurrent(rng, cities, names=Scenarios.CONCURRENT_NAMES, requests=200, concurrency=16, warmup=10, days=60):
+    """
+    Chaque lecture de `names` jouée `requests` fois avec `concurrency` requêtes
+    simultanées, sous WSGI puis sous ASGI (mêmes requêtes). Clés du rapport :
+    'scénario@wsgi' et 'scénario@asgi'.
+    """
+    scenarios = Scenarios(rng, cities, days)
+    report = {}
+    for name in names:
+        planned = [scenarios.read_request(name) for _ in range(requests)]
+        for interface in ('wsgi', 'asgi'):
+            if interface == 'wsgi':
+                _play_wsgi(planned[:warmup], concurrency)
+                started = time.perf_counter()
+                timings, errors = _play_wsgi(planned, concurrency)
+            else:
+                asyncio.run(_play_asgi(planned[:warmup], concurrency))
+                started = time.perf_counter()
+                timings, errors = asyncio.run(_play_asgi(planned, concurrency))
+            report[f'{name}@{interface}'] = _summary(timings, errors, time.perf_counter() - started, concurrency)
+    return report
+
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    Régressions par rapport à une référence : p95 au-delà de (1 + tolerance) fois
+    la référence, davantage de requêtes SQL, ou des erreurs apparues.
+    """
+    regressions = []
+    for name, current in report.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if current['p95_ms'] > reference['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > {reference['p95_ms']}ms (+{tolerance:.0%})")
+        if current['queries_max'] > reference['queries_max']:
+            regressions.append(f"{name}: {current['queries_max']} requêtes SQL > {reference['queries_max']}")
+        if current['errors'] > reference.get('errors', 0):
+            regressions.append(f"{name}: {current['errors']} erreurs > {reference.get('errors', 0)}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, report):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+        file.write('\n')
@@ -0,0 +1,137 @@
+import csv
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+
+from .parsers import CSVParser, NDJSONParser, read_csv, read_ndjson
+from .renderers import FastJSONParser
+
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_ROWS = 100_000
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Clé étrangère résolue dans les objets préchargés du lot (context['preloaded'])
+    au lieu d'une requête par ligne.
+    """
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        try:
+            return self.context['preloaded'][model][str(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+def bulk_rows(request):
+    """Lignes d'un import : liste JSON, corps CSV/NDJSON ou fichier `file` envoyé en multipart."""
+    upload = request.FILES.get('file') if hasattr(request, 'FILES') else None
+    if upload is not None:
+        reader = read_ndjson if upload.name.endswith(('.ndjson', '.jsonl')) else read_csv
+        try:
+            rows = reader(upload)
+        except (csv.Error, UnicodeDecodeError) as exc:
+            # Mêmes erreurs que CSVParser/NDJSONParser pour un corps brut
+            raise ParseError(f'Fichier invalide : {exc}')
+    else:
+        rows = request.data
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValidationError({'detail': 'Une liste d\'objets est attendue.'})
+    if len(rows) > BULK_MAX_ROWS:
+        raise ValidationError({'detail': f'{BULK_MAX_ROWS} lignes maximum par import.'})
+    return rows
+
+
+class BulkMixin:
+    """
+    Ajoute /bulk/ à un ModelViewSet : POST crée et PATCH modifie (lignes avec `id`)
+    une liste d'objets. Tout le lot est validé avant d'écrire ; en cas d'erreur rien
+    n'est écrit et la réponse liste les erreurs par ligne (index à partir de 0).
+    Les écritures passent par bulk_create/bulk_update par paquets de BULK_CHUNK_SIZE.
+    """
+    bulk_serializer_class = None
+    # Clés étrangères à précharger : {nom du champ: modèle}
+    bulk_related = {}
+
+    def preload(self, rows):
+        preloaded = {}
+        for field, model in self.bulk_related.items():
+            ids = {str(row[field]) for row in rows if row.get(field) not in (None, '')}
+            valid_ids = [pk for pk in ids if pk.isdigit()]
+            objects = model.objects.in_bulk(valid_ids)
+            preloaded.setdefault(model, {}).update((str(pk), obj) for pk, obj in objects.items())
+        return preloaded
+
+    def validate_batch(self, items):
+        """Contrôles portant sur tout le lot ; retourne [{'row': index, 'errors': ...}]."""
+        return []
+
+    def snapshot(self, instances):
+        """État des objets avant un PATCH, transmis à bulk_written."""
+        return None
+
+    def bulk_written(self, objects, previous=None):
+        """Appelé après écriture : bulk_create/bulk_update n'émettent pas post_save."""
+
+    def validate_rows(self, rows, instances=None):
+        context = dict(self.get_serializer_context(), preloaded=self.preload(rows))
+        # Un seul serializer pour tout le lot : construire ses champs coûte plus cher
+        # que de valider une ligne
+        serializer = self.bulk_serializer_class(context=context, partial=instances is not None)
+        items, errors = [], []
+        for index, row in enumerate(rows):
+            instance = None
+            if instances is not None:
+                instance = instances.get(str(row.get('id')))
+                if instance is None:
+                    errors.append({'row': index, 'errors': {'id': ['Objet introuvable.']}})
+                    continue
+            serializer.instance = instance
+            try:
+                items.append((index, instance, serializer.run_validation(row)))
+            except ValidationError as exc:
+                errors.append({'row': index, 'errors': exc.detail})
+        if not errors:
+            errors = self.validate_batch(items)
+        return items, errors
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk',
+            parser_classes=[FastJSONParser, CSVParser, NDJSONParser, MultiPartParser])
+    def bulk(self, request):
+        rows = bulk_rows(request)
+        model = self.get_queryset().model
+        if request.method == 'POST':
+            items, errors = self.validate_rows(rows)
+        else:
+            ids = [str(row['id']) for row in rows if str(row.get('id', '')).isdigit()]
+            # Queryset de base de la vue : ses select_related servent à la validation
+            instances = {str(pk): obj for pk, obj in self.queryset.in_bulk(ids).items()}
+            items, errors = self.validate_rows(rows, instances)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                objects = [model(**data) for _, _, data in items]
+                model.objects.bulk_create(objects, batch_size=BULK_CHUNK_SIZE)
+                self.bulk_written(objects)
+                return Response({'created': len(objects)}, status=status.HTTP_201_CREATED)
+
+            instances = [instance for _, instance, _ in items]
+            previous = self.snapshot(instances)
+            fields, now = {'updated_at'}, timezone.now()
+            for _, instance, data in items:
+                for name, value in data.items():
+                    setattr(instance, name, value)
+                    fields.add(name)
+                # bulk_update ne renseigne pas auto_now
+                instance.updated_at = now
+            model.objects.bulk_update(instances, sorted(fields), batch_size=BULK_CHUNK_SIZE)
+            self.bulk_written(instances, previous)
+            return Response({'updated': len(instances)})
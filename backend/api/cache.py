@@ -0,0 +1,122 @@
+import hashlib
+import uuid
+from itertools import product
+
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Schedule
+
+SEARCH_CACHE = 'search'
+SEARCH_FILTERS = ('departure', 'arrival', 'date')
+
+# Génération globale : invalide toutes les recherches (ville renommée, bus modifié...)
+GLOBAL_GENERATION = 'schedules-gen:global'
+
+# Génération des modèles d'horaires : périme les plages déjà vérifiées par ensure_materialized
+TIMETABLE_GENERATION = 'timetable-gen'
+
+SNAPSHOT_FIELDS = ('departure_location__city', 'arrival_location__city', 'departure_time')
+
+
+def schedule_snapshots(schedule_ids):
+    """Triplets (ville de départ, ville d'arrivée, heure de départ) utilisés pour l'invalidation."""
+    return list(Schedule.objects.filter(pk__in=schedule_ids).values_list(*SNAPSHOT_FIELDS))
+
+
+def search_cache():
+    return caches[SEARCH_CACHE]
+
+
+def _digest(*parts):
+    return hashlib.md5('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _generation_key(departure, arrival, date):
+    return f'schedules-gen:{_digest(departure or "*", arrival or "*", date or "*")}'
+
+
+def _new_generation():
+    # Valeur unique plutôt qu'un compteur : si une génération est évincée du cache,
+    # elle ne peut pas revenir à une ancienne valeur et réactiver des entrées périmées
+    return uuid.uuid4().hex
+
+
+def _current_generations(cache, *keys):
+    """Générations courantes de `keys`, lues en une fois ; une génération absente est créée."""
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            generations[key] = _new_generation()
+            # Une autre requête a pu la créer entre-temps : la sienne l'emporte
+            if not cache.add(key, generations[key], timeout=None):
+                generations[key] = cache.get(key, generations[key])
+    return [generations[key] for key in keys]
+
+
+def _current_generation(cache, key):
+    return _current_generations(cache, key)[0]
+
+
+def normalize_search(params):
+    """
+    Retourne le triplet (départ, arrivée, date) normalisé d'une recherche d'horaires.
+    """
+    departure = (params.get('departure') or '').strip() or None
+    arrival = (params.get('arrival') or '').strip() or None
+    date = (params.get('date') or '').strip() or None
+    if date:
+        try:
+            parsed = parse_date(date)
+        except ValueError:
+            parsed = None
+        date = parsed.isoformat() if parsed else date
+    return departure, arrival, date
+
+
+def search_cache_key(request):
+    """
+    Clé d'une recherche : filtres normalisés, paramètres de pagination, hôte
+    (les liens next/previous sont absolus) et générations courantes.
+    """
+    cache = search_cache()
+    departure, arrival, date = normalize_search(request.query_params)
+    generations = _current_generations(cache, GLOBAL_GENERATION, _generation_key(departure, arrival, date))
+    extras = sorted(
+        (name, value) for name, value in request.query_params.items()
+        if name not in SEARCH_FILTERS
+    )
+    return 'schedules:' + _digest(
+        *generations,
+        departure, arrival, date, extras, request.scheme, request.get_host(),
+    )
+
+
+def invalidate_searches(snapshots):
+    """
+    Invalide les recherches pouvant contenir les horaires donnés, décrits par des
+    triplets (ville de départ, ville d'arrivée, heure de départ). Un horaire apparaît
+    dans 8 recherches : chaque filtre est soit sa valeur, soit absent.
+    """
+    keys = set()
+    for departure, arrival, departure_time in snapshots:
+        date = timezone.localdate(departure_time).isoformat()
+        for combination in product((departure, None), (arrival, None), (date, None)):
+            keys.add(_generation_key(*combination))
+    if keys:
+        search_cache().set_many({key: _new_generation() for key in keys}, timeout=None)
+
+
+def invalidate_all_searches():
+    search_cache().set(GLOBAL_GENERATION, _new_generation(), timeout=None)
+
+
+def timetable_check_key(start, end):
+    """Clé indiquant que les départs de start à end sont déjà matérialisés."""
+    generation = _current_generation(search_cache(), TIMETABLE_GENERATION)
+    return f'timetable:{generation}:{start.isoformat()}:{end.isoformat()}'
+
+
+def invalidate_timetable_checks():
+    search_cache().set(TIMETABLE_GENERATION, _new_generation(), timeout=None)
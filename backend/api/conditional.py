@@ -0,0 +1,45 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalListMixin:
+    """
+    ETag et Last-Modified sur la liste d'un ModelViewSet, calculés par une seule
+    agrégation (nombre de lignes et max(updated_at)) sur le queryset filtré. Si le
+    client a déjà la version courante (If-None-Match, ou If-Modified-Since seul),
+    la réponse est un 304 sans lecture des lignes ni sérialisation.
+
+    Une suppression change le nombre de lignes donc l'ETag, mais pas forcément
+    Last-Modified : les navigateurs envoient les deux en-têtes et l'ETag l'emporte.
+    """
+    # Champs updated_at dont dépend la représentation (objets imbriqués compris)
+    conditional_fields = ('updated_at',)
+
+    def list_validators(self, queryset):
+        aggregates = queryset.aggregate(
+            count=Count('pk'),
+            **{f'modified_{index}': Max(field) for index, field in enumerate(self.conditional_fields)}
+        )
+        modified = [value for key, value in aggregates.items() if key.startswith('modified_') and value]
+        last_modified = max(modified) if modified else None
+        renderer = getattr(self.request, 'accepted_media_type', '')
+        digest = hashlib.md5('\x1f'.join(str(part) for part in (
+            aggregates['count'], *modified, self.request.get_full_path(), renderer,
+        )).encode()).hexdigest()
+        return quote_etag(digest), last_modified
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.list_validators(self.filter_queryset(self.get_queryset()))
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Données authentifiées : cache du navigateur seulement, revalidé à chaque usage
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,152 @@
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ValidationError
+
+from .models import Reservation, Schedule
+from .search import day_range
+
+# Lignes lues par aller-retour base et écrites par morceau de réponse
+EXPORT_CHUNK_SIZE = 2000
+
+# (colonne, champ lu par values_list) : pas d'instance de modèle ni de serializer par ligne
+RESERVATION_COLUMNS = (
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('status', 'status'),
+    ('username', 'user__username'),
+    ('email', 'user__email'),
+    ('schedule', 'schedule_id'),
+    ('departure_city', 'schedule__departure_location__city'),
+    ('arrival_city', 'schedule__arrival_location__city'),
+    ('departure_time', 'schedule__departure_time'),
+    ('number_of_seats', 'number_of_seats'),
+    ('total_price', 'total_price'),
+)
+
+SCHEDULE_COLUMNS = (
+    ('id', 'id'),
+    ('departure_city', 'departure_location__city'),
+    ('arrival_city', 'arrival_location__city'),
+    ('departure_time', 'departure_time'),
+    ('arrival_time', 'arrival_time'),
+    ('bus', 'bus__plate_number'),
+    ('price', 'price'),
+    ('available_seats', 'available_seats'),
+    ('created_at', 'created_at'),
+)
+
+# Type d'export -> (modèle, colonnes, champ filtré par date_from/date_to)
+EXPORTS = {
+    'reservations': (Reservation, RESERVATION_COLUMNS, 'created_at'),
+    'schedules': (Schedule, SCHEDULE_COLUMNS, 'departure_time'),
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_filters(kind, date_from=None, date_to=None, status=None):
+    """
+    Filtres d'un export : dates AAAA-MM-JJ incluses et statuts séparés par des virgules
+    (réservations uniquement). Retourne (début, fin exclue, statuts).
+    """
+    start = day_range(date_from)[0] if date_from else None
+    end = day_range(date_to)[1] if date_to else None
+    statuses = [value for value in (status or '').split(',') if value]
+    if statuses:
+        if kind != 'reservations':
+            raise ValidationError({'status': 'Filtre disponible uniquement pour les réservations.'})
+        unknown = set(statuses) - {value for value, _ in Reservation.STATUS_CHOICES}
+        if unknown:
+            raise ValidationError({'status': f"Statut inconnu : {', '.join(sorted(unknown))}."})
+    return start, end, statuses
+
+
+def export_queryset(kind, start=None, end=None, statuses=None):
+    """
+    Lignes à exporter, triées par (date, id) pour suivre les index
+    reservation_created_idx / schedule_departure_idx.
+    """
+    model, columns, date_field = EXPORTS[kind]
+    queryset = model.objects.order_by(date_field, 'id')
+    if start:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset.values_list(*(source for _, source in columns))
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : writerow retourne la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def _chunks(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def _ndjson_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, map(_cell, row))), ensure_ascii=False) + '\n'
+
+
+def export_lines(kind, queryset, export_format):
+    """
+    Générateur de morceaux de texte CSV ou NDJSON. Le queryset est parcouru par
+    iterator() : la mémoire utilisée ne dépend pas du nombre de lignes.
+    """
+    header = [name for name, _ in EXPORTS[kind][1]]
+    rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    lines = _csv_lines(header, rows) if export_format == 'csv' else _ndjson_lines(header, rows)
+    return _chunks(lines)
+
+
+async def aexport_lines(kind, queryset, export_format):
+    """
+    export_lines pour ASGI. Un générateur synchrone y serait lu en entier par
+    StreamingHttpResponse avant l'envoi : chaque morceau est ici lu à part, dans le
+    thread de la base (sync_to_async), et la mémoire reste constante.
+    """
+    chunks = export_lines(kind, queryset, export_format)
+    next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # Client déconnecté : le curseur de iterator() est refermé dans le même thread
+        await sync_to_async(chunks.close)()
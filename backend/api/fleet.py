@@ -0,0 +1,122 @@
+"""
+Affectation des cars : un car ne peut pas assurer deux horaires qui se chevauchent
+(départ de l'un avant l'arrivée de l'autre, bornes exclues : un car peut repartir
+à l'heure où il arrive).
+
+Tant que les horaires d'un car ne se chevauchent pas (ce que garantissent ces
+contrôles), seul le dernier horaire parti avant l'arrivée d'un nouveau peut le
+chevaucher : une lecture d'une ligne sur l'index (bus, departure_time) suffit,
+quel que soit l'historique du car.
+"""
+from bisect import bisect_left
+
+from django.db.models import Count, DurationField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Least
+
+from .models import Bus, Schedule
+
+
+def bus_conflict(bus_id, departure, arrival, exclude=None):
+    """Id de l'horaire du car qui chevauche [departure, arrival), ou None."""
+    previous = Schedule.objects.filter(bus_id=bus_id, departure_time__lt=arrival)
+    if exclude is not None:
+        previous = previous.exclude(pk=exclude)
+    row = previous.order_by('-departure_time').values_list('id', 'arrival_time').first()
+    if row is not None and row[1] > departure:
+        return row[0]
+    return None
+
+
+class BusTimeline:
+    """Créneaux d'un car triés par départ, sans chevauchement (recherche par bisection)."""
+
+    def __init__(self):
+        self._starts = []
+        self._slots = []   # (départ, arrivée, clé), dans l'ordre de _starts
+
+    def conflict(self, departure, arrival):
+        """Clé du créneau qui chevauche [departure, arrival), ou None."""
+        position = bisect_left(self._starts, arrival)
+        if position and self._slots[position - 1][1] > departure:
+            return self._slots[position - 1][2]
+        return None
+
+    def add(self, departure, arrival, key):
+        position = bisect_left(self._starts, departure)
+        self._starts.insert(position, departure)
+        self._slots.insert(position, (departure, arrival, key))
+
+
+def batch_conflicts(slots, exclude=()):
+    """
+    Chevauchements d'un lot d'horaires [(index, id du car, départ, arrivée)], entre
+    eux et avec la base, en une requête : horaires des cars du lot partant dans la
+    fenêtre du lot, plus le dernier parti avant elle pour chaque car. `exclude` : ids
+    des horaires modifiés par le lot, dont les anciens créneaux sont ignorés.
+    Retourne [(index, clé en conflit)] où la clé est ('schedule', id) ou ('row', index).
+    """
+    if not slots:
+        return []
+    bus_ids = {bus_id for _, bus_id, _, _ in slots}
+    start = min(departure for _, _, departure, _ in slots)
+    end = max(arrival for _, _, _, arrival in slots)
+    before = (
+        Schedule.objects.filter(bus=OuterRef('pk'), departure_time__lt=start)
+        .exclude(pk__in=exclude).order_by('-departure_time').values('pk')[:1]
+    )
+    previous = Bus.objects.filter(pk__in=bus_ids).annotate(previous=Subquery(before)).values('previous')
+    rows = Schedule.objects.filter(
+        Q(bus_id__in=bus_ids, departure_time__gte=start, departure_time__lt=end) | Q(pk__in=previous)
+    ).exclude(pk__in=exclude).values_list('id', 'bus_id', 'departure_time', 'arrival_time')
+
+    timelines = {bus_id: BusTimeline() for bus_id in bus_ids}
+    for pk, bus_id, departure, arrival in rows:
+        timelines[bus_id].add(departure, arrival, ('schedule', pk))
+    conflicts = []
+    for index, bus_id, departure, arrival in slots:
+        timeline = timelines[bus_id]
+        key = timeline.conflict(departure, arrival)
+        if key is None:
+            timeline.add(departure, arrival, ('row', index))
+        else:
+            conflicts.append((index, key))
+    return conflicts
+
+
+def conflict_message(key):
+    kind, value = key
+    if kind == 'row':
+        return f"Ce car est déjà affecté à la ligne {value} du lot sur ce créneau."
+    return f"Ce car est déjà affecté à l'horaire {value} sur ce créneau."
+
+
+def fleet_utilization(start, end):
+    """
+    Utilisation de chaque car pour les départs de [start, end) : nombre d'horaires,
+    heures de service (arrivées bornées à `end`), part de la période en service,
+    places offertes et vendues. Une requête agrégée pour toute la flotte.
+    """
+    departing = Q(schedules__departure_time__gte=start, schedules__departure_time__lt=end)
+    service = Least(F('schedules__arrival_time'), Value(end)) - F('schedules__departure_time')
+    buses = Bus.objects.annotate(
+        schedule_count=Count('schedules', filter=departing),
+        service=Sum(service, filter=departing, output_field=DurationField()),
+        available=Sum('schedules__available_seats', filter=departing),
+    ).order_by('id').values_list('id', 'plate_number', 'capacity', 'schedule_count', 'service', 'available')
+    period = (end - start).total_seconds()
+    report = []
+    for pk, plate_number, capacity, count, service, available in buses:
+        seconds = service.total_seconds() if service else 0
+        offered = capacity * count
+        sold = offered - (available or 0)
+        report.append({
+            'bus': pk,
+            'plate_number': plate_number,
+            'schedules': count,
+            'service_hours': round(seconds / 3600, 2),
+            'utilization_rate': round(seconds / period, 4) if period else 0,
+            'seats_offered': offered,
+            'seats_sold': sold,
+            'occupancy_rate': round(sold / offered, 4) if offered else 0,
+        })
+    return report
@@ -0,0 +1,127 @@
+"""
+Clés d'idempotence (en-tête Idempotency-Key) pour POST /reservations/ : un client
+qui renvoie une requête après une coupure réseau reçoit la réponse de la première,
+sans nouvelle réservation ni places prises une seconde fois.
+
+La clé est d'abord réservée par un INSERT (unique par utilisateur) : de deux
+requêtes simultanées, une seule l'obtient et crée la réservation ; l'autre reçoit
+409 avec Retry-After, puis la réponse mémorisée en réessayant. Une clé réutilisée
+pour un autre corps répond 422. Seules les réponses abouties (< 500) sont
+mémorisées : après une erreur, la clé est libérée et le client peut réessayer.
+Une clé restée en cours (processus interrompu) est reprise après
+IDEMPOTENCY_LOCK_SECONDS ; les clés expirent après IDEMPOTENCY_KEY_TTL_HOURS.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    return _digest(f"{request.method} {request.path} {json.dumps(data, sort_keys=True, default=str)}")
+
+
+def claim_key(user, key, fingerprint, now=None):
+    """
+    Réserve la clé pour cette requête. Retourne (clé, True) si la requête doit
+    s'exécuter, (clé existante, False) sinon. Une clé expirée, ou restée en cours
+    au-delà de IDEMPOTENCY_LOCK_SECONDS pour la même requête, est reprise par un
+    compare-and-swap sur created_at : une seule requête la reprend.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(hours=_setting('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=fingerprint, created_at=now, expires_at=expires_at,
+                )
+            return record, True
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            continue  # purgée entre-temps
+        abandoned = (
+            record.status_code is None and record.request_hash == fingerprint
+            and record.created_at <= now - timedelta(seconds=_setting('IDEMPOTENCY_LOCK_SECONDS', 60))
+        )
+        if record.expires_at > now and not abandoned:
+            return record, False
+        taken = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).update(
+            request_hash=fingerprint, status_code=None, response=None, created_at=now, expires_at=expires_at,
+        )
+        if taken:
+            return IdempotencyKey.objects.get(pk=record.pk), True
+
+
+def replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {'detail': "Cette clé d'idempotence a déjà servi pour une autre requête."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {'detail': 'Une requête avec cette clé est en cours, réessayer.'},
+            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+        )
+    return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(request, handler):
+    """Exécute handler() une seule fois par clé Idempotency-Key ; sans en-tête, l'exécute."""
+    raw = request.headers.get(HEADER)
+    if raw is None:
+        return handler()
+    if not raw or len(raw) > MAX_KEY_LENGTH:
+        raise ValidationError({HEADER: f'Clé de 1 à {MAX_KEY_LENGTH} caractères attendue.'})
+    fingerprint = request_fingerprint(request)
+    record, created = claim_key(request.user, _digest(raw), fingerprint)
+    if not created:
+        return replay(record, fingerprint)
+    try:
+        response = handler()
+    except Exception:
+        record.delete()
+        raise
+    if response.status_code >= 500:
+        record.delete()
+    else:
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=response.status_code, response=response.data)
+    return response
+
+
+def purge_idempotency_keys(batch_size=1000, now=None):
+    """Supprime les clés expirées par paquets (transactions courtes) ; retourne leur nombre."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if ids:
+            IdempotencyKey.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
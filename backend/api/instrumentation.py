@@ -0,0 +1,160 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, pct):
+    """Percentile (rang le plus proche) d'une liste déjà triée."""
+    if not values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[rank]
+
+
+class QueryRecorder:
+    """Wrapper d'exécution (connection.execute_wrapper) qui chronomètre chaque requête SQL."""
+
+    def __init__(self):
+        self.queries = []   # (durée en ms, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(((time.perf_counter() - start) * 1000, sql))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(duration for duration, _ in self.queries)
+
+    def worst(self, limit=3):
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[:limit]
+
+
+class RequestMetrics:
+    """
+    Derniers échantillons (durée, requêtes, temps base) par nom de vue, en mémoire.
+    Chaque worker a ses propres mesures.
+    """
+
+    def __init__(self, max_samples=1000):
+        self._lock = threading.Lock()
+        self._max_samples = max_samples
+        self._samples = {}
+        self._counts = {}
+
+    def record(self, view_name, wall_ms, queries, db_ms):
+        with self._lock:
+            if view_name not in self._samples:
+                self._samples[view_name] = deque(maxlen=self._max_samples)
+            self._samples[view_name].append((wall_ms, queries, db_ms))
+            self._counts[view_name] = self._counts.get(view_name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._samples, self._counts = {}, {}
+
+    def summary(self):
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+        result = {}
+        for name, values in sorted(samples.items()):
+            wall = sorted(value[0] for value in values)
+            queries = sorted(value[1] for value in values)
+            db = sorted(value[2] for value in values)
+            result[name] = {
+                'requests': counts[name],
+                'samples': len(values),
+                'wall_ms': {f'p{pct}': round(percentile(wall, pct), 2) for pct in (50, 95, 99)},
+                'db_ms': {f'p{pct}': round(percentile(db, pct), 2) for pct in (50, 95, 99)},
+                'queries': {'p50': percentile(queries, 50), 'p95': percentile(queries, 95), 'max': queries[-1]},
+            }
+        return result
+
+
+request_metrics = RequestMetrics()
+
+
+@sync_and_async_middleware
+class InstrumentationMiddleware:
+    """
+    Mesure chaque requête : durée totale, nombre de requêtes SQL et temps passé en base.
+    Activée par API_INSTRUMENTATION = True. Ajoute un en-tête Server-Timing, journalise
+    les requêtes plus lentes que API_SLOW_REQUEST_MS avec leurs requêtes SQL les plus
+    longues et alimente request_metrics (voir /api/stats/requests/).
+    Sous ASGI, la chaîne reste asynchrone : les vues asynchrones ne passent pas par
+    un adaptateur de thread, qui fausserait les durées mesurées.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'API_SLOW_REQUEST_MS', 500)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def recording(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        # Les connexions sont propres à chaque thread : les wrappers sont posés dans
+        # celui où sync_to_async exécute l'ORM pour cette requête
+        stack = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        # Pour une réponse en flux, seule la préparation est mesurée, pas l'envoi du corps
+        wall_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.total_ms
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or 'unresolved'
+        request_metrics.record(view_name, wall_ms, recorder.count, db_ms)
+        response['Server-Timing'] = (
+            f'total;dur={wall_ms:.1f}, db;dur={db_ms:.1f};desc="{recorder.count} queries"'
+        )
+        if wall_ms >= self.slow_ms:
+            worst = '\n'.join(f'  {duration:.1f} ms  {sql[:300]}' for duration, sql in recorder.worst())
+            logger.warning(
+                'Requête lente %s %s (%s) : %.0f ms, %d requêtes SQL, %.0f ms en base\n%s',
+                request.method, request.path, view_name, wall_ms, recorder.count, db_ms, worst,
+            )
+        return response
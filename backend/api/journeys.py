@@ -0,0 +1,229 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Location, Schedule
+
+
+class _Departures:
+    """
+    Départs d'un lieu, en tableaux parallèles triés par heure de départ
+    (secondes epoch) : quelques dizaines d'octets par horaire au lieu d'objets Python.
+    """
+    __slots__ = ('departure', 'arrival', 'to', 'price', 'seats', 'schedule')
+
+    def __init__(self):
+        self.departure = array('q')
+        self.arrival = array('q')
+        self.to = array('q')
+        self.price = array('q')     # centimes
+        self.seats = array('l')
+        self.schedule = array('q')
+
+    def insert(self, departure, arrival, to, price, seats, schedule_id):
+        position = bisect_left(self.departure, departure)
+        for column, value in zip(self.__slots__, (departure, arrival, to, price, seats, schedule_id)):
+            getattr(self, column).insert(position, value)
+
+    def remove(self, departure, schedule_id):
+        position = bisect_left(self.departure, departure)
+        while position < len(self.departure) and self.departure[position] == departure:
+            if self.schedule[position] == schedule_id:
+                for column in self.__slots__:
+                    del getattr(self, column)[position]
+                return
+            position += 1
+
+
+class _Label:
+    __slots__ = ('stop', 'arrival', 'cost', 'legs', 'parent', 'leg')
+
+    def __init__(self, stop, arrival, cost, legs, parent=None, leg=None):
+        self.stop = stop
+        self.arrival = arrival
+        self.cost = cost
+        self.legs = legs
+        self.parent = parent
+        self.leg = leg
+
+
+def _dominated(criteria, others):
+    """Vrai si un triplet (arrivée, coût, correspondances) de `others` est au moins aussi bon partout."""
+    arrival, cost, legs = criteria
+    for other_arrival, other_cost, other_legs in others:
+        if other_arrival <= arrival and other_cost <= cost and other_legs <= legs:
+            return True
+    return False
+
+
+class JourneyGraph:
+    """
+    Graphe dépendant du temps des horaires à venir : lieu -> départs triés.
+
+    Comme l'index de recherche, il est chargé au premier accès, mis à jour horaire
+    par horaire par les receivers et reconstruit au-delà de SEARCH_INDEX_MAX_AGE.
+    """
+
+    FIELDS = ('id', 'departure_location_id', 'arrival_location_id', 'departure_time',
+              'arrival_time', 'price', 'available_seats')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._departures = {}   # id lieu -> _Departures
+        self._placed = {}       # id horaire -> (id lieu de départ, heure de départ)
+        self._stops = {}        # ville -> ids des lieux
+        self._cities = {}       # id lieu -> ville
+
+    def _ensure_built(self):
+        max_age = getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+        if self._built_at is None or time.monotonic() - self._built_at > max_age:
+            self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            self._departures, self._placed, self._stops, self._cities = {}, {}, {}, {}
+            for location_id, city in Location.objects.values_list('id', 'city'):
+                self._stops.setdefault(city, set()).add(location_id)
+                self._cities[location_id] = city
+            rows = Schedule.objects.filter(departure_time__gte=timezone.now()).values_list(*self.FIELDS)
+            for row in rows.iterator(chunk_size=5000):
+                self._add(*row)
+            self._built_at = time.monotonic()
+
+    def _add(self, schedule_id, origin, destination, departure_time, arrival_time, price, seats):
+        departure = int(departure_time.timestamp())
+        self._departures.setdefault(origin, _Departures()).insert(
+            departure, int(arrival_time.timestamp()), destination, int(price * 100), seats, schedule_id
+        )
+        self._placed[schedule_id] = (origin, departure)
+
+    def _remove(self, schedule_id):
+        placed = self._placed.pop(schedule_id, None)
+        if placed:
+            origin, departure = placed
+            self._departures[origin].remove(departure, schedule_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def refresh_schedules(self, schedule_ids):
+        if self._built_at is None:
+            return
+        rows = list(Schedule.objects.filter(
+            pk__in=schedule_ids, departure_time__gte=timezone.now()
+        ).values_list(*self.FIELDS))
+        with self._lock:
+            for schedule_id in schedule_ids:
+                self._remove(schedule_id)
+            for row in rows:
+                self._add(*row)
+
+    def plan(self, departure, arrival, depart_after, max_legs=3, min_connection=900,
+             objective='earliest', seats=1, limit=5, horizon=86400):
+        """
+        Itinéraires de `departure` à `arrival` (villes) partant après `depart_after`.
+
+        Recherche par étiquettes (arrivée, coût, correspondances) dans l'ordre de
+        l'objectif : `earliest` minimise l'heure d'arrivée, `cheapest` le prix. Une
+        étiquette dominée sur les trois critères par une autre au même lieu, ou par un
+        itinéraire déjà trouvé, est abandonnée. Retourne jusqu'à `limit` itinéraires
+        Pareto-optimaux, le meilleur pour l'objectif en premier.
+        """
+        with self._lock:
+            self._ensure_built()
+            origins = self._stops.get(departure, set())
+            targets = self._stops.get(arrival, set())
+            start = int(depart_after.timestamp())
+            latest = start + horizon
+
+            def key(label):
+                return (label.arrival, label.cost) if objective == 'earliest' else (label.cost, label.arrival)
+
+            heap, counter = [], 0
+            for stop in origins:
+                label = _Label(stop, start, 0, 0)
+                heap.append((key(label), counter, label))
+                counter += 1
+            heapq.heapify(heap)
+            settled, results, found = {}, [], []
+
+            while heap and len(results) < limit:
+                _, _, label = heapq.heappop(heap)
+                criteria = (label.arrival, label.cost, label.legs)
+                if _dominated(criteria, settled.get(label.stop, ())):
+                    continue
+                settled.setdefault(label.stop, []).append(criteria)
+                if label.stop in targets and label.legs:
+                    results.append(label)
+                    found.append(criteria)
+                    continue
+                if label.legs == max_legs or label.stop not in self._departures:
+                    continue
+                departures = self._departures[label.stop]
+                times, arrivals, destinations = departures.departure, departures.arrival, departures.to
+                ready = label.arrival + (min_connection if label.legs else 0)
+                legs = label.legs + 1
+                for position in range(bisect_left(times, ready), len(times)):
+                    if times[position] > latest:
+                        break
+                    destination = destinations[position]
+                    if departures.seats[position] < seats or destination in origins:
+                        continue
+                    candidate = (arrivals[position], label.cost + departures.price[position] * seats, legs)
+                    if _dominated(candidate, found) or _dominated(candidate, settled.get(destination, ())):
+                        continue
+                    leg = (departures.schedule[position], label.stop, destination,
+                           times[position], arrivals[position], departures.price[position])
+                    successor = _Label(destination, *candidate, parent=label, leg=leg)
+                    heapq.heappush(heap, (key(successor), counter, successor))
+                    counter += 1
+
+            return [self._itinerary(label, seats) for label in results]
+
+    def _itinerary(self, label, seats):
+        final, legs = label, []
+        while label.parent is not None:
+            legs.append(label.leg)
+            label = label.parent
+        legs.reverse()
+        return {
+            'departure_time': _format_timestamp(legs[0][3]),
+            'arrival_time': _format_timestamp(final.arrival),
+            'duration': (final.arrival - legs[0][3]) // 60,
+            'transfers': len(legs) - 1,
+            'seats': seats,
+            'total_price': _format_cents(final.cost),
+            'legs': [
+                {
+                    'schedule': schedule_id,
+                    'departure_location': origin,
+                    'departure_city': self._cities.get(origin),
+                    'arrival_location': destination,
+                    'arrival_city': self._cities.get(destination),
+                    'departure_time': _format_timestamp(departure),
+                    'arrival_time': _format_timestamp(arrival),
+                    'price': _format_cents(price),
+                }
+                for schedule_id, origin, destination, departure, arrival, price in legs
+            ],
+        }
+
+
+def _format_timestamp(value):
+    return serializers.DateTimeField().to_representation(datetime.fromtimestamp(value, tz=dt_timezone.utc))
+
+
+def _format_cents(value):
+    return f'{value // 100}.{value % 100:02d}'
+
+
+journey_graph = JourneyGraph()
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections
+from django.utils.crypto import salted_hmac
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# Le hachage PBKDF2 relâche le GIL : un pool de threads l'exécute en parallèle sans
+# occuper les threads ni la boucle qui servent les autres requêtes
+HASH_WORKERS = _setting('LOGIN_HASH_WORKERS', min(4, os.cpu_count() or 1))
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='login-hash')
+# Hachages en cours ou en attente : au-delà, la connexion est refusée (503) plutôt
+# que d'allonger la file pendant un pic
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + _setting('LOGIN_HASH_QUEUE', 32))
+
+
+class HashPoolBusy(Exception):
+    pass
+
+
+async def run_hash(function, *args, **kwargs):
+    if not _hash_slots.acquire(blocking=False):
+        raise HashPoolBusy
+    try:
+        future = _hash_pool.submit(function, *args, **kwargs)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    # Place rendue quand le hachage se termine (ou s'il est annulé avant de
+    # démarrer), pas quand la requête qui l'attend est annulée : le thread continue
+    # et la borne doit le compter
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return await asyncio.wrap_future(future)
+
+
+def _credential_key(user, password):
+    # Empreinte HMAC (SECRET_KEY) du mot de passe et du hash courant : jamais le mot
+    # de passe lui-même, et un changement de mot de passe périme l'entrée
+    digest = salted_hmac('login-credential', f'{user.password}\x1f{password}', algorithm='sha256').hexdigest()
+    return f'login-ok:{user.pk}:{digest}'
+
+
+def _authenticate(request, username, password):
+    try:
+        user = authenticate(request, username=username, password=password)
+        if user is not None:
+            # Profil lu ici : la vue asynchrone ne peut pas le charger à la demande
+            try:
+                user.profile
+            except ObjectDoesNotExist:
+                pass
+        return user
+    finally:
+        # Comme en fin de requête, pour la connexion du thread du pool
+        close_old_connections()
+
+
+async def verify_credentials(request, username, password):
+    """
+    Utilisateur correspondant aux identifiants, ou None. authenticate() tourne
+    dans le pool borné (HashPoolBusy s'il est saturé) : AUTHENTICATION_BACKENDS,
+    le signal user_login_failed, le hachage factice des comptes inconnus et la
+    mise à jour des hash sont ceux de Django. Une vérification réussie est
+    mémorisée LOGIN_CREDENTIAL_CACHE_TTL secondes avec le backend qui l'a
+    acceptée : les reconnexions répétées ne refont pas le hachage ; les échecs
+    passent toujours par authenticate().
+    """
+    ttl = _setting('LOGIN_CREDENTIAL_CACHE_TTL', 300)
+    if ttl:
+        user = await User.objects.select_related('profile').filter(username=username).afirst()
+        backend = cache.get(_credential_key(user, password)) if user is not None and user.is_active else None
+        if backend:
+            user.backend = backend
+            return user
+
+    user = await run_hash(_authenticate, request, username, password)
+    if user is not None and ttl:
+        cache.set(_credential_key(user, password), user.backend, ttl)
+    return user
+
+
+class LoginThrottle(SimpleRateThrottle):
+    """
+    Limite de tentatives de connexion, taux lu dans DEFAULT_THROTTLE_RATES au
+    moment de la requête (None désactive la limite).
+    """
+
+    def __init__(self):
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if self.rate is not None:
+            self.num_requests, self.duration = self.parse_rate(self.rate)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        return super().allow_request(request, view)
+
+
+class LoginIPThrottle(LoginThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameThrottle(LoginThrottle):
+    """Par compte visé, quelle que soit l'adresse : freine le bourrage d'identifiants distribué."""
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': request.login_username.lower()}
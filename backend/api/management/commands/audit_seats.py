@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from api.models import Reservation, Schedule
+from api.seats import taken_seats
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie pour chaque horaire que places libres, plan des places et réservations "
+        "actives concordent (code de sortie non nul en cas d'écart)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help='Écarts affichés au plus')
+
+    def handle(self, *args, **options):
+        held = dict(
+            Reservation.objects.filter(status__in=Reservation.HOLDING_STATUSES)
+            .values('schedule_id').annotate(seats=Sum('number_of_seats')).values_list('schedule_id', 'seats')
+        )
+        mismatches = 0
+        rows = Schedule.objects.values_list('id', 'bus__capacity', 'available_seats', 'seat_map')
+        for schedule_id, capacity, available, seat_map in rows.iterator(chunk_size=2000):
+            taken = len(taken_seats(bytes(seat_map)))
+            expected = held.get(schedule_id, 0)
+            if taken == expected and available == capacity - expected:
+                continue
+            mismatches += 1
+            if mismatches <= options['limit']:
+                self.stdout.write(
+                    f'Horaire {schedule_id} : {available} libres sur {capacity}, '
+                    f'{taken} places au plan, {expected} réservées'
+                )
+        if mismatches:
+            raise CommandError(f'{mismatches} horaire(s) incohérent(s)')
+        self.stdout.write(self.style.SUCCESS('Places cohérentes pour tous les horaires'))
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.benchmark import Scenarios, compare, load_baseline, run, run_concurrent, save_baseline, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Joue les scénarios de l'API (recherche, réservation, annulation, listes admin) "
+        "sur une base de test remplie et compare à une référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=Scenarios.NAMES, default=list(Scenarios.NAMES))
+        parser.add_argument('--requests', type=int, default=200, help='Requêtes mesurées par scénario')
+        parser.add_argument('--locations', type=int, default=32)
+        parser.add_argument('--buses', type=int, default=200)
+        parser.add_argument('--routes', type=int, default=120)
+        parser.add_argument('--schedules', type=int, default=50_000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--reservations', type=int, default=100_000)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', help='Fichier JSON de référence à comparer')
+        parser.add_argument('--save-baseline', action='store_true', help='Écrire le résultat dans --baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Hausse de p95 tolérée (0.25 = 25 %%)')
+        parser.add_argument('--json', action='store_true', help='Rapport en JSON')
+        parser.add_argument(
+            '--concurrency', type=int, default=0,
+            help='Compare WSGI et ASGI sur les vues asynchrones avec ce nombre de requêtes simultanées',
+        )
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline demande --baseline')
+        if options['concurrency'] and options['baseline']:
+            raise CommandError('--concurrency ne se compare pas à une référence')
+        rng = random.Random(options['seed'])
+        # Base de test dédiée : la base de développement n'est jamais modifiée
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            cities = seed(
+                rng, options['locations'], options['buses'], options['routes'], options['schedules'],
+                options['users'], options['reservations'], options['days'],
+            )
+            self.stderr.write(f'Données créées en {time.perf_counter() - started:.1f}s')
+            if options['concurrency']:
+                report = run_concurrent(
+                    rng, cities, requests=options['requests'], concurrency=options['concurrency'], days=options['days'],
+                )
+            else:
+                report = run(rng, cities, options['scenarios'], options['requests'], days=options['days'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.write_report(report, options['json'])
+        baseline = options['baseline']
+        if options['save_baseline']:
+            save_baseline(baseline, report)
+            self.stdout.write(self.style.SUCCESS(f'Référence enregistrée dans {baseline}'))
+        elif baseline and os.path.exists(baseline):
+            regressions = compare(report, load_baseline(baseline), options['tolerance'])
+            if regressions:
+                raise CommandError('Régressions :\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Aucune régression par rapport à la référence'))
+        elif baseline:
+            raise CommandError(f'Référence introuvable : {baseline}')
+
+    def write_report(self, report, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if any('concurrency' in result for result in report.values()):
+            self.stdout.write(f"{'scénario':<28}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>5}")
+            for name, result in report.items():
+                self.stdout.write(
+                    f"{name:<28}{result['throughput']:>8}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                    f"{result['p99_ms']:>9}{result['errors']:>5}"
+                )
+            return
+        self.stdout.write(f"{'scénario':<20}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'SQL':>6}{'max':>5}{'err':>5}")
+        for name, result in report.items():
+            self.stdout.write(
+                f"{name:<20}{result['throughput']:>8}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                f"{result['p99_ms']:>9}{result['queries_p50']:>6}{result['queries_max']:>5}{result['errors']:>5}"
+            )
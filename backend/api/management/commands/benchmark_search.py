@@ -0,0 +1,101 @@
+import random
+import statistics
+import time as timer
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmark import CITIES
+from api.models import Bus, Location, Schedule
+from api.search import day_range
+
+class Command(BaseCommand):
+    help = "Mesure la latence de la recherche d'horaires sur une base de test remplie en masse"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedules', type=int, default=1_000_000)
+        parser.add_argument('--buses', type=int, default=500)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Base de test dédiée : la base de développement n'est jamais modifiée
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            rng = random.Random(options['seed'])
+            start = timer.perf_counter()
+            self.seed(rng, options['schedules'], options['buses'], options['days'])
+            self.stdout.write(f"{options['schedules']} horaires créés en {timer.perf_counter() - start:.1f}s")
+            self.run(rng, options['repeat'], options['days'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, rng, count, bus_count, days):
+        locations = Location.objects.bulk_create([
+            Location(city=city, address=f'Gare routière {city}') for city in CITIES
+        ])
+        buses = Bus.objects.bulk_create([
+            Bus(plate_number=f'BENCH-{i}', capacity=50, model='Irizar') for i in range(bus_count)
+        ])
+        origin = timezone.now().replace(minute=0, second=0, microsecond=0)
+        batch = []
+        for i in range(count):
+            departure, arrival = rng.sample(locations, 2)
+            departure_time = origin + timedelta(minutes=rng.randrange(days * 24 * 60))
+            batch.append(Schedule(
+                bus=buses[i % bus_count],
+                departure_location=departure,
+                arrival_location=arrival,
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(minutes=rng.randrange(60, 600)),
+                price=Decimal('120.00'),
+                available_seats=50,
+            ))
+            if len(batch) == 10_000:
+                Schedule.objects.bulk_create(batch)
+                batch = []
+        Schedule.objects.bulk_create(batch)
+        # Statistiques à jour pour le planificateur, comme sur une base de production
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run(self, rng, repeat, days):
+        today = timezone.localdate()
+        searches = [
+            (*rng.sample(CITIES, 2), (today + timedelta(days=rng.randrange(days))).isoformat())
+            for _ in range(repeat)
+        ]
+
+        def legacy(departure, arrival, date):
+            return Schedule.objects.with_details().filter(
+                departure_location__city=departure,
+                arrival_location__city=arrival,
+                departure_time__date=date,
+            )
+
+        def ranged(departure, arrival, date):
+            start, end = day_range(date)
+            return Schedule.objects.with_details().filter(
+                departure_location__city=departure,
+                arrival_location__city=arrival,
+                departure_time__gte=start,
+                departure_time__lt=end,
+            )
+
+        for label, build in (('departure_time__date', legacy), ('intervalle [jour, jour+1)', ranged)):
+            timings = []
+            for params in searches:
+                queryset = build(*params).order_by('departure_time', 'id')[:50]
+                started = timer.perf_counter()
+                list(queryset)
+                timings.append((timer.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: p50={statistics.median(timings):.2f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms max={timings[-1]:.2f}ms"
+            ))
+            self.stdout.write(build(*searches[0]).order_by('departure_time', 'id')[:50].explain())
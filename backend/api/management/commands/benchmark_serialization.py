@@ -0,0 +1,77 @@
+import io
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Bus, Location, Reservation, Schedule, UserProfile
+from api.renderers import FastJSONParser, FastJSONRenderer, orjson
+from api.serializers import (
+    ReservationListSerializer, ReservationSerializer, ScheduleListSerializer, ScheduleSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare la sérialisation DRF standard et la voie rapide (listes + orjson), sans base de données'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        schedules, reservations = self.build(options['rows'])
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson absent : FastJSONRenderer retombe sur json'))
+        for label, objects, standard, fast in (
+            ('horaires', schedules, ScheduleSerializer, ScheduleListSerializer),
+            ('réservations', reservations, ReservationSerializer, ReservationListSerializer),
+        ):
+            before = self.measure(options['repeat'], lambda: JSONRenderer().render(standard(objects, many=True).data))
+            after = self.measure(options['repeat'], lambda: FastJSONRenderer().render(fast(objects, many=True).data))
+            self.report(f'{label} : sérialisation + rendu', before, after)
+
+        body = JSONRenderer().render(ReservationListSerializer(reservations, many=True).data)
+        before = self.measure(options['repeat'], lambda: JSONParser().parse(io.BytesIO(body)))
+        after = self.measure(options['repeat'], lambda: FastJSONParser().parse(io.BytesIO(body)))
+        self.report(f'lecture de {len(body) // 1024} Ko de JSON', before, after)
+
+    def build(self, rows):
+        """Objets non enregistrés, relations renseignées comme après with_details()."""
+        now = timezone.now()
+        casablanca = Location(id=1, city='Casablanca', address='Gare routière', created_at=now, updated_at=now)
+        rabat = Location(id=2, city='Rabat', address='Kamra', created_at=now, updated_at=now)
+        bus = Bus(id=1, plate_number='AB-123', capacity=50, model='Irizar', created_at=now, updated_at=now)
+        user = User(id=1, username='client', email='client@example.com')
+        user.profile = UserProfile(id=1, user=user, full_name='Client', phone='0600000000')
+        schedules, reservations = [], []
+        for i in range(rows):
+            departure = now + timedelta(hours=i)
+            schedule = Schedule(
+                id=i + 1, bus=bus, departure_location=casablanca, arrival_location=rabat,
+                departure_time=departure, arrival_time=departure + timedelta(minutes=90),
+                price=Decimal('80.00'), available_seats=50, created_at=now, updated_at=now,
+            )
+            schedules.append(schedule)
+            reservations.append(Reservation(
+                id=i + 1, user=user, schedule=schedule, number_of_seats=2, status='confirmed',
+                total_price=Decimal('160.00'), created_at=now, updated_at=now,
+            ))
+        return schedules, reservations
+
+    def measure(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
+
+    def report(self, label, before, after):
+        self.stdout.write(self.style.SUCCESS(
+            f'{label} : DRF {before:.1f} ms, rapide {after:.1f} ms (x{before / after:.1f})'
+        ))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Annule les réservations en attente expirées et rend leurs places (--loop pour tourner en continu)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Balayer indéfiniment')
+        parser.add_argument('--interval', type=float, default=30, help='Secondes entre deux balayages')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = self.sweep(options['batch_size'])
+            if expired or not options['loop']:
+                self.stdout.write(f'{expired} réservation(s) expirée(s)')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+            # Processus long : ne pas garder une connexion coupée par la base
+            close_old_connections()
+
+    def sweep(self, batch_size):
+        # Paquets courts : chaque transaction ne bloque les écritures que brièvement
+        total = 0
+        while True:
+            expired = Reservation.objects.expire_holds(batch_size=batch_size)
+            total += expired
+            if expired < batch_size:
+                return total
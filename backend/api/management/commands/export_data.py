@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from api.exports import EXPORTS, EXPORT_FORMATS, export_filters, export_lines, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'Exporte les réservations ou les horaires en CSV ou NDJSON, en flux'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='Fichier de sortie (sortie standard par défaut)')
+        parser.add_argument('--date-from', help='AAAA-MM-JJ inclus')
+        parser.add_argument('--date-to', help='AAAA-MM-JJ inclus')
+        parser.add_argument('--status', help='Statuts séparés par des virgules (réservations)')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        try:
+            start, end, statuses = export_filters(
+                kind, options['date_from'], options['date_to'], options['status']
+            )
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+        queryset = export_queryset(kind, start, end, statuses)
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else self.stdout
+        try:
+            for chunk in export_lines(kind, queryset, options['export_format']):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
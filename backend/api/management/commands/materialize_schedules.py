@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.timetables import materialize
+
+
+class Command(BaseCommand):
+    help = 'Crée les horaires des modèles récurrents sur les prochains jours (à lancer chaque jour)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'SCHEDULE_HORIZON_DAYS', 30))
+
+    def handle(self, *args, **options):
+        created = materialize(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"{created} horaires créés sur {options['days']} jours"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Supprime par paquets les clés d'idempotence expirées (IDEMPOTENCY_KEY_TTL_HOURS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys(options['batch_size'])
+        self.stdout.write(f"{deleted} clé(s) d'idempotence supprimée(s)")
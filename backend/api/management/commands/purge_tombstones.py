@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Supprime les traces de suppression plus anciennes que la rétention de la synchronisation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Rétention en jours (SYNC_TOMBSTONE_DAYS par défaut)')
+
+    def handle(self, *args, **options):
+        deleted = purge_tombstones(options['days'])
+        self.stdout.write(f'{deleted} trace(s) supprimée(s)')
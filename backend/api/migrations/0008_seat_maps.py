@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:15
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def assign_seats(apps, schema_editor):
+    """
+    Places des réservations actives numérotées dans l'ordre de réservation, plans et
+    places libres en conséquence : jusqu'ici available_seats n'était pas décrémenté
+    à la réservation. Un horaire surréservé reste à 0 place (signalé par audit_seats).
+    """
+    Bus = apps.get_model('api', 'Bus')
+    Reservation = apps.get_model('api', 'Reservation')
+    Schedule = apps.get_model('api', 'Schedule')
+    Schedule.objects.update(available_seats=Subquery(Bus.objects.filter(pk=OuterRef('bus_id')).values('capacity')[:1]))
+    holding = Reservation.objects.filter(status__in=('pending', 'confirmed')).order_by('schedule_id', 'created_at', 'id')
+    taken, batch = {}, []
+    for pk, schedule_id, seats in holding.values_list('id', 'schedule_id', 'number_of_seats').iterator(chunk_size=2000):
+        first = taken.get(schedule_id, 0) + 1
+        batch.append(Reservation(pk=pk, seat_numbers=list(range(first, first + seats))))
+        taken[schedule_id] = first + seats - 1
+        if len(batch) == 2000:
+            Reservation.objects.bulk_update(batch, ['seat_numbers'])
+            batch = []
+    Reservation.objects.bulk_update(batch, ['seat_numbers'])
+    capacities = dict(Schedule.objects.filter(pk__in=taken).values_list('id', 'bus__capacity'))
+    Schedule.objects.bulk_update([
+        Schedule(
+            pk=schedule_id,
+            seat_map=((1 << count) - 1).to_bytes((count + 7) // 8, 'little'),
+            available_seats=max(capacities[schedule_id] - count, 0),
+        )
+        for schedule_id, count in taken.items()
+    ], ['seat_map', 'available_seats'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='seat_numbers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='seat_map',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(assign_seats, migrations.RunPython.noop),
+    ]
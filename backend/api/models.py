@@ -1,8 +1,119 @@
-from django.db import models
+from datetime import datetime, timedelta
+
+from django.db import models, transaction
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, F, Q, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .seats import claim, free_seats, release
+from .signals import seats_changed
 
 # Create your models here.
 
+class ScheduleQuerySet(models.QuerySet):
+    def with_details(self):
+        # Charge en une seule requête les relations imbriquées par ScheduleSerializer
+        return self.select_related('bus', 'departure_location', 'arrival_location')
+
+    def reserve_seats(self, schedule_id, seats, seat_numbers=None):
+        """
+        Prend atomiquement `seats` places : les numéros demandés, sinon les premières
+        libres du plan (seats.py). Compare-and-swap : l'UPDATE n'est appliqué que si le
+        plan n'a pas changé depuis sa lecture, sinon on relit et on recommence ; seule
+        la ligne de l'horaire concerné est touchée, sans verrou. Retourne les numéros
+        pris, ou None s'il ne reste pas assez de places ou qu'une place demandée est prise.
+        """
+        while True:
+            row = self.filter(pk=schedule_id).values_list('seat_map', 'available_seats', 'bus__capacity').first()
+            if row is None:
+                return None
+            bitmap, available, capacity = bytes(row[0]), row[1], row[2]
+            if available < seats:
+                return None
+            numbers = sorted(seat_numbers) if seat_numbers else free_seats(bitmap, capacity, seats)
+            claimed = claim(bitmap, numbers, capacity) if numbers else None
+            if claimed is None:
+                return None
+            updated = self.filter(pk=schedule_id, seat_map=bitmap, available_seats__gte=seats).update(
+                seat_map=claimed,
+                available_seats=F('available_seats') - seats,
+                updated_at=timezone.now(),
+            )
+            if updated:
+                seats_changed.send(sender=Schedule, schedule_ids=[schedule_id])
+                return numbers
+
+    def release_seats(self, schedule_id, seats, seat_numbers=()):
+        self.release_seats_bulk({schedule_id: seats}, {schedule_id: seat_numbers})
+
+    def release_seats_bulk(self, seats_by_schedule, numbers_by_schedule=None):
+        """
+        Rend des places à plusieurs horaires en un seul UPDATE : {id horaire: places}
+        et leurs numéros {id horaire: [numéros]}. Les lignes sont verrouillées le
+        temps de recalculer les plans : une prise concurrente échoue alors à son
+        compare-and-swap et relit le plan à jour.
+        """
+        if not seats_by_schedule:
+            return
+        numbers_by_schedule = {pk: numbers for pk, numbers in (numbers_by_schedule or {}).items() if numbers}
+        changes = {
+            'available_seats': F('available_seats') + Case(
+                *(When(pk=pk, then=Value(seats)) for pk, seats in seats_by_schedule.items()),
+                output_field=models.IntegerField(),
+            ),
+            'updated_at': timezone.now(),
+        }
+        with transaction.atomic(savepoint=False):
+            if numbers_by_schedule:
+                bitmaps = self.select_for_update().filter(pk__in=numbers_by_schedule).values_list('id', 'seat_map')
+                changes['seat_map'] = Case(
+                    *(When(pk=pk, then=Value(release(bytes(bitmap), numbers_by_schedule[pk]))) for pk, bitmap in bitmaps),
+                    default=F('seat_map'),
+                    output_field=models.BinaryField(),
+                )
+            self.filter(pk__in=seats_by_schedule).update(**changes)
+        seats_changed.send(sender=Schedule, schedule_ids=list(seats_by_schedule))
+
+class RouteQuerySet(models.QuerySet):
+    def with_details(self):
+        return self.select_related('departure_location', 'arrival_location')
+
+class ReservationQuerySet(models.QuerySet):
+    def with_details(self):
+        # Utilisateur + profil (is_admin) et horaire complet pour ReservationSerializer
+        return self.select_related(
+            'user__profile',
+            'schedule__bus',
+            'schedule__departure_location',
+            'schedule__arrival_location',
+        )
+
+    def expire_holds(self, now=None, batch_size=500):
+        """
+        Annule un paquet de réservations en attente expirées et rend leurs places,
+        le tout dans une transaction. Retourne le nombre de réservations annulées
+        (0 quand il n'y a plus rien à expirer).
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            # skip_locked : plusieurs balayeurs (ou une confirmation en cours) ne se bloquent pas
+            batch = list(
+                self.select_for_update(skip_locked=True)
+                .filter(status='pending', expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', 'schedule_id', 'number_of_seats', 'seat_numbers')[:batch_size]
+            )
+            if not batch:
+                return 0
+            self.filter(pk__in=[pk for pk, _, _, _ in batch]).update(status='cancelled', updated_at=now)
+            seats_by_schedule, numbers_by_schedule = {}, {}
+            for _, schedule_id, seats, numbers in batch:
+                seats_by_schedule[schedule_id] = seats_by_schedule.get(schedule_id, 0) + seats
+                numbers_by_schedule.setdefault(schedule_id, []).extend(numbers)
+            Schedule.objects.release_seats_bulk(seats_by_schedule, numbers_by_schedule)
+        return len(batch)
+
 class Bus(models.Model):
     plate_number = models.CharField(max_length=20, unique=True)
     capacity = models.IntegerField()
@@ -14,7 +125,7 @@ class Bus(models.Model):
         return f"{self.model} - {self.plate_number}"
 
 class Location(models.Model):
-    city = models.CharField(max_length=100)
+    city = models.CharField(max_length=100, db_index=True)
     address = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -32,10 +143,68 @@ class Route(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RouteQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} ({self.departure_location} → {self.arrival_location})"
 
+class ScheduleTemplateQuerySet(models.QuerySet):
+    def active_on(self, date):
+        """Modèles valides à cette date et circulant ce jour de la semaine."""
+        return self.filter(
+            is_active=True,
+            valid_from__lte=date,
+            weekdays__contains=str(date.weekday()),
+        ).filter(models.Q(valid_until__isnull=True) | models.Q(valid_until__gte=date))
+
+class ScheduleTemplate(models.Model):
+    """
+    Horaire récurrent : un départ par jour de circulation entre valid_from et valid_until.
+    Les Schedule correspondants sont créés à la demande (voir timetables.py) ; une
+    modification du modèle ne s'applique qu'aux dates pas encore matérialisées.
+    """
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='schedule_templates')
+    bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='schedule_templates')
+    weekdays = models.CharField(max_length=7, default='0123456', help_text="Jours de circulation, 0 = lundi")
+    departure_time = models.TimeField()
+    valid_from = models.DateField()
+    valid_until = models.DateField(null=True, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Prix du trajet si vide")
+    is_active = models.BooleanField(default=True)
+    # Dernière date matérialisée d'un seul tenant par la commande materialize_schedules
+    materialized_until = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ScheduleTemplateQuerySet.as_manager()
+
+    def runs_on(self, date):
+        return (
+            self.is_active
+            and self.valid_from <= date
+            and (self.valid_until is None or date <= self.valid_until)
+            and str(date.weekday()) in self.weekdays
+        )
+
+    def occurrence(self, date):
+        """Schedule (non enregistré) du départ de ce jour. Le trajet et le bus doivent être chargés."""
+        departure_time = timezone.make_aware(datetime.combine(date, self.departure_time))
+        return Schedule(
+            template=self,
+            bus=self.bus,
+            departure_location_id=self.route.departure_location_id,
+            arrival_location_id=self.route.arrival_location_id,
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(minutes=self.route.duration),
+            price=self.price if self.price is not None else self.route.price,
+            available_seats=self.bus.capacity,
+        )
+
+    def __str__(self):
+        return f"{self.route} à {self.departure_time:%H:%M} ({self.weekdays})"
+
 class Schedule(models.Model):
+    template = models.ForeignKey(ScheduleTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='schedules')
     bus = models.ForeignKey(Bus, on_delete=models.CASCADE, related_name='schedules')
     departure_location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='departures')
     arrival_location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='arrivals')
@@ -43,9 +212,29 @@ class Schedule(models.Model):
     arrival_time = models.DateTimeField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available_seats = models.IntegerField()
+    # Places prises, un bit par place (seats.py) ; tenu à jour avec available_seats
+    seat_map = models.BinaryField(default=b'', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ScheduleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Recherche par ville de départ/arrivée puis plage horaire
+            models.Index(fields=['departure_location', 'arrival_location', 'departure_time'], name='schedule_search_idx'),
+            # Filtre par date seule et pagination (departure_time, id)
+            models.Index(fields=['departure_time', 'id'], name='schedule_departure_idx'),
+            # Synchronisation incrémentale (sync.py) : lignes modifiées depuis un jeton
+            models.Index(fields=['updated_at', 'id'], name='schedule_updated_idx'),
+            # Chevauchements des cars (fleet.py) : dernier départ d'un car avant une heure
+            models.Index(fields=['bus', 'departure_time'], name='schedule_bus_departure_idx'),
+        ]
+        constraints = [
+            # Un seul départ par modèle et par heure : la matérialisation peut être rejouée
+            models.UniqueConstraint(fields=['template', 'departure_time'], name='schedule_template_departure_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.departure_location} → {self.arrival_location} - {self.departure_time}"
 
@@ -54,9 +243,25 @@ class UserProfile(models.Model):
     full_name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
     is_admin = models.BooleanField(default=False)
+    # Incrémenté quand is_admin change : périme le rôle porté par les jetons déjà émis
+    role_version = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_admin = instance.__dict__.get('is_admin')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Les changements par QuerySet.update() doivent incrémenter role_version eux-mêmes
+        loaded = getattr(self, '_loaded_is_admin', None)
+        if not self._state.adding and loaded is not None and loaded != self.is_admin:
+            self.role_version += 1
+        super().save(*args, **kwargs)
+        self._loaded_is_admin = self.is_admin
+
     def __str__(self):
         return self.user.username
 
@@ -66,20 +271,118 @@ class Reservation(models.Model):
         ('confirmed', 'Confirmée'),
         ('cancelled', 'Annulée'),
     ]
+    # Statuts pour lesquels les places sont décomptées de l'horaire
+    HOLDING_STATUSES = ('pending', 'confirmed')
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='reservations')
     number_of_seats = models.IntegerField()
+    # Numéros des places attribuées dans le plan de l'horaire (conservés après annulation)
+    seat_numbers = models.JSONField(default=list, blank=True)
     special_requests = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Fin de la mise de côté des places d'une réservation en attente (voir expire_holds)
+    expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Réservations d'un utilisateur et liste admin, paginées par (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='reservation_user_idx'),
+            models.Index(fields=['created_at', 'id'], name='reservation_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='reservation_updated_idx'),
+            # Balayage des attentes expirées : index partiel, limité aux réservations en attente
+            models.Index(fields=['expires_at'], condition=Q(status='pending'), name='reservation_hold_idx'),
+        ]
+
+    @staticmethod
+    def hold_expiry():
+        return timezone.now() + timedelta(minutes=getattr(settings, 'RESERVATION_HOLD_MINUTES', 15))
+
     def save(self, *args, **kwargs):
         if not self.total_price:
             self.total_price = self.schedule.price * self.number_of_seats
         super().save(*args, **kwargs)
 
+    def cancel(self):
+        """
+        Annule la réservation et rend ses places à l'horaire.
+        La transition de statut est conditionnelle : en cas d'annulations
+        concurrentes, les places ne sont rendues qu'une seule fois.
+        """
+        with transaction.atomic():
+            cancelled = Reservation.objects.filter(
+                pk=self.pk, status__in=self.HOLDING_STATUSES
+            ).update(status='cancelled', updated_at=timezone.now())
+            if not cancelled:
+                return False
+            Schedule.objects.release_seats(self.schedule_id, self.number_of_seats, self.seat_numbers)
+        self.status = 'cancelled'
+        return True
+
+    def confirm(self):
+        """
+        Confirme une réservation en attente dont la mise de côté n'a pas expiré.
+        Conditionnelle comme cancel() : une réservation balayée ne peut plus être confirmée.
+        """
+        confirmed = Reservation.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+            pk=self.pk, status='pending',
+        ).update(status='confirmed', expires_at=None, updated_at=timezone.now())
+        if confirmed:
+            self.status, self.expires_at = 'confirmed', None
+        return confirmed == 1
+
     def __str__(self):
         return f"Réservation de {self.user.username} - {self.schedule}"
+
+class Tombstone(models.Model):
+    """
+    Trace d'une suppression (bus, lieu, trajet, horaire, réservation), pour que les
+    clients synchronisés (sync.py) retirent la ligne de leur copie locale.
+    Purgée au-delà de SYNC_TOMBSTONE_DAYS (commande purge_tombstones).
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField()
+    # Propriétaire d'une réservation supprimée : seul lui (ou un admin) la voit disparaître
+    owner_id = models.PositiveBigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at'], name='tombstone_model_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} supprimé le {self.deleted_at}"
+
+class IdempotencyKey(models.Model):
+    """
+    Réponse mémorisée d'une création de réservation pour un en-tête Idempotency-Key
+    (idempotency.py) : rejouée à l'identique quand le client renvoie la requête.
+    status_code vide : requête en cours. Purgée après expires_at (commande
+    purge_idempotency_keys).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    # Empreintes SHA-256 de la clé et de la requête : colonnes de taille fixe
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"Clé {self.key[:12]} de {self.user_id}"
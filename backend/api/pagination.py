@@ -0,0 +1,141 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardPagination(PageNumberPagination):
+    """
+    Pagination par numéro de page pour les catalogues (bus, lieux, trajets, utilisateurs).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur (keyset) : le curseur contient les valeurs de tous les
+    champs de `ordering` pour la dernière ligne lue, et la page suivante est lue par
+    une comparaison de tuple (champ, id) > (valeur, id). Pas d'OFFSET, même entre
+    lignes de même date : chaque page coûte O(taille de page) quelle que soit la
+    profondeur. Réponse : {next, previous, results}, comme CursorPagination.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    # Champs de tri ('-' pour décroissant), le dernier unique (id)
+    ordering = ('id',)
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def decode_cursor(self, request, model):
+        """(valeurs de la position, sens inverse) ; (None, False) sans curseur."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode(), validate=True))
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            if any(value is None for value in position):
+                raise ValueError
+            return position, bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        cursor = {'p': [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]}
+        if reverse:
+            cursor['r'] = 1
+        encoded = b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def after(ordering, position):
+        """Lignes situées après `position` dans l'ordre `ordering` : (a > x) OR (a = x AND b > y)..."""
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {other.lstrip('-'): value for other, value in zip(ordering[:index], position)}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': position[index]}))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            # Page précédente : lue à rebours depuis la position, puis remise dans l'ordre
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        page = list(queryset[:size + 1])
+        has_more = len(page) > size
+        page = page[:size]
+        if reverse:
+            page.reverse()
+        # Dans le sens de lecture, une ligne de plus dit s'il reste des pages ; dans
+        # l'autre, le curseur reçu dit qu'on vient de quelque part
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        self.next = self.encode_cursor(page[-1], False) if page and has_next else None
+        self.previous = self.encode_cursor(page[0], True) if page and has_previous else None
+        return page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Une seule lecture (la page et un élément de plus), confiée au thread de
+        # l'ORM comme le font les méthodes asynchrones des QuerySet
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+    def get_next_link(self):
+        return self.next
+
+    def get_previous_link(self):
+        return self.previous
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next, 'previous': self.previous, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SchedulePagination(KeysetPagination):
+    ordering = ('departure_time', 'id')
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
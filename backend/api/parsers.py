@@ -0,0 +1,49 @@
+import codecs
+import csv
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def read_csv(stream, encoding='utf-8'):
+    reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+    # Cellules vides = champ absent, pour laisser jouer les valeurs par défaut
+    return [{key: value for key, value in row.items() if value != ''} for row in reader]
+
+
+def read_ndjson(stream, encoding='utf-8'):
+    rows = []
+    for number, line in enumerate(codecs.iterdecode(stream, encoding), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError as exc:
+            raise ParseError(f'NDJSON invalide ligne {number} : {exc}')
+    return rows
+
+
+class CSVParser(BaseParser):
+    """Corps text/csv avec ligne d'en-tête : une liste de dictionnaires."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        try:
+            return read_csv(stream, encoding)
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f'CSV invalide : {exc}')
+
+
+class NDJSONParser(BaseParser):
+    """Un objet JSON par ligne (application/x-ndjson)."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        try:
+            return read_ndjson(stream, encoding)
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'NDJSON invalide : {exc}')
@@ -1,5 +1,21 @@
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import permissions
 
+def user_is_admin(user):
+    """
+    Rôle administrateur de l'utilisateur : celui résolu depuis le jeton par
+    JWTRoleAuthentication (sans requête), sinon celui du profil.
+    """
+    if not user or not user.is_authenticated:
+        return False
+    role = getattr(user, 'token_role', None)
+    if role is not None:
+        return role
+    try:
+        return user.profile.is_admin
+    except ObjectDoesNotExist:
+        return False
+
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
     Permet aux administrateurs d'avoir un accès complet en lecture/écriture.
@@ -8,14 +24,14 @@ class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return request.user and request.user.profile.is_admin
+        return user_is_admin(request.user)
 
 class IsAdminUser(permissions.BasePermission):
     """
     Permet uniquement aux administrateurs d'accéder à la vue.
     """
     def has_permission(self, request, view):
-        return request.user and request.user.profile.is_admin
+        return user_is_admin(request.user)
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
@@ -23,6 +39,6 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     Les autres utilisateurs ne peuvent accéder qu'à leurs propres données.
     """
     def has_object_permission(self, request, view, obj):
-        if request.user.profile.is_admin:
+        if user_is_admin(request.user):
             return True
         return obj.user == request.user 
\ No newline at end of file
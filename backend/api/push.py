@@ -0,0 +1,114 @@
+"""
+Diffusion des places disponibles aux clients abonnés (Server-Sent Events, voir
+SeatStreamView). Les receivers publient après chaque commit qui change des places ;
+chaque abonnement regroupe les mises à jour rapprochées (PUSH_COALESCE_MS) et
+n'envoie que la dernière valeur de chaque horaire.
+
+Le courtier est choisi par SEAT_BROKER (chemin de classe). InProcessBroker ne
+diffuse qu'aux abonnés du même processus : avec plusieurs workers, le remplacer
+par un courtier partagé offrant la même interface (subscribe, publish, watched).
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Subscription:
+    """Abonnement d'une connexion aux places d'un ensemble d'horaires."""
+
+    def __init__(self, broker, schedule_ids, loop):
+        self.broker = broker
+        self.schedule_ids = frozenset(schedule_ids)
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def offer(self, schedule_id, seats):
+        # Appelé depuis n'importe quel thread : la dernière valeur remplace la précédente
+        with self._lock:
+            self._pending[schedule_id] = seats
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:  # boucle fermée : la connexion est terminée
+            pass
+
+    async def next(self, timeout, coalesce):
+        """Mises à jour en attente {id: places}, ou {} si rien n'arrive avant timeout."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        if coalesce:
+            await asyncio.sleep(coalesce)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._ready.clear()
+        return pending
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_schedule = {}   # id d'horaire -> abonnements
+
+    def subscribe(self, schedule_ids):
+        subscription = Subscription(self, schedule_ids, asyncio.get_running_loop())
+        with self._lock:
+            for schedule_id in subscription.schedule_ids:
+                self._by_schedule.setdefault(schedule_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for schedule_id in subscription.schedule_ids:
+                subscribers = self._by_schedule.get(schedule_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_schedule[schedule_id]
+
+    def watched(self, schedule_ids):
+        """Horaires suivis par au moins un abonné : les autres ne sont pas relus."""
+        with self._lock:
+            return [schedule_id for schedule_id in schedule_ids if schedule_id in self._by_schedule]
+
+    def publish(self, seats_by_schedule):
+        with self._lock:
+            deliveries = [
+                (subscription, schedule_id, seats)
+                for schedule_id, seats in seats_by_schedule.items()
+                for subscription in self._by_schedule.get(schedule_id, ())
+            ]
+        for subscription, schedule_id, seats in deliveries:
+            subscription.offer(schedule_id, seats)
+
+
+_broker = None
+
+
+def seat_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(_setting('SEAT_BROKER', 'api.push.InProcessBroker'))()
+    return _broker
+
+
+def publish_seats(schedule_ids):
+    """Relit et diffuse les places des horaires suivis (après commit)."""
+    from .models import Schedule
+
+    broker = seat_broker()
+    watched = broker.watched(schedule_ids)
+    if watched:
+        broker.publish(dict(Schedule.objects.filter(pk__in=watched).values_list('id', 'available_seats')))
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+
+from .cache import (
+    invalidate_searches, invalidate_all_searches, invalidate_timetable_checks, schedule_snapshots,
+)
+from .authentication import forget_role, remember_role
+from .models import Bus, Location, Reservation, Route, Schedule, ScheduleTemplate, UserProfile
+from .journeys import journey_graph
+from .push import publish_seats
+from .search import search_index
+from .signals import seats_changed, schedules_written, catalog_written
+from .sync import record_deletion
+
+
+def schedule_snapshot(schedule):
+    return (schedule.departure_location.city, schedule.arrival_location.city, schedule.departure_time)
+
+
+@receiver(pre_save, sender=Schedule)
+def remember_schedule_before_save(sender, instance, **kwargs):
+    # Un horaire déplacé doit aussi disparaître des recherches de son ancien trajet/date
+    instance._previous_snapshots = schedule_snapshots([instance.pk]) if instance.pk else []
+
+
+def schedules_changed(schedule_ids, snapshots=None):
+    # Après le commit : invalider avant laisserait une lecture concurrente
+    # remettre en cache l'ancien état
+    def refresh():
+        invalidate_searches(snapshots if snapshots is not None else schedule_snapshots(schedule_ids))
+        search_index.refresh_schedules(schedule_ids)
+        journey_graph.refresh_schedules(schedule_ids)
+        publish_seats(schedule_ids)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Schedule)
+def schedule_saved(sender, instance, **kwargs):
+    snapshots = getattr(instance, '_previous_snapshots', []) + [schedule_snapshot(instance)]
+    schedules_changed([instance.pk], snapshots)
+
+
+@receiver(pre_delete, sender=Schedule)
+def schedule_deleted(sender, instance, **kwargs):
+    schedules_changed([instance.pk], [schedule_snapshot(instance)])
+
+
+@receiver(seats_changed)
+def schedule_seats_changed(sender, schedule_ids, **kwargs):
+    schedules_changed(schedule_ids)
+
+
+@receiver(schedules_written)
+def schedules_bulk_written(sender, schedule_ids, previous=None, **kwargs):
+    def refresh():
+        invalidate_searches((previous or []) + schedule_snapshots(schedule_ids))
+        search_index.refresh_schedules(schedule_ids)
+        journey_graph.refresh_schedules(schedule_ids)
+        publish_seats(schedule_ids)
+    transaction.on_commit(refresh)
+
+
+@receiver([post_save, post_delete], sender=Route)
+def route_changed(sender, **kwargs):
+    transaction.on_commit(search_index.refresh_routes)
+
+
+@receiver([post_save, post_delete], sender=ScheduleTemplate)
+def schedule_template_changed(sender, **kwargs):
+    # Les plages déjà vérifiées peuvent avoir de nouveaux départs à créer
+    transaction.on_commit(invalidate_timetable_checks)
+
+
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=Bus)
+@receiver(catalog_written)
+def catalog_changed(sender, **kwargs):
+    # Villes et bus sont imbriqués dans chaque résultat : rares, ces écritures invalident tout
+    def refresh():
+        invalidate_all_searches()
+        search_index.invalidate()
+        journey_graph.invalidate()
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remember_role(instance))
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_role(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # is_staff / is_active font partie du rôle en cache : relu à la prochaine requête
+    transaction.on_commit(lambda: forget_role(instance.pk))
+
+
+@receiver(post_delete, sender=Bus)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Route)
+@receiver(post_delete, sender=Schedule)
+def catalog_row_deleted(sender, instance, **kwargs):
+    # Dans la transaction de la suppression : la trace disparaît avec un rollback
+    record_deletion(instance)
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_deleted(sender, instance, **kwargs):
+    record_deletion(instance, owner_id=instance.user_id)
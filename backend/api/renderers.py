@@ -0,0 +1,43 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle : on retombe sur le module json de DRF
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    # Types que orjson ne connaît pas (Decimal, chaînes paresseuses, QuerySet...) : comme DRF
+    return _encoder.default(value)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encodé par orjson quand il est installé. La sortie est la même
+    (compacte, UTF-8) ; l'indentation demandée par le client passe par DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Dates confiées à l'encodeur DRF : même format (millisecondes, suffixe Z)
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser décodé par orjson quand il est installé."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,212 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import Route, Schedule
+
+
+def day_range(value):
+    """
+    Convertit une date 'AAAA-MM-JJ' en intervalle [début, lendemain) dans le fuseau courant.
+    Filtrer sur cet intervalle utilise l'index sur departure_time, contrairement à __date.
+    """
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({'date': 'Format de date invalide, attendu AAAA-MM-JJ.'})
+    start = timezone.make_aware(datetime.combine(day, day_time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), day_time.min))
+    return start, end
+
+
+class _Entry:
+    __slots__ = ('id', 'pair', 'departure', 'duration', 'price', 'seats', 'data')
+
+    def __init__(self, schedule, data):
+        self.id = schedule.pk
+        self.pair = (schedule.departure_location.city, schedule.arrival_location.city)
+        self.departure = schedule.departure_time.timestamp()
+        self.duration = schedule.arrival_time.timestamp() - self.departure
+        self.price = schedule.price
+        self.seats = schedule.available_seats
+        self.data = data
+
+    @property
+    def sort_key(self):
+        return (self.departure, self.id)
+
+    def as_dict(self):
+        # Les places changent sans reconstruire l'entrée : on les réinjecte à la lecture
+        return dict(self.data, available_seats=self.seats)
+
+
+class SearchIndex:
+    """
+    Index en mémoire des horaires à venir et des trajets, par paire de villes.
+
+    Chargé au premier accès, puis tenu à jour horaire par horaire depuis les
+    receivers (voir receivers.py). Les recherches ne touchent pas l'ORM. Chaque
+    worker a son propre index : il est reconstruit entièrement au-delà de
+    SEARCH_INDEX_MAX_AGE secondes pour rattraper les écritures des autres workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._pairs = {}       # (ville départ, ville arrivée) -> [(departure, id)] triée
+        self._entries = {}     # id -> _Entry
+        self._routes = {}      # (ville départ, ville arrivée) -> [données RouteSerializer]
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+
+    def _ensure_built(self, build=True):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            if not build:
+                return False
+            self.rebuild()
+        return True
+
+    def rebuild(self):
+        from .serializers import RouteSerializer, ScheduleListSerializer
+
+        # Sous verrou : une mise à jour incrémentale concurrente attend la fin de la
+        # reconstruction au lieu d'être appliquée à l'ancien index puis perdue
+        with self._lock:
+            schedules = list(Schedule.objects.with_details().filter(departure_time__gte=timezone.now()))
+            routes = list(Route.objects.with_details())
+            schedule_data = ScheduleListSerializer(schedules, many=True).data
+            route_data = RouteSerializer(routes, many=True).data
+
+            self._pairs, self._entries, self._routes = {}, {}, {}
+            for schedule, data in zip(schedules, schedule_data):
+                entry = _Entry(schedule, dict(data))
+                self._entries[entry.id] = entry
+                self._pairs.setdefault(entry.pair, []).append(entry.sort_key)
+            for keys in self._pairs.values():
+                keys.sort()
+            self._routes = self._group_routes(routes, route_data)
+            self._built_at = time.monotonic()
+
+    def _group_routes(self, routes, route_data):
+        grouped = {}
+        for route, data in zip(routes, route_data):
+            pair = (route.departure_location.city, route.arrival_location.city)
+            grouped.setdefault(pair, []).append(dict(data))
+        return grouped
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def refresh_schedules(self, schedule_ids):
+        """Recharge les horaires donnés (créés, modifiés, supprimés ou dont les places ont changé)."""
+        from .serializers import ScheduleListSerializer
+
+        if self._built_at is None:
+            return
+        schedules = list(Schedule.objects.with_details().filter(
+            pk__in=schedule_ids, departure_time__gte=timezone.now()
+        ))
+        schedule_data = ScheduleListSerializer(schedules, many=True).data
+        with self._lock:
+            for schedule_id in schedule_ids:
+                self._remove(schedule_id)
+            for schedule, data in zip(schedules, schedule_data):
+                entry = _Entry(schedule, dict(data))
+                self._entries[entry.id] = entry
+                insort(self._pairs.setdefault(entry.pair, []), entry.sort_key)
+
+    def refresh_routes(self):
+        # Les trajets sont peu nombreux : on les recharge tous
+        from .serializers import RouteSerializer
+
+        if self._built_at is None:
+            return
+        routes = list(Route.objects.with_details())
+        route_data = RouteSerializer(routes, many=True).data
+        with self._lock:
+            self._routes = self._group_routes(routes, route_data)
+
+    def _remove(self, schedule_id):
+        entry = self._entries.pop(schedule_id, None)
+        if entry is None:
+            return
+        keys = self._pairs[entry.pair]
+        position = bisect_left(keys, entry.sort_key)
+        if position < len(keys) and keys[position] == entry.sort_key:
+            del keys[position]
+
+    def _matching_pairs(self, mapping, departure, arrival):
+        if departure and arrival:
+            return [(departure, arrival)] if (departure, arrival) in mapping else []
+        return [
+            pair for pair in mapping
+            if (not departure or pair[0] == departure) and (not arrival or pair[1] == arrival)
+        ]
+
+    def search_schedules(self, departure=None, arrival=None, start=None, end=None,
+                         max_price=None, min_seats=1, ordering='departure', limit=50, build=True):
+        """
+        Horaires dont le départ est dans [start, end), au plus max_price et avec au moins
+        min_seats places libres. `ordering` : departure, -departure, price ou duration.
+        Avec build=False, retourne None au lieu de (re)construire l'index depuis la base
+        (appel depuis une vue asynchrone, où l'ORM synchrone est interdit).
+        """
+        with self._lock:
+            if not self._ensure_built(build):
+                return None
+            now = time.time()
+            lower = max(start.timestamp(), now) if start else now
+            upper = end.timestamp() if end else float('inf')
+            matches = []
+            for pair in self._matching_pairs(self._pairs, departure, arrival):
+                keys = self._pairs[pair]
+                for position in range(bisect_left(keys, (lower,)), len(keys)):
+                    departure_ts, schedule_id = keys[position]
+                    if departure_ts >= upper:
+                        break
+                    entry = self._entries[schedule_id]
+                    if entry.seats < min_seats or (max_price is not None and entry.price > max_price):
+                        continue
+                    matches.append(entry)
+
+        reverse = ordering.startswith('-')
+        field = ordering.lstrip('-')
+        if field == 'price':
+            matches.sort(key=lambda entry: (entry.price, entry.departure, entry.id), reverse=reverse)
+        elif field == 'duration':
+            matches.sort(key=lambda entry: (entry.duration, entry.departure, entry.id), reverse=reverse)
+        else:
+            matches.sort(key=lambda entry: entry.sort_key, reverse=reverse)
+        return len(matches), [entry.as_dict() for entry in matches[:limit]]
+
+    def search_routes(self, departure=None, arrival=None, max_price=None, ordering='price'):
+        with self._lock:
+            self._ensure_built()
+            routes = [
+                route
+                for pair in self._matching_pairs(self._routes, departure, arrival)
+                for route in self._routes[pair]
+                if max_price is None or Decimal(route['price']) <= max_price
+            ]
+        reverse = ordering.startswith('-')
+        field = ordering.lstrip('-')
+        if field in ('price', 'distance'):
+            routes.sort(key=lambda route: (Decimal(route[field]), route['id']), reverse=reverse)
+        else:
+            routes.sort(key=lambda route: (route[field], route['id']), reverse=reverse)
+        return routes
+
+
+search_index = SearchIndex()
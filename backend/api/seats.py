@@ -0,0 +1,50 @@
+"""
+Plan des places d'un horaire : un bit par place (place n = bit n - 1, octets en
+petit-boutiste) dans Schedule.seat_map, soit 7 octets pour un car de 50 places.
+Un plan vide (b'') est un car libre ; les bits au-delà du plan sont libres.
+"""
+
+
+def to_int(bitmap):
+    return int.from_bytes(bitmap or b'', 'little')
+
+
+def to_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def mask(seat_numbers):
+    value = 0
+    for seat in seat_numbers:
+        value |= 1 << (seat - 1)
+    return value
+
+
+def taken_seats(bitmap):
+    value = to_int(bitmap)
+    return [position + 1 for position in range(value.bit_length()) if value >> position & 1]
+
+
+def free_seats(bitmap, capacity, count):
+    """Les `count` premières places libres, ou None s'il y en a moins."""
+    value, found = to_int(bitmap), []
+    for position in range(capacity):
+        if not value >> position & 1:
+            found.append(position + 1)
+            if len(found) == count:
+                return found
+    return None
+
+
+def claim(bitmap, seat_numbers, capacity):
+    """Plan avec ces places prises, ou None si l'une est déjà prise ou hors du car."""
+    if any(not 1 <= seat <= capacity for seat in seat_numbers):
+        return None
+    value, wanted = to_int(bitmap), mask(seat_numbers)
+    if value & wanted:
+        return None
+    return to_bytes(value | wanted)
+
+
+def release(bitmap, seat_numbers):
+    return to_bytes(to_int(bitmap) & ~mask(seat_numbers))
@@ -1,15 +1,33 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Location, Bus, Route, Schedule, Reservation, UserProfile
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Location, Bus, Route, Schedule, ScheduleTemplate, Reservation, UserProfile
+from .bulk import PreloadedPrimaryKeyRelatedField
+from .fleet import bus_conflict, conflict_message
+from .seats import taken_seats
+from .signals import seats_changed
 
 class UserSerializer(serializers.ModelSerializer):
-    is_admin = serializers.BooleanField(source='profile.is_admin', read_only=True)
+    is_admin = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'is_admin', 'is_staff', 'is_superuser')
         read_only_fields = ('id', 'is_admin', 'is_staff', 'is_superuser')
 
+    def get_is_admin(self, user):
+        # Rôle déjà résolu depuis le jeton pour l'utilisateur courant (authentication.py)
+        role = getattr(user, 'token_role', None)
+        if role is not None:
+            return role
+        try:
+            return user.profile.is_admin
+        except ObjectDoesNotExist:
+            return None
+
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -45,13 +63,19 @@ class ScheduleSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Schedule
-        fields = '__all__'
+        # Le plan des places a son propre endpoint (ScheduleViewSet.seats)
+        exclude = ('seat_map',)
 
 class CreateUpdateScheduleSerializer(serializers.ModelSerializer):
+    # Chevauchements des cars vérifiés ligne par ligne ; les imports le font pour tout le lot
+    check_bus_overlap = True
+
     class Meta:
         model = Schedule
         fields = ('departure_location', 'arrival_location', 'bus', 'departure_time', 'arrival_time', 'price', 'available_seats')
-        
+        # Déduites de la capacité du car et du plan des places, écrites par les réservations
+        read_only_fields = ('available_seats',)
+
     def validate(self, data):
         # Validation que l'heure d'arrivée est après l'heure de départ
         if data.get('departure_time') and data.get('arrival_time'):
@@ -62,9 +86,87 @@ class CreateUpdateScheduleSerializer(serializers.ModelSerializer):
         if data.get('departure_location') and data.get('arrival_location'):
             if data['departure_location'] == data['arrival_location']:
                 raise serializers.ValidationError({"arrival_location": "Les lieux de départ et d'arrivée ne peuvent pas être identiques."})
-        
+
+        # Un car n'assure qu'un horaire à la fois (fleet.py)
+        if self.check_bus_overlap and {'bus', 'departure_time', 'arrival_time'} & set(data):
+            bus, departure, arrival = (
+                data.get(name, getattr(self.instance, name, None)) for name in ('bus', 'departure_time', 'arrival_time')
+            )
+            if bus is not None and departure and arrival:
+                conflict = bus_conflict(bus.pk, departure, arrival, exclude=getattr(self.instance, 'pk', None))
+                if conflict is not None:
+                    raise serializers.ValidationError({"bus": conflict_message(('schedule', conflict))})
+
+        # Places libres : capacité du car moins les places prises au plan
+        bus = data.get('bus')
+        if self.instance is None:
+            if bus is not None:
+                data['available_seats'] = bus.capacity
+        elif bus is not None and bus.pk != self.instance.bus_id:
+            taken = taken_seats(self.instance.seat_map)
+            if taken and taken[-1] > bus.capacity:
+                raise serializers.ValidationError({"bus": f"Place n° {taken[-1]} déjà réservée : ce car n'a que {bus.capacity} places."})
+            data['available_seats'] = bus.capacity - len(taken)
+
+        return data
+
+    def update(self, instance, validated_data):
+        # Seuls les champs envoyés sont écrits : places et plan, modifiés par les
+        # réservations entre la lecture et l'écriture, ne sont pas écrasés. Un
+        # changement de car décale les places libres de l'écart de capacité, en base.
+        previous_capacity = instance.bus.capacity
+        available = validated_data.pop('available_seats', None)
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        with transaction.atomic():
+            instance.save(update_fields=[*validated_data, 'updated_at'])
+            if available is not None:
+                Schedule.objects.filter(pk=instance.pk).update(
+                    available_seats=F('available_seats') + (instance.bus.capacity - previous_capacity)
+                )
+                instance.refresh_from_db(fields=['available_seats'])
+                seats_changed.send(sender=Schedule, schedule_ids=[instance.pk])
+        return instance
+
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleTemplate
+        fields = '__all__'
+        read_only_fields = ('materialized_until', 'created_at', 'updated_at')
+
+    def validate_weekdays(self, value):
+        if not value or any(day not in '0123456' for day in value):
+            raise serializers.ValidationError("Jours de 0 (lundi) à 6 (dimanche), par exemple '01234'.")
+        return ''.join(sorted(set(value)))
+
+    def validate(self, data):
+        valid_from = data.get('valid_from', getattr(self.instance, 'valid_from', None))
+        valid_until = data.get('valid_until', getattr(self.instance, 'valid_until', None))
+        if valid_from and valid_until and valid_until < valid_from:
+            raise serializers.ValidationError({"valid_until": "La fin de validité doit être après le début."})
         return data
 
+class BulkScheduleSerializer(CreateUpdateScheduleSerializer):
+    # Mêmes règles que CreateUpdateScheduleSerializer, sans requête par ligne pour les clés étrangères
+    departure_location = PreloadedPrimaryKeyRelatedField(queryset=Location.objects.all())
+    arrival_location = PreloadedPrimaryKeyRelatedField(queryset=Location.objects.all())
+    bus = PreloadedPrimaryKeyRelatedField(queryset=Bus.objects.all())
+    # Chevauchements vérifiés pour tout le lot (ScheduleViewSet.validate_batch)
+    check_bus_overlap = False
+
+    def validate(self, data):
+        data = super().validate(data)
+        if self.instance is not None and 'available_seats' in data:
+            # Comme update() : bulk_update écrit l'écart de capacité en base plutôt
+            # que des places libres lues avant les réservations concurrentes
+            delta = data['bus'].capacity - self.instance.bus.capacity
+            data['available_seats'] = F('available_seats') + delta
+        return data
+
+class BulkBusSerializer(BusSerializer):
+    # L'unicité de plate_number est vérifiée pour tout le lot (BusViewSet.validate_batch)
+    plate_number = serializers.CharField(max_length=20)
+
 class ReservationSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     schedule = ScheduleSerializer(read_only=True)
@@ -72,20 +174,172 @@ class ReservationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reservation
         fields = '__all__'
-        read_only_fields = ('user', 'total_price', 'created_at', 'updated_at')
+        # Les places et le statut ne changent que via la création, cancel() et la suppression,
+        # qui maintiennent Schedule.available_seats à jour
+        read_only_fields = (
+            'user', 'number_of_seats', 'seat_numbers', 'status', 'total_price', 'expires_at', 'created_at', 'updated_at',
+        )
+
+# Sérialisation rapide des listes : mêmes sorties que ScheduleSerializer et
+# ReservationSerializer, construites directement en dictionnaires sans instancier
+# ni parcourir les champs DRF pour chaque objet.
+
+class FastRepresentation:
+    """
+    Dictionnaires de sortie pour une liste. Le fuseau courant est lu une fois et
+    les lieux, bus et utilisateurs, répétés d'une ligne à l'autre, ne sont
+    convertis qu'une fois (les dictionnaires imbriqués sont partagés).
+    """
+
+    def __init__(self):
+        self.tz = timezone.get_current_timezone()
+        self.related = {}
+
+    def datetime(self, value):
+        # Format de serializers.DateTimeField : ISO 8601 dans le fuseau courant, UTC en « Z »
+        if value is None:
+            return None
+        value = value.astimezone(self.tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    def decimal(self, value):
+        return None if value is None else f'{value:.2f}'
+
+    def _related(self, kind, obj, build):
+        key = (kind, obj.pk)
+        if key not in self.related:
+            self.related[key] = build(obj)
+        return self.related[key]
+
+    def location(self, location):
+        return self._related('location', location, lambda location: {
+            'id': location.id,
+            'city': location.city,
+            'address': location.address,
+            'created_at': self.datetime(location.created_at),
+            'updated_at': self.datetime(location.updated_at),
+        })
+
+    def bus(self, bus):
+        return self._related('bus', bus, lambda bus: {
+            'id': bus.id,
+            'plate_number': bus.plate_number,
+            'capacity': bus.capacity,
+            'model': bus.model,
+            'created_at': self.datetime(bus.created_at),
+            'updated_at': self.datetime(bus.updated_at),
+        })
+
+    def user(self, user):
+        return self._related('user', user, self._user)
+
+    def _user(self, user):
+        try:
+            is_admin = user.profile.is_admin
+        except ObjectDoesNotExist:
+            is_admin = None  # comme UserSerializer pour un utilisateur sans profil
+        return {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'is_admin': is_admin,
+            'is_staff': user.is_staff,
+            'is_superuser': user.is_superuser,
+        }
+
+    def schedule(self, schedule):
+        return {
+            'id': schedule.id,
+            'departure_location': self.location(schedule.departure_location),
+            'arrival_location': self.location(schedule.arrival_location),
+            'bus': self.bus(schedule.bus),
+            'departure_time': self.datetime(schedule.departure_time),
+            'arrival_time': self.datetime(schedule.arrival_time),
+            'price': self.decimal(schedule.price),
+            'available_seats': schedule.available_seats,
+            'created_at': self.datetime(schedule.created_at),
+            'updated_at': self.datetime(schedule.updated_at),
+            'template': schedule.template_id,
+        }
+
+    def reservation(self, reservation):
+        return {
+            'id': reservation.id,
+            'user': self.user(reservation.user),
+            'schedule': self.schedule(reservation.schedule),
+            'number_of_seats': reservation.number_of_seats,
+            'seat_numbers': reservation.seat_numbers,
+            'special_requests': reservation.special_requests,
+            'status': reservation.status,
+            'total_price': self.decimal(reservation.total_price),
+            'expires_at': self.datetime(reservation.expires_at),
+            'created_at': self.datetime(reservation.created_at),
+            'updated_at': self.datetime(reservation.updated_at),
+        }
+
+class FastListSerializer(serializers.BaseSerializer):
+    """Lecture seule ; avec many=True, la même FastRepresentation sert à toute la liste."""
+    method = None
+
+    @property
+    def representation(self):
+        if not hasattr(self, '_representation'):
+            self._representation = FastRepresentation()
+        return self._representation
+
+    def to_representation(self, instance):
+        return getattr(self.representation, self.method)(instance)
+
+class ScheduleListSerializer(FastListSerializer):
+    """Sortie de ScheduleSerializer, pour les listes (with_details())."""
+    method = 'schedule'
+
+class ReservationListSerializer(FastListSerializer):
+    """Sortie de ReservationSerializer, pour les listes (with_details())."""
+    method = 'reservation'
 
 class CreateReservationSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False)
+    # Places choisies sur le plan ; sans choix, les premières places libres
+    seat_numbers = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
 
     class Meta:
         model = Reservation
-        fields = ('user', 'schedule', 'number_of_seats', 'special_requests')
+        fields = ('id', 'user', 'schedule', 'number_of_seats', 'seat_numbers', 'special_requests')
 
     def validate(self, data):
         schedule = data['schedule']
         number_of_seats = data['number_of_seats']
 
+        if number_of_seats < 1:
+            raise serializers.ValidationError({"number_of_seats": "Le nombre de places doit être au moins 1."})
+
         if number_of_seats > schedule.available_seats:
             raise serializers.ValidationError("Pas assez de places disponibles")
 
-        return data 
\ No newline at end of file
+        seat_numbers = data.get('seat_numbers')
+        if seat_numbers:
+            if len(set(seat_numbers)) != len(seat_numbers) or len(seat_numbers) != number_of_seats:
+                raise serializers.ValidationError({"seat_numbers": "Une place distincte par place réservée."})
+            if max(seat_numbers) > schedule.bus.capacity:
+                raise serializers.ValidationError({"seat_numbers": f"Places numérotées de 1 à {schedule.bus.capacity}."})
+
+        return data
+
+    def create(self, validated_data):
+        # La vérification de validate() peut être périmée : seule la prise atomique
+        # des places fait foi, dans la même transaction que la réservation
+        with transaction.atomic():
+            seat_numbers = Schedule.objects.reserve_seats(
+                validated_data['schedule'].pk, validated_data['number_of_seats'], validated_data.get('seat_numbers')
+            )
+            if seat_numbers is None:
+                if validated_data.get('seat_numbers'):
+                    raise serializers.ValidationError({"seat_numbers": "Une des places demandées n'est plus libre."})
+                raise serializers.ValidationError("Pas assez de places disponibles")
+            validated_data['seat_numbers'] = seat_numbers
+            # Places mises de côté jusqu'à la confirmation, sinon rendues par expire_reservations
+            validated_data['expires_at'] = Reservation.hold_expiry()
+            return super().create(validated_data) 
\ No newline at end of file
@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Envoyé quand les places disponibles d'horaires changent par UPDATE direct
+# (réservation, annulation), c'est-à-dire sans passer par Schedule.save().
+# Argument : schedule_ids
+seats_changed = Signal()
+
+# Envoyé après des écritures en masse d'horaires (bulk_create/bulk_update), qui
+# n'émettent pas post_save. Arguments : schedule_ids, previous (instantanés
+# cache.schedule_snapshots d'avant modification, ou None)
+schedules_written = Signal()
+
+# Envoyé après des écritures en masse de bus ou de lieux
+catalog_written = Signal()
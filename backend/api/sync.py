@@ -0,0 +1,115 @@
+"""
+Synchronisation incrémentale : un client garde une copie locale d'une liste et ne
+télécharge ensuite que les lignes créées ou modifiées (updated_at) et les
+identifiants supprimés (Tombstone) depuis son dernier jeton.
+
+Le client retire d'abord les ids de `deleted`, puis applique `changes` comme des
+remplacements par id : une ligne peut revenir plusieurs fois. Le jeton d'une
+dernière page est reculé de SYNC_WATERMARK_LAG_SECONDS pour rattraper les
+transactions validées après la lecture. Les objets imbriqués (lieux, bus) ne
+changent pas l'updated_at des lignes qui les contiennent : ils se synchronisent
+par leur propre liste.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Tombstone
+
+SALT = 'api.sync'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_PAGE_SIZE = 1000
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def encode_watermark(moment, last_id=0):
+    """Jeton opaque et signé : position (updated_at, id) de la dernière ligne envoyée."""
+    return signing.dumps([(moment - EPOCH) // timedelta(microseconds=1), last_id], salt=SALT)
+
+
+def decode_watermark(token):
+    try:
+        microseconds, last_id = signing.loads(token, salt=SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValidationError({'since': 'Jeton de synchronisation invalide.'})
+    return EPOCH + timedelta(microseconds=microseconds), last_id
+
+
+def record_deletion(instance, owner_id=None):
+    Tombstone.objects.create(model=instance._meta.model_name, object_id=instance.pk, owner_id=owner_id)
+
+
+def purge_tombstones(days=None):
+    days = _setting('SYNC_TOMBSTONE_DAYS', 30) if days is None else days
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+class SyncMixin:
+    """
+    Action `changes` (GET <liste>/changes/?since=<jeton>&limit=<n>) : lignes
+    modifiées depuis le jeton, par (updated_at, id), et identifiants supprimés.
+    Sans jeton : toute la liste, par pages. Réponse :
+    {'changes': [...], 'deleted': [ids], 'watermark': jeton suivant, 'has_more': bool}.
+    Un jeton plus ancien que la rétention des suppressions répond 410 : le client
+    recharge alors la liste complète.
+    """
+    sync_serializer_class = None
+
+    def get_sync_queryset(self):
+        return self.get_queryset()
+
+    def get_sync_tombstones(self):
+        return Tombstone.objects.filter(model=self.get_sync_queryset().model._meta.model_name)
+
+    def get_sync_serializer(self, rows):
+        serializer_class = self.sync_serializer_class or self.serializer_class
+        return serializer_class(rows, many=True, context=self.get_serializer_context())
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        started = timezone.now()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 500)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({'limit': 'Entier attendu.'})
+
+        queryset = self.get_sync_queryset()
+        deleted = []
+        token = request.query_params.get('since')
+        if token:
+            since, last_id = decode_watermark(token)
+            if since < started - timedelta(days=_setting('SYNC_TOMBSTONE_DAYS', 30)):
+                return Response(
+                    {'error': 'Jeton trop ancien : rechargez la liste complète'},
+                    status=status.HTTP_410_GONE,
+                )
+            queryset = queryset.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=last_id))
+            deleted = list(
+                self.get_sync_tombstones().filter(deleted_at__gte=since)
+                .order_by('object_id').values_list('object_id', flat=True).distinct()
+            )
+
+        rows = list(queryset.order_by('updated_at', 'id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if has_more:
+            watermark = encode_watermark(rows[-1].updated_at, rows[-1].pk)
+        else:
+            watermark = encode_watermark(started - timedelta(seconds=_setting('SYNC_WATERMARK_LAG_SECONDS', 5)))
+        return Response({
+            'changes': self.get_sync_serializer(rows).data,
+            'deleted': deleted,
+            'watermark': watermark,
+            'has_more': has_more,
+        })
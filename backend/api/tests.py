@@ -1,3 +1,1683 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import random
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_login_failed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection, connections
+from django.db.models import Sum
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient, APITestCase
+
+from . import benchmark, idempotency, login, push, seats, sync
+from .authentication import role_cache_timeout, tokens_for_user
+from .cache import search_cache
+from .renderers import FastJSONParser, FastJSONRenderer
+from .serializers import (
+    ReservationListSerializer, ReservationSerializer, ScheduleListSerializer, ScheduleSerializer,
+)
+from .instrumentation import percentile, request_metrics
+from .fleet import BusTimeline
+from .journeys import journey_graph
+from .search import search_index
+from .models import Bus, IdempotencyKey, Location, Route, Schedule, ScheduleTemplate, Reservation, Tombstone, UserProfile
+from .views import ScheduleViewSet
+
+
+class BaseTestCase(APITestCase):
+    """Les caches (locmem) survivent d'un test à l'autre : on repart à vide."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        search_index.invalidate()
+        journey_graph.invalidate()
+
+
+def create_user(username, is_admin=False):
+    user = User.objects.create_user(username=username, is_staff=is_admin)
+    UserProfile.objects.create(user=user, full_name=username, phone='0600000000', is_admin=is_admin)
+    return user
+
+
+def create_schedules(count, bus=None, departure=None, arrival=None, start=None, seats=50):
+    """Crée `count` horaires espacés d'une heure (bulk_create pour les gros volumes)."""
+    bus = bus or Bus.objects.create(plate_number=f'BUS-{Bus.objects.count()}', capacity=seats, model='Irizar')
+    departure = departure or Location.objects.create(city='Casablanca', address='Gare routière')
+    arrival = arrival or Location.objects.create(city='Rabat', address='Kamra')
+    start = start or timezone.now() + timedelta(days=1)
+    Schedule.objects.bulk_create([
+        Schedule(
+            bus=bus,
+            departure_location=departure,
+            arrival_location=arrival,
+            departure_time=start + timedelta(hours=i),
+            arrival_time=start + timedelta(hours=i, minutes=90),
+            price=Decimal('80.00'),
+            available_seats=seats,
+        )
+        for i in range(count)
+    ])
+    return Schedule.objects.order_by('-id')[:count]
+
+
+def create_reservations(count, schedule, users):
+    Reservation.objects.bulk_create([
+        Reservation(
+            user=users[i % len(users)],
+            schedule=schedule,
+            number_of_seats=1,
+            total_price=schedule.price,
+        )
+        for i in range(count)
+    ])
+
+
+class ListQueryCountTests(BaseTestCase):
+    """Le nombre de requêtes des listes ne doit pas dépendre du nombre de lignes."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user('admin', is_admin=True)
+        self.client.force_authenticate(self.admin)
+
+    def count_queries(self, url):
+        # bulk_create n'invalide pas le cache de recherche : on mesure la requête réelle
+        search_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_flat(self, url, grow, small=10, large=10000):
+        grow(small)
+        baseline = self.count_queries(url)
+        grow(large - small)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_reservation_lists(self):
+        schedule = create_schedules(1)[0]
+        users = [create_user(f'client{i}') for i in range(5)]
+
+        def grow(n):
+            create_reservations(n, schedule, users)
+
+        self.assert_flat('/api/reservations/', grow)
+        self.assertEqual(
+            self.count_queries('/api/reservations/user/'),
+            self.count_queries('/api/reservations/'),
+        )
+
+    def test_schedule_list(self):
+        bus = Bus.objects.create(plate_number='AB-123', capacity=50, model='Irizar')
+        departure = Location.objects.create(city='Casablanca', address='Gare routière')
+        arrival = Location.objects.create(city='Rabat', address='Kamra')
+
+        def grow(n):
+            create_schedules(n, bus=bus, departure=departure, arrival=arrival)
+
+        self.assert_flat('/api/schedules/', grow)
+
+    def test_route_list(self):
+        locations = [Location.objects.create(city=f'Ville {i}', address='Centre') for i in range(4)]
+
+        def grow(n):
+            Route.objects.bulk_create([
+                Route(
+                    name=f'Ligne {i}',
+                    departure_location=locations[i % 4],
+                    arrival_location=locations[(i + 1) % 4],
+                    distance=Decimal('90.00'),
+                    duration=90,
+                    price=Decimal('80.00'),
+                )
+                for i in range(n)
+            ])
+
+        self.assert_flat('/api/routes/', grow)
+
+
+class PaginationTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user('admin', is_admin=True)
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(row['id'] for row in data['results'])
+            url, pages = data['next'], pages + 1
+        return ids, pages
+
+    def test_schedule_cursor_walks_in_departure_order(self):
+        create_schedules(120)
+        ids, pages = self.walk('/api/schedules/?page_size=50')
+        expected = list(Schedule.objects.order_by('departure_time', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_reservation_cursor_newest_first(self):
+        schedule = create_schedules(1)[0]
+        create_reservations(30, schedule, [self.admin])
+        ids, pages = self.walk('/api/reservations/user/?page_size=20')
+        expected = list(Reservation.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 2)
+
+    def test_cursor_keys_on_date_and_id_without_offset(self):
+        schedule = create_schedules(1)[0]
+        create_reservations(25, schedule, [self.admin])
+        Reservation.objects.update(created_at=timezone.now())
+        expected = list(Reservation.objects.order_by('-id').values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as ctx:
+            ids, pages = self.walk('/api/reservations/?page_size=10')
+        self.assertEqual((ids, pages), (expected, 3))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in ctx.captured_queries))
+
+        # Retour en arrière depuis la dernière page
+        data = self.client.get('/api/reservations/?page_size=10').json()
+        data = self.client.get(self.client.get(data['next']).json()['next']).json()
+        back = self.client.get(data['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], expected[10:20])
+        self.assertEqual([row['id'] for row in self.client.get(back['previous']).json()['results']], expected[:10])
+        self.assertEqual(self.client.get('/api/reservations/?cursor=abc').status_code, 404)
+
+    def test_catalog_page_size_is_capped(self):
+        Location.objects.bulk_create([Location(city=f'Ville {i}', address='Centre') for i in range(600)])
+        data = self.client.get('/api/locations/?page_size=1000').json()
+        self.assertEqual(data['count'], 600)
+        self.assertEqual(len(data['results']), 500)
+
+
+class SeatInventoryTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('client')
+        self.client.force_authenticate(self.user)
+        self.schedule = create_schedules(1, seats=10)[0]
+
+    def book(self, seats, schedule=None):
+        return self.client.post('/api/reservations/', {
+            'schedule': (schedule or self.schedule).pk,
+            'number_of_seats': seats,
+        })
+
+    def seats_left(self):
+        self.schedule.refresh_from_db()
+        return self.schedule.available_seats
+
+    def test_booking_decrements_and_cancel_restores_once(self):
+        self.assertEqual(self.book(4).status_code, 201)
+        self.assertEqual(self.seats_left(), 6)
+        reservation = Reservation.objects.get()
+        url = f'/api/reservations/{reservation.pk}/cancel/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.seats_left(), 10)
+
+    def test_delete_releases_seats(self):
+        self.book(3)
+        reservation = Reservation.objects.get()
+        self.assertEqual(self.client.delete(f'/api/reservations/{reservation.pk}/').status_code, 204)
+        self.assertEqual(self.seats_left(), 10)
+
+    def test_rejects_overbooking_and_invalid_counts(self):
+        self.assertEqual(self.book(11).status_code, 400)
+        self.assertEqual(self.book(0).status_code, 400)
+        self.assertEqual(self.seats_left(), 10)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_update_cannot_change_seats(self):
+        self.book(2)
+        reservation = Reservation.objects.get()
+        self.client.patch(f'/api/reservations/{reservation.pk}/', {'number_of_seats': 9, 'status': 'cancelled'})
+        reservation.refresh_from_db()
+        self.assertEqual((reservation.number_of_seats, reservation.status), (2, 'pending'))
+
+
+class SeatMapTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+        self.schedule = create_schedules(1, seats=10)[0]
+
+    def book(self, seats, seat_numbers=None):
+        data = {'schedule': self.schedule.pk, 'number_of_seats': seats}
+        if seat_numbers is not None:
+            data['seat_numbers'] = seat_numbers
+        return self.client.post('/api/reservations/', data, format='json')
+
+    def taken(self):
+        return self.client.get(f'/api/schedules/{self.schedule.pk}/seats/').json()['taken']
+
+    def test_bitmap_helpers(self):
+        bitmap = seats.claim(b'', [1, 3, 9], 10)
+        self.assertEqual(bitmap, bytes([0b101, 0b1]))
+        self.assertEqual(seats.taken_seats(bitmap), [1, 3, 9])
+        self.assertEqual(seats.free_seats(bitmap, 10, 3), [2, 4, 5])
+        self.assertIsNone(seats.free_seats(bitmap, 10, 8))
+        self.assertIsNone(seats.claim(bitmap, [2, 3], 10))
+        self.assertIsNone(seats.claim(bitmap, [11], 10))
+        self.assertEqual(seats.taken_seats(seats.release(bitmap, [9])), [1, 3])
+
+    def test_first_free_seats_and_chosen_seats(self):
+        self.assertEqual(self.book(2).json()['seat_numbers'], [1, 2])
+        self.assertEqual(self.book(2, [7, 4]).json()['seat_numbers'], [4, 7])
+        self.assertEqual(self.book(1).json()['seat_numbers'], [3])
+        self.assertEqual(self.taken(), [1, 2, 3, 4, 7])
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 5)
+
+    def test_rejects_taken_or_invalid_seats(self):
+        self.book(1, [5])
+        response = self.book(2, [5, 6])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('seat_numbers', response.json())
+        self.assertEqual(self.book(2, [6]).status_code, 400)
+        self.assertEqual(self.book(2, [6, 6]).status_code, 400)
+        self.assertEqual(self.book(1, [11]).status_code, 400)
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertEqual(self.taken(), [5])
+
+    def test_cancel_and_sweep_free_the_seats(self):
+        kept = self.book(2, [1, 2]).json()['id']
+        cancelled = self.book(2, [3, 4]).json()['id']
+        self.book(1, [8])
+        self.client.post(f'/api/reservations/{cancelled}/cancel/')
+        self.assertEqual(self.taken(), [1, 2, 8])
+        Reservation.objects.exclude(pk=kept).update(expires_at=timezone.now() - timedelta(minutes=1))
+        Reservation.objects.expire_holds()
+        self.assertEqual(self.taken(), [1, 2])
+        # Les places libérées sont reprises dans l'ordre
+        self.assertEqual(self.book(3).json()['seat_numbers'], [3, 4, 5])
+
+    def test_schedule_updates_keep_seats_consistent(self):
+        self.book(3, [2, 5, 8])
+        admin = create_user('admin', is_admin=True)
+        self.client.force_authenticate(admin)
+        url = f'/api/schedules/{self.schedule.pk}/'
+        response = self.client.patch(url, {'available_seats': 10, 'price': '90.00'}, format='json')
+        self.assertEqual((response.status_code, response.json()['available_seats']), (200, 7))
+        small = Bus.objects.create(plate_number='SM-1', capacity=6, model='Sprinter')
+        response = self.client.patch(url, {'bus': small.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bus', response.json())
+        large = Bus.objects.create(plate_number='LG-1', capacity=60, model='Irizar')
+        response = self.client.patch(url, {'bus': large.pk}, format='json')
+        self.assertEqual(response.json()['available_seats'], 57)
+        response = self.client.patch('/api/schedules/bulk/', [{'id': self.schedule.pk, 'bus': small.pk}], format='json')
+        self.assertEqual(response.status_code, 400)
+        other = Bus.objects.create(plate_number='LG-2', capacity=40, model='Irizar')
+        self.client.patch('/api/schedules/bulk/', [{'id': self.schedule.pk, 'bus': other.pk}], format='json')
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 37)
+        call_command('audit_seats', stdout=io.StringIO())
+
+    def test_bulk_bus_change_keeps_concurrent_bookings(self):
+        self.book(3)
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        large = Bus.objects.create(plate_number='LG-1', capacity=40, model='Irizar')
+        validate_batch = ScheduleViewSet.validate_batch
+        other = APIClient()
+        other.force_authenticate(create_user('other'))
+
+        def booked_meanwhile(viewset, items):
+            # Réservation entre la lecture des horaires et leur écriture
+            other.post('/api/reservations/', {'schedule': self.schedule.pk, 'number_of_seats': 2}, format='json')
+            return validate_batch(viewset, items)
+
+        with mock.patch.object(ScheduleViewSet, 'validate_batch', booked_meanwhile):
+            response = self.client.patch('/api/schedules/bulk/', [{'id': self.schedule.pk, 'bus': large.pk}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 35)
+        call_command('audit_seats', stdout=io.StringIO())
+
+    def test_audit_seats(self):
+        self.book(3)
+        call_command('audit_seats', stdout=io.StringIO())
+        Schedule.objects.filter(pk=self.schedule.pk).update(seat_map=b'')
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('audit_seats', stdout=out)
+        self.assertIn(f'Horaire {self.schedule.pk}', out.getvalue())
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+
+    def test_concurrent_bookings_never_oversell(self):
+        users = [create_user(f'client{i}') for i in range(20)]
+        crowded = create_schedules(1, seats=50)[0]
+        other = create_schedules(1, seats=200)[0]
+
+        def book(i):
+            client = APIClient()
+            client.force_authenticate(users[i % len(users)])
+            try:
+                schedule = crowded if i % 2 else other
+                return schedule.pk, client.post('/api/reservations/', {
+                    'schedule': schedule.pk,
+                    'number_of_seats': 1,
+                }).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(book, range(400)))
+
+        crowded.refresh_from_db()
+        other.refresh_from_db()
+        crowded_ok = sum(1 for pk, code in results if pk == crowded.pk and code == 201)
+        other_ok = sum(1 for pk, code in results if pk == other.pk and code == 201)
+        self.assertEqual(crowded_ok, 50)
+        self.assertEqual(crowded.available_seats, 0)
+        self.assertEqual(Reservation.objects.filter(schedule=crowded).count(), 50)
+        # Chaque place n'est attribuée qu'une fois
+        rows = Reservation.objects.filter(schedule=crowded).values_list('seat_numbers', flat=True)
+        numbers = sorted(number for row in rows for number in row)
+        self.assertEqual(numbers, list(range(1, 51)))
+        # L'horaire voisin n'est pas pénalisé par la contention sur le premier
+        self.assertEqual(other_ok, 200)
+        self.assertEqual(other.available_seats, 0)
+
+
+class IdempotencyTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('client')
+        self.client.force_authenticate(self.user)
+        self.schedule = create_schedules(1, seats=10)[0]
+
+    def book(self, key, seats=2):
+        return self.client.post(
+            '/api/reservations/', {'schedule': self.schedule.pk, 'number_of_seats': seats},
+            format='json', headers={'Idempotency-Key': key},
+        )
+
+    def seats_left(self):
+        self.schedule.refresh_from_db()
+        return self.schedule.available_seats
+
+    def test_replay_returns_first_response_once(self):
+        first = self.book('retry-1')
+        self.assertEqual(first.status_code, 201)
+        again = self.book('retry-1')
+        self.assertEqual((again.status_code, again.json()), (201, first.json()))
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual((Reservation.objects.count(), self.seats_left()), (1, 8))
+        # Autre clé : nouvelle réservation ; même clé pour un autre corps : refusée
+        self.assertEqual(self.book('retry-2').status_code, 201)
+        self.assertEqual(self.book('retry-1', seats=3).status_code, 422)
+        # Les clés sont propres à chaque utilisateur
+        self.client.force_authenticate(create_user('other'))
+        self.assertEqual(self.book('retry-1').status_code, 201)
+        self.assertEqual(Reservation.objects.count(), 3)
+
+    def test_failures_are_not_remembered(self):
+        self.assertEqual(self.book('big', seats=11).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.book('', seats=1).status_code, 400)
+        self.assertEqual(self.client.post('/api/reservations/', {
+            'schedule': self.schedule.pk, 'number_of_seats': 1,
+        }, format='json').status_code, 201)
+
+    def test_in_progress_and_abandoned_keys(self):
+        request = mock.Mock(method='POST', path='/api/reservations/', data={
+            'schedule': self.schedule.pk, 'number_of_seats': 2,
+        })
+        fingerprint = idempotency.request_fingerprint(request)
+        key = idempotency._digest('busy')
+        record, created = idempotency.claim_key(self.user, key, fingerprint)
+        self.assertTrue(created)
+        response = self.book('busy')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+        # Requête interrompue : la clé est reprise passé le délai
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.book('busy').status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+    def test_expired_keys_are_reused_and_purged_in_batches(self):
+        self.book('old')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.book('old').status_code, 201)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+        IdempotencyKey.objects.bulk_create([
+            IdempotencyKey(user=self.user, key=f'{i:064}', request_hash='', expires_at=timezone.now() - timedelta(hours=1))
+            for i in range(5)
+        ])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(idempotency.purge_idempotency_keys(batch_size=2), 5)
+        self.assertEqual(len(ctx.captured_queries), 6)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        out = io.StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('0 clé', out.getvalue())
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+
+    def test_concurrent_duplicates_book_once(self):
+        user = create_user('client')
+        schedule = create_schedules(1, seats=10)[0]
+
+        def book(_):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return client.post(
+                    '/api/reservations/', {'schedule': schedule.pk, 'number_of_seats': 3},
+                    format='json', headers={'Idempotency-Key': 'same'},
+                ).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            codes = list(pool.map(book, range(16)))
+        self.assertTrue(set(codes) <= {201, 409})
+        self.assertIn(201, codes)
+        schedule.refresh_from_db()
+        self.assertEqual((Reservation.objects.count(), schedule.available_seats), (1, 7))
+
+
+class ScheduleSearchTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+
+    def test_date_filter_is_half_open_day(self):
+        day = timezone.localdate() + timedelta(days=3)
+        midnight = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+        create_schedules(1, start=midnight - timedelta(minutes=1))
+        create_schedules(1, start=midnight)
+        create_schedules(1, start=midnight + timedelta(hours=23, minutes=59))
+        create_schedules(1, start=midnight + timedelta(days=1))
+        data = self.client.get(f'/api/schedules/?date={day.isoformat()}&departure=Casablanca').json()
+        self.assertEqual(len(data['results']), 2)
+
+    def test_invalid_date_is_rejected(self):
+        self.assertEqual(self.client.get('/api/schedules/?date=demain').status_code, 400)
+
+
+class ScheduleSearchCacheTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('client')
+        self.client.force_authenticate(self.user)
+        self.casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        self.rabat = Location.objects.create(city='Rabat', address='Kamra')
+        self.fes = Location.objects.create(city='Fès', address='Bab Boujloud')
+        self.bus = Bus.objects.create(plate_number='AB-123', capacity=50, model='Irizar')
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.start = timezone.make_aware(timezone.datetime.combine(self.day, timezone.datetime.min.time()))
+        self.schedule = create_schedules(1, bus=self.bus, departure=self.casablanca, arrival=self.rabat, start=self.start)[0]
+        self.url = f'/api/schedules/?departure=Casablanca&arrival=Rabat&date={self.day.isoformat()}'
+
+    def search(self, url=None):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url or self.url).json()
+        return data, len(ctx.captured_queries)
+
+    def test_repeated_search_served_from_cache(self):
+        first, queries = self.search()
+        self.assertGreater(queries, 0)
+        second, queries = self.search(self.url.replace('Casablanca', ' Casablanca '))
+        self.assertEqual(queries, 0)
+        self.assertEqual(first, second)
+
+    def test_padded_filters_match_like_the_cache_key(self):
+        padded, _ = self.search(self.url.replace('Casablanca', 'Casablanca%20'))
+        self.assertEqual(len(padded['results']), 1)
+        data, queries = self.search()
+        self.assertEqual(queries, 0)
+        self.assertEqual(data, padded)
+
+    def test_booking_invalidates_matching_searches(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/reservations/', {'schedule': self.schedule.pk, 'number_of_seats': 2})
+        data, queries = self.search()
+        self.assertGreater(queries, 0)
+        self.assertEqual(data['results'][0]['available_seats'], 48)
+
+    def test_unrelated_writes_keep_cache(self):
+        self.search()
+        other = create_schedules(1, bus=self.bus, departure=self.fes, arrival=self.rabat, start=self.start)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.reserve_seats(other.pk, 1)
+        self.assertEqual(self.search()[1], 0)
+
+    def test_moved_schedule_leaves_old_search(self):
+        self.search()
+        self.schedule.departure_location = self.fes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule.save()
+        self.assertEqual(self.search()[0]['results'], [])
+
+
+class SearchEndpointTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+        self.casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        self.rabat = Location.objects.create(city='Rabat', address='Kamra')
+        self.bus = Bus.objects.create(plate_number='AB-123', capacity=50, model='Irizar')
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.start = timezone.make_aware(timezone.datetime.combine(self.day, timezone.datetime.min.time()))
+        self.schedules = list(create_schedules(
+            30, bus=self.bus, departure=self.casablanca, arrival=self.rabat, start=self.start
+        ))
+        create_schedules(1, bus=self.bus, departure=self.casablanca, arrival=self.rabat,
+                         start=timezone.now() - timedelta(hours=2))
+        Route.objects.create(name='A1', departure_location=self.casablanca, arrival_location=self.rabat,
+                             distance=Decimal('87.00'), duration=75, price=Decimal('60.00'))
+        Route.objects.create(name='N1', departure_location=self.casablanca, arrival_location=self.rabat,
+                             distance=Decimal('92.00'), duration=110, price=Decimal('45.00'))
+
+    def search(self, query):
+        return self.client.get(f'/api/search/schedules/?{query}').json()
+
+    def test_filters_upcoming_schedules_by_day(self):
+        data = self.search(f'departure=Casablanca&arrival=Rabat&date={self.day.isoformat()}')
+        self.assertEqual(data['count'], 24)
+        times = [row['departure_time'] for row in data['results']]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(self.search('departure=Casablanca')['count'], 30)
+
+    def test_price_seats_and_ordering(self):
+        cheap = self.schedules[0]
+        Schedule.objects.filter(pk=cheap.pk).update(price=Decimal('20.00'))
+        Schedule.objects.filter(pk=self.schedules[1].pk).update(available_seats=1)
+        search_index.invalidate()
+        data = self.search('departure=Casablanca&max_price=50')
+        self.assertEqual([row['id'] for row in data['results']], [cheap.pk])
+        self.assertEqual(self.search('min_seats=2')['count'], 29)
+        self.assertEqual(self.search('ordering=price&limit=1')['results'][0]['id'], cheap.pk)
+        for value in ('NaN', 'Infinity', '-inf', 'abc'):
+            self.assertEqual(self.client.get(f'/api/search/schedules/?max_price={value}').status_code, 400)
+            self.assertEqual(self.client.get(f'/api/search/routes/?max_price={value}').status_code, 400)
+
+    def test_hot_path_is_orm_free_and_refreshed_on_booking(self):
+        self.search('departure=Casablanca')
+        with CaptureQueriesContext(connection) as ctx:
+            self.search('departure=Casablanca&arrival=Rabat&min_seats=48')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        target = self.schedules[5]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/reservations/', {'schedule': target.pk, 'number_of_seats': 3})
+        ids = [row['id'] for row in self.search('min_seats=48&limit=500')['results']]
+        self.assertNotIn(target.pk, ids)
+        self.assertEqual(len(ids), 29)
+
+    def test_route_search(self):
+        data = self.client.get('/api/search/routes/?departure=Casablanca&arrival=Rabat').json()
+        self.assertEqual([route['name'] for route in data['results']], ['N1', 'A1'])
+        data = self.client.get('/api/search/routes/?ordering=duration&max_price=100').json()
+        self.assertEqual([route['name'] for route in data['results']], ['A1', 'N1'])
+        self.assertEqual(self.client.get('/api/search/routes/?ordering=bus').status_code, 400)
+
+
+class JourneyPlannerTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+        self.bus = Bus.objects.create(plate_number='AB-123', capacity=50, model='Irizar')
+        self.casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        self.rabat = Location.objects.create(city='Rabat', address='Kamra')
+        self.tanger = Location.objects.create(city='Tanger', address='Gare routière')
+        self.origin = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.direct = self.leg(self.casablanca, self.tanger, 60, 420, '200.00')
+        self.early = self.leg(self.casablanca, self.rabat, 30, 90, '80.00')
+        self.cheap = self.leg(self.casablanca, self.rabat, 60, 120, '50.00')
+        self.tight = self.leg(self.rabat, self.tanger, 125, 240, '60.00')
+        self.late = self.leg(self.rabat, self.tanger, 150, 300, '70.00')
+
+    def leg(self, departure, arrival, leaves, arrives, price):
+        return Schedule.objects.create(
+            bus=self.bus, departure_location=departure, arrival_location=arrival,
+            departure_time=self.origin + timedelta(minutes=leaves),
+            arrival_time=self.origin + timedelta(minutes=arrives),
+            price=Decimal(price), available_seats=50,
+        )
+
+    def plan(self, **params):
+        query = {'departure': 'Casablanca', 'arrival': 'Tanger', 'departure_after': self.origin.isoformat()}
+        query.update(params)
+        response = self.client.get('/api/journeys/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def schedules(self, itinerary):
+        return [leg['schedule'] for leg in itinerary['legs']]
+
+    def test_earliest_arrival_respects_connection_time(self):
+        best = self.plan()[0]
+        # 5 minutes à Rabat ne suffisent pas pour prendre self.tight après self.cheap
+        self.assertEqual(self.schedules(best), [self.early.pk, self.tight.pk])
+        self.assertEqual((best['total_price'], best['transfers'], best['duration']), ('140.00', 1, 210))
+
+    def test_cheapest_objective_and_leg_limit(self):
+        self.assertEqual(self.schedules(self.plan(objective='cheapest')[0]), [self.cheap.pk, self.late.pk])
+        self.assertEqual([self.schedules(it) for it in self.plan(max_legs=1)], [[self.direct.pk]])
+        self.assertEqual(self.plan(departure='Tanger', arrival='Casablanca'), [])
+
+    def test_graph_follows_schedule_writes(self):
+        self.plan()
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.reserve_seats(self.tight.pk, 50)
+        # Même arrivée via self.early ou self.cheap : la moins chère l'emporte
+        self.assertEqual(self.schedules(self.plan()[0]), [self.cheap.pk, self.late.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            express = self.leg(self.casablanca, self.tanger, 40, 200, '150.00')
+        self.assertEqual(self.schedules(self.plan()[0]), [express.pk])
+
+
+class DashboardStatsTests(BaseTestCase):
+
+    def test_aggregates_in_constant_queries(self):
+        admin = create_user('admin', is_admin=True)
+        client = create_user('client')
+        schedule = create_schedules(2, seats=40)[0]
+        for seats, status in ((2, 'confirmed'), (3, 'pending'), (4, 'cancelled')):
+            Reservation.objects.create(user=client, schedule=schedule, number_of_seats=seats, status=status)
+        Schedule.objects.filter(pk=schedule.pk).update(available_seats=35)
+
+        self.assertEqual(self.client.get('/api/stats/dashboard/').status_code, 401)
+        self.client.force_authenticate(client)
+        self.assertEqual(self.client.get('/api/stats/dashboard/').status_code, 403)
+        self.client.force_authenticate(admin)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/stats/dashboard/').json()
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+        self.assertEqual((data['buses'], data['schedules'], data['users']), (1, 2, 2))
+        self.assertEqual(data['reservations'], {'total': 3, 'pending': 1, 'confirmed': 1, 'cancelled': 1})
+        self.assertEqual((data['revenue'], data['pending_revenue']), ('160.00', '240.00'))
+        self.assertEqual((data['seats_sold'], data['upcoming_booked_seats'], data['upcoming_capacity']), (5, 5, 80))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/stats/dashboard/')
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+
+
+class BulkImportTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        self.bus = Bus.objects.create(plate_number='AB-123', capacity=50, model='Irizar')
+        self.casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        self.rabat = Location.objects.create(city='Rabat', address='Kamra')
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def row(self, hours, **overrides):
+        row = {
+            'bus': self.bus.pk,
+            'departure_location': self.casablanca.pk,
+            'arrival_location': self.rabat.pk,
+            'departure_time': (self.start + timedelta(hours=hours)).isoformat(),
+            'arrival_time': (self.start + timedelta(hours=hours, minutes=50)).isoformat(),
+            'price': '80.00',
+            'available_seats': 50,
+        }
+        row.update(overrides)
+        return row
+
+    def test_json_import_in_batched_queries(self):
+        rows = [self.row(i) for i in range(2500)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/schedules/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 2500})
+        self.assertEqual(Schedule.objects.count(), 2500)
+        # Places libres déduites de la capacité du car, pas de la ligne importée
+        self.assertEqual(set(Schedule.objects.values_list('available_seats', flat=True)), {self.bus.capacity})
+        # Préchargement + INSERT par paquets (SQLite limite le nombre de paramètres par requête)
+        self.assertLess(len(ctx.captured_queries), len(rows) // 50)
+
+    def test_errors_are_reported_per_row_and_nothing_is_written(self):
+        rows = [
+            self.row(0),
+            self.row(1, arrival_location=self.casablanca.pk),
+            self.row(2, bus=999),
+            self.row(3, arrival_time=self.start.isoformat()),
+        ]
+        response = self.client.post('/api/schedules/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['row'] for error in errors], [1, 2, 3])
+        self.assertIn('arrival_location', errors[0]['errors'])
+        self.assertIn('bus', errors[1]['errors'])
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_csv_and_ndjson_uploads(self):
+        body = 'city,address\nFès,Bab Boujloud\nTanger,Gare routière\n'
+        response = self.client.post('/api/locations/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        ndjson = '{"plate_number": "CD-1", "capacity": 40, "model": "Setra"}\n\n{"plate_number": "CD-2", "capacity": 60, "model": "Setra"}\n'
+        response = self.client.post('/api/buses/bulk/', ndjson, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Location.objects.count(), 4)
+        self.assertEqual(Bus.objects.count(), 3)
+
+    def test_invalid_uploads_are_parse_errors(self):
+        for name, content in (('lieux.csv', 'city\n\xe9'.encode('latin-1')), ('lieux.ndjson', b'\xff\xfe{}'),
+                              ('lieux.csv', b'city\n' + b'a' * 200_000)):
+            upload = io.BytesIO(content)
+            upload.name = name
+            response = self.client.post('/api/locations/bulk/', {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Fichier invalide', response.json()['detail'])
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_bus_plates_must_be_unique_across_batch_and_table(self):
+        rows = [
+            {'plate_number': 'AB-123', 'capacity': 40, 'model': 'Setra'},
+            {'plate_number': 'CD-1', 'capacity': 40, 'model': 'Setra'},
+            {'plate_number': 'CD-1', 'capacity': 40, 'model': 'Setra'},
+        ]
+        response = self.client.post('/api/buses/bulk/', rows, format='json')
+        self.assertEqual([error['row'] for error in response.json()['errors']], [0, 2])
+
+    def test_bulk_update(self):
+        create_schedules(3, bus=self.bus, departure=self.casablanca, arrival=self.rabat)
+        ids = list(Schedule.objects.values_list('id', flat=True))
+        rows = [{'id': pk, 'price': '99.00'} for pk in ids] + [{'id': 12345, 'price': '1.00'}]
+        response = self.client.patch('/api/schedules/bulk/', rows, format='json')
+        self.assertEqual(response.json()['errors'][0]['row'], 3)
+        response = self.client.patch('/api/schedules/bulk/', rows[:3], format='json')
+        self.assertEqual(response.json(), {'updated': 3})
+        self.assertEqual(set(Schedule.objects.values_list('price', flat=True)), {Decimal('99.00')})
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(create_user('client'))
+        response = self.client.post('/api/schedules/bulk/', [self.row(0)], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class BusOverlapTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        self.bus = Bus.objects.create(plate_number='AB-123', capacity=50, model='Irizar')
+        self.casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        self.rabat = Location.objects.create(city='Rabat', address='Kamra')
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def row(self, hours, minutes=90, **overrides):
+        row = {
+            'bus': self.bus.pk,
+            'departure_location': self.casablanca.pk,
+            'arrival_location': self.rabat.pk,
+            'departure_time': (self.start + timedelta(hours=hours)).isoformat(),
+            'arrival_time': (self.start + timedelta(hours=hours, minutes=minutes)).isoformat(),
+            'price': '80.00',
+            'available_seats': 50,
+        }
+        row.update(overrides)
+        return row
+
+    def test_create_and_update_reject_overlaps(self):
+        first = self.client.post('/api/schedules/', self.row(0), format='json')
+        self.assertEqual(first.status_code, 201)
+        # Le car repart à l'heure où il arrive
+        self.assertEqual(self.client.post('/api/schedules/', self.row(1.5), format='json').status_code, 201)
+        response = self.client.post('/api/schedules/', self.row(-1), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bus', response.json())
+        other = Bus.objects.create(plate_number='CD-1', capacity=50, model='Setra')
+        self.assertEqual(self.client.post('/api/schedules/', self.row(-1, bus=other.pk), format='json').status_code, 201)
+
+        # Un horaire peut être modifié sans se heurter à lui-même
+        url = f"/api/schedules/{Schedule.objects.order_by('departure_time').get(bus=self.bus, departure_time=self.start).pk}/"
+        self.assertEqual(self.client.patch(url, {'price': '70.00'}, format='json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {'arrival_time': self.row(0, minutes=60)['arrival_time']}, format='json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {'arrival_time': self.row(0, minutes=120)['arrival_time']}, format='json').status_code, 400)
+
+    def test_bulk_import_checks_batch_and_table_in_one_query(self):
+        Schedule.objects.create(
+            bus=self.bus, departure_location=self.casablanca, arrival_location=self.rabat,
+            departure_time=self.start, arrival_time=self.start + timedelta(hours=2),
+            price=Decimal('80.00'), available_seats=50,
+        )
+        rows = [self.row(2 + 2 * i) for i in range(500)] + [self.row(0.5, minutes=30), self.row(2.5, minutes=60)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/schedules/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['row'] for error in errors], [500, 501])
+        self.assertIn('horaire', errors[0]['errors']['bus'][0])
+        self.assertIn('ligne 0', errors[1]['errors']['bus'][0])
+        # Préchargement des clés étrangères, puis une requête pour les chevauchements
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        self.assertEqual(self.client.post('/api/schedules/bulk/', rows[:500], format='json').status_code, 201)
+
+    def test_bulk_update_keeps_slots_of_rows_that_do_not_move(self):
+        first, second = (
+            Schedule.objects.create(
+                bus=self.bus, departure_location=self.casablanca, arrival_location=self.rabat,
+                departure_time=self.start + timedelta(hours=hours),
+                arrival_time=self.start + timedelta(hours=hours + 1),
+                price=Decimal('80.00'), available_seats=50,
+            )
+            for hours in (0, 3)
+        )
+        moved = {'id': second.pk, 'departure_time': self.row(0.5)['departure_time'], 'arrival_time': self.row(0.5, minutes=60)['arrival_time']}
+        response = self.client.patch('/api/schedules/bulk/', [{'id': first.pk, 'price': '11.00'}, moved], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['row'], 1)
+        second.refresh_from_db()
+        self.assertEqual(second.departure_time, self.start + timedelta(hours=3))
+
+    def test_timeline(self):
+        timeline = BusTimeline()
+        timeline.add(10, 20, 'a')
+        timeline.add(30, 40, 'b')
+        self.assertIsNone(timeline.conflict(20, 30))
+        self.assertEqual(timeline.conflict(15, 25), 'a')
+        self.assertEqual(timeline.conflict(25, 35), 'b')
+        self.assertEqual(timeline.conflict(0, 50), 'b')
+        self.assertIsNone(timeline.conflict(0, 10))
+
+    def test_fleet_utilization_report(self):
+        day = timezone.localdate() + timedelta(days=1)
+        start = timezone.make_aware(datetime.combine(day, time(8)))
+        idle = Bus.objects.create(plate_number='CD-1', capacity=40, model='Setra')
+        for hours, seats in ((0, 50), (3, 30)):
+            Schedule.objects.create(
+                bus=self.bus, departure_location=self.casablanca, arrival_location=self.rabat,
+                departure_time=start + timedelta(hours=hours), arrival_time=start + timedelta(hours=hours + 2),
+                price=Decimal('80.00'), available_seats=seats,
+            )
+        # Arrivée le lendemain : seule la part du jour compte
+        Schedule.objects.create(
+            bus=self.bus, departure_location=self.casablanca, arrival_location=self.rabat,
+            departure_time=start + timedelta(hours=15), arrival_time=start + timedelta(hours=18),
+            price=Decimal('80.00'), available_seats=50,
+        )
+        response = self.client.get('/api/stats/fleet/', {'date_from': day.isoformat(), 'date_to': day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        busy, free = response.json()['buses']
+        self.assertEqual(busy['schedules'], 3)
+        self.assertEqual(busy['service_hours'], 5.0)
+        self.assertEqual(busy['utilization_rate'], round(5 / 24, 4))
+        self.assertEqual((busy['seats_offered'], busy['seats_sold']), (150, 20))
+        self.assertEqual(free, {
+            'bus': idle.pk, 'plate_number': 'CD-1', 'schedules': 0, 'service_hours': 0,
+            'utilization_rate': 0, 'seats_offered': 0, 'seats_sold': 0, 'occupancy_rate': 0,
+        })
+        self.client.force_authenticate(create_user('client'))
+        self.assertEqual(self.client.get('/api/stats/fleet/').status_code, 403)
+
+
+class ScheduleTemplateTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+        self.bus = Bus.objects.create(plate_number='AB-123', capacity=40, model='Irizar')
+        casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        rabat = Location.objects.create(city='Rabat', address='Kamra')
+        route = Route.objects.create(
+            name='Casa-Rabat', departure_location=casablanca, arrival_location=rabat,
+            distance=Decimal('90'), duration=75, price=Decimal('60.00'),
+        )
+        self.today = timezone.localdate()
+        self.template = ScheduleTemplate.objects.create(
+            route=route, bus=self.bus, weekdays='01234', departure_time=time(8, 30),
+            valid_from=self.today,
+        )
+
+    def weekday_after(self, days):
+        date = self.today + timedelta(days=days)
+        while date.weekday() > 4:
+            date += timedelta(days=1)
+        return date
+
+    def test_command_materializes_horizon_once(self):
+        call_command('materialize_schedules', days=13, stdout=io.StringIO())
+        schedules = list(Schedule.objects.filter(template=self.template))
+        self.assertEqual(len(schedules), 10)
+        self.assertTrue(all(s.departure_time.weekday() < 5 for s in schedules))
+        schedule = schedules[0]
+        self.assertEqual(schedule.arrival_time - schedule.departure_time, timedelta(minutes=75))
+        self.assertEqual((schedule.price, schedule.available_seats), (Decimal('60.00'), 40))
+        call_command('materialize_schedules', days=13, stdout=io.StringIO())
+        self.assertEqual(Schedule.objects.count(), 10)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.materialized_until, self.today + timedelta(days=13))
+
+    def test_search_materializes_far_dates_lazily(self):
+        date = self.weekday_after(200)
+        for url in ('/api/schedules/', '/api/search/schedules/'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(url, {'date': date.isoformat()})
+            self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(Schedule.objects.count(), 1)
+        sunday = date + timedelta(days=6 - date.weekday())
+        response = self.client.get('/api/schedules/', {'date': sunday.isoformat()})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_overlapping_departures_are_skipped(self):
+        # Même car à 9 h alors que le départ de 8 h 30 arrive à 9 h 45
+        clash = ScheduleTemplate.objects.create(
+            route=self.template.route, bus=self.bus, weekdays='01234', departure_time=time(9),
+            valid_from=self.today,
+        )
+        date = self.weekday_after(3)
+        departure = timezone.make_aware(datetime.combine(date, time(8)))
+        manual = Schedule.objects.create(
+            bus=self.bus, departure_location=self.template.route.departure_location,
+            arrival_location=self.template.route.arrival_location, departure_time=departure,
+            arrival_time=departure + timedelta(hours=1), price=Decimal('60.00'), available_seats=40,
+        )
+        with self.assertLogs('api.timetables', 'WARNING') as logs:
+            call_command('materialize_schedules', days=13, stdout=io.StringIO())
+        created = Schedule.objects.exclude(pk=manual.pk)
+        self.assertEqual(created.filter(template=self.template).count(), 9)
+        self.assertEqual(created.filter(template=clash).count(), 1)
+        self.assertFalse(created.filter(template=self.template, departure_time__date=date).exists())
+        self.assertEqual(len(logs.output), 10)
+        self.assertTrue(any(f"l'horaire {manual.pk}" in line for line in logs.output))
+
+    def test_template_validation(self):
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        response = self.client.post('/api/schedule-templates/', {
+            'route': self.template.route_id, 'bus': self.bus.pk, 'weekdays': '97',
+            'departure_time': '10:00', 'valid_from': self.today.isoformat(),
+            'valid_until': (self.today - timedelta(days=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'weekdays'})
+
+
+class ExportTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        self.schedule = create_schedules(1)[0]
+        users = [create_user(f'client{i}') for i in range(3)]
+        create_reservations(30, self.schedule, users)
+        Reservation.objects.filter(pk__in=Reservation.objects.order_by('id').values('pk')[:10]).update(status='cancelled')
+
+    def read(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_with_filters(self):
+        body = self.read('/api/exports/reservations.csv', status='pending')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]['departure_city'], 'Casablanca')
+        self.assertEqual(rows[0]['total_price'], '80.00')
+        today = timezone.localdate()
+        body = self.read('/api/exports/reservations.csv', date_to=(today - timedelta(days=1)).isoformat())
+        self.assertEqual(body.splitlines(), [body.splitlines()[0]])
+
+    def test_ndjson_export_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.read('/api/exports/schedules.ndjson')
+        self.assertEqual(json.loads(body.splitlines()[0])['id'], self.schedule.pk)
+        body = self.read('/api/exports/reservations.ndjson')
+        self.assertEqual(len(body.splitlines()), 30)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+    async def test_asgi_export_reads_chunk_by_chunk(self):
+        token = f"Bearer {(await sync_to_async(tokens_for_user)(await User.objects.aget(username='admin')))['access']}"
+        with mock.patch('api.exports.EXPORT_CHUNK_SIZE', 4):
+            response = await self.async_client.get('/api/exports/reservations.ndjson', headers={'Authorization': token})
+            self.assertEqual(response.status_code, 200)
+            # Flux asynchrone : pas de lecture de tout l'export par sync_to_async(list)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 8)
+        self.assertEqual(sum(len(chunk.splitlines()) for chunk in chunks), 30)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/exports/users.csv').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/schedules.csv', {'status': 'pending'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/exports/reservations.csv', {'status': 'paid'}).status_code, 400)
+        self.client.force_authenticate(create_user('client'))
+        self.assertEqual(self.client.get('/api/exports/reservations.csv').status_code, 403)
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_data', 'reservations', '--status', 'cancelled', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 11)
+
+
+class ReservationHoldTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+        self.schedules = list(create_schedules(2, seats=10))
+
+    def book(self, schedule, seats):
+        response = self.client.post('/api/reservations/', {'schedule': schedule.pk, 'number_of_seats': seats})
+        self.assertEqual(response.status_code, 201)
+        return Reservation.objects.latest('id')
+
+    def seats(self):
+        return sorted(Schedule.objects.values_list('available_seats', flat=True))
+
+    def test_sweeper_releases_expired_holds_in_bulk(self):
+        first, second = self.schedules
+        for seats in (1, 2, 3):
+            self.book(first, seats)
+        self.book(second, 4)
+        kept = self.book(second, 1)
+        Reservation.objects.exclude(pk=kept.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(Reservation.objects.expire_holds(batch_size=2), 2)
+        # Sélection, annulation, lecture verrouillée des plans, restitution des places
+        # (un seul UPDATE), plus la transaction
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        call_command('expire_reservations', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(self.seats(), [9, 10])
+        self.assertEqual(Reservation.objects.filter(status='pending').get(), kept)
+
+    def test_confirm_before_expiry_only(self):
+        reservation = self.book(self.schedules[0], 2)
+        self.assertIsNotNone(reservation.expires_at)
+        expired = self.book(self.schedules[0], 1)
+        Reservation.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.post(f'/api/reservations/{reservation.pk}/confirm/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['status'], response.json()['expires_at']), ('confirmed', None))
+        self.assertEqual(self.client.post(f'/api/reservations/{expired.pk}/confirm/').status_code, 400)
+        Reservation.objects.expire_holds()
+        self.assertEqual(self.seats(), [8, 10])
+
+
+@override_settings(API_INSTRUMENTATION=True, API_SLOW_REQUEST_MS=0)
+class InstrumentationTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        request_metrics.reset()
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        create_schedules(3)
+
+    def test_server_timing_slow_log_and_percentiles(self):
+        with self.assertLogs('api', level='WARNING') as logs:
+            response = self.client.get('/api/schedules/')
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertIn('schedule-list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+        for _ in range(3):
+            self.client.get('/api/locations/')
+
+        with self.assertLogs('api', level='WARNING'):
+            stats = self.client.get('/api/stats/requests/').json()
+        self.assertTrue(stats['enabled'])
+        self.assertEqual(stats['views']['location-list']['requests'], 3)
+        self.assertEqual(set(stats['views']['schedule-list']['wall_ms']), {'p50', 'p95', 'p99'})
+
+    async def test_async_views_stay_async_under_asgi(self):
+        token = f"Bearer {(await sync_to_async(tokens_for_user)(await User.objects.aget(username='admin')))['access']}"
+        with mock.patch('django.core.handlers.base.async_to_sync', wraps=async_to_sync) as adapter:
+            with self.assertLogs('api', level='WARNING'):
+                response = await self.async_client.get('/api/search/schedules/', headers={'Authorization': token})
+        self.assertEqual(response.status_code, 200)
+        # Pas d'adaptateur entre le gestionnaire ASGI et la vue
+        adapter.assert_not_called()
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"$')
+        stats = await sync_to_async(request_metrics.summary)()
+        self.assertEqual(stats['search-schedules']['requests'], 1)
+
+    def test_disabled_by_default(self):
+        with self.settings(API_INSTRUMENTATION=False):
+            self.client = APIClient()
+            self.client.force_authenticate(User.objects.get(username='admin'))
+            response = self.client.get('/api/schedules/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, pct) for pct in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertIsNone(percentile([], 50))
+
+
+class BenchmarkHarnessTests(BaseTestCase):
+
+    def test_seed_and_scenarios(self):
+        rng = random.Random(1)
+        cities = benchmark.seed(rng, locations=6, buses=3, routes=6, schedules=60, users=5, reservations=80, days=3)
+        self.assertEqual(Schedule.objects.count(), 60)
+        held = Reservation.objects.exclude(status='cancelled').aggregate(total=Sum('number_of_seats'))['total']
+        capacity = sum(schedule.bus.capacity for schedule in Schedule.objects.select_related('bus'))
+        self.assertEqual(capacity - held, Schedule.objects.aggregate(total=Sum('available_seats'))['total'])
+        call_command('audit_seats', stdout=io.StringIO())
+
+        report = benchmark.run(rng, cities, names=benchmark.Scenarios.NAMES, requests=3, warmup=1, days=3)
+        self.assertEqual(list(report), list(benchmark.Scenarios.NAMES))
+        self.assertEqual(sum(result['errors'] for result in report.values()), 0)
+        self.assertEqual(report['book']['requests'], 3)
+
+    def test_compare_flags_regressions(self):
+        reference = {'search': {'p95_ms': 10.0, 'queries_max': 2, 'errors': 0}}
+        current = {'search': {'p95_ms': 12.0, 'queries_max': 2, 'errors': 0}}
+        self.assertEqual(benchmark.compare(current, reference, tolerance=0.25), [])
+        current['search'].update(p95_ms=13.0, queries_max=3, errors=1)
+        self.assertEqual(len(benchmark.compare(current, reference, tolerance=0.25)), 3)
+
+
+class FastSerializationTests(BaseTestCase):
+
+    def test_list_serializers_match_drf_output(self):
+        schedules = create_schedules(3)
+        users = [create_user('client'), User.objects.create_user('sans-profil')]
+        create_reservations(4, schedules[0], users)
+        Reservation.objects.filter(pk=Reservation.objects.first().pk).update(expires_at=timezone.now())
+        reservations = Reservation.objects.with_details().order_by('id')
+        self.assertEqual(
+            ReservationListSerializer(reservations, many=True).data,
+            ReservationSerializer(reservations, many=True).data,
+        )
+        schedules = Schedule.objects.with_details()
+        self.assertEqual(ScheduleListSerializer(schedules, many=True).data, ScheduleSerializer(schedules, many=True).data)
+        with timezone.override('Africa/Casablanca'):
+            self.assertEqual(ScheduleListSerializer(schedules, many=True).data, ScheduleSerializer(schedules, many=True).data)
+
+    def test_renderer_and_parser_match_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        data = {'price': Decimal('12.50'), 'when': timezone.now(), 'name': 'Fès', 1: None}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('{"city": "Fès"}'.encode())), {'city': 'Fès'})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{'))
+
+    def test_list_endpoints_use_fast_path(self):
+        self.client.force_authenticate(create_user('admin', is_admin=True))
+        create_schedules(2)
+        response = self.client.get('/api/schedules/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['results'][0]['price'], '80.00')
+
+
+class ConditionalCatalogTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(create_user('client'))
+        self.casablanca = Location.objects.create(city='Casablanca', address='Gare routière')
+        self.rabat = Location.objects.create(city='Rabat', address='Kamra')
+        Route.objects.create(
+            name='Casa-Rabat', departure_location=self.casablanca, arrival_location=self.rabat,
+            distance=Decimal('90'), duration=75, price=Decimal('60.00'),
+        )
+
+    def revalidate(self, url, etag, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        return response, len(ctx.captured_queries)
+
+    def test_not_modified_costs_one_aggregate_query(self):
+        for url in ('/api/locations/', '/api/buses/', '/api/routes/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            response, queries = self.revalidate(url, response['ETag'])
+            self.assertEqual((response.status_code, queries), (304, 1))
+            self.assertEqual(response.content, b'')
+
+    def test_etag_follows_writes_filters_and_deletes(self):
+        etag = self.client.get('/api/routes/')['ETag']
+        self.assertEqual(self.revalidate('/api/routes/', etag, departure='Rabat')[0].status_code, 200)
+        Location.objects.filter(pk=self.rabat.pk).update(address='Nouvelle gare', updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.revalidate('/api/routes/', etag)[0].status_code, 200)
+
+        etag = self.client.get('/api/locations/')['ETag']
+        Location.objects.create(city='Fès', address='Bab Boujloud').delete()
+        self.assertEqual(self.revalidate('/api/locations/', etag)[0].status_code, 304)
+        self.rabat.delete()
+        self.assertEqual(self.revalidate('/api/locations/', etag)[0].status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.client.get('/api/locations/')
+        response = self.client.get('/api/locations/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class TokenRoleTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user('admin', is_admin=True)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(user)['access']}")
+
+    def test_authorization_needs_no_profile_query(self):
+        self.authenticate(self.admin)
+        for url in ('/api/stats/requests/', '/api/auth/user/'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # Seule la lecture de l'utilisateur par JWTAuthentication
+            self.assertEqual(len(ctx.captured_queries), 1, ctx.captured_queries)
+        self.assertTrue(self.client.get('/api/auth/user/').json()['is_admin'])
+
+    def test_role_change_overrides_issued_token(self):
+        self.authenticate(self.admin)
+        profile = UserProfile.objects.get(user=self.admin)
+        profile.is_admin = False
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(profile.role_version, 2)
+        self.assertEqual(self.client.get('/api/stats/requests/').status_code, 403)
+        self.assertFalse(self.client.get('/api/auth/user/').json()['is_admin'])
+
+    def test_cold_cache_reads_role_once(self):
+        self.authenticate(self.admin)
+        caches['default'].clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/stats/requests/').status_code, 200)
+            self.assertEqual(self.client.get('/api/stats/requests/').status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_role_cache_is_short_lived_without_shared_backend(self):
+        self.assertEqual(role_cache_timeout(), 5)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(CACHES=shared, ROLE_CACHE_TIMEOUT=3600):
+            self.assertEqual(role_cache_timeout(), 3600)
+        # Rétrogradé par un autre worker : ce cache local l'ignore jusqu'à l'expiration
+        self.authenticate(self.admin)
+        UserProfile.objects.filter(user=self.admin).update(is_admin=False, role_version=2)
+        self.assertEqual(self.client.get('/api/stats/requests/').status_code, 200)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time_module.time() + 6):
+            self.assertEqual(self.client.get('/api/stats/requests/').status_code, 403)
+
+
+class StatelessAuthenticationTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('client')
+        create_schedules(3)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(self.user)['access']}")
+
+    def test_read_paths_skip_user_query(self):
+        self.client.get('/api/search/schedules/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/search/schedules/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_writes_still_load_the_user(self):
+        response = self.client.post('/api/locations/', {'city': 'Fès', 'address': 'Gare'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_stale_or_revoked_tokens_fall_back_to_database(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get('/api/search/schedules/').status_code, 401)
+
+        admin = create_user('admin', is_admin=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(admin)['access']}")
+        admin.is_staff = False
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/search/routes/').status_code, 200)
+        self.assertGreaterEqual(len(ctx.captured_queries), 1)
+
+
+class LoginTests(TransactionTestCase):
+    # authenticate() tourne dans le pool de login.py : ses threads ont leur propre
+    # connexion et ne voient que des données validées
+    client_class = APIClient
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = create_user('client')
+        self.user.set_password('secret-123')
+        self.user.save()
+
+    def login(self, password='secret-123', username='client', **extra):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password}, format='json', **extra)
+
+    def test_login_and_invalid_credentials(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'client')
+        self.assertIn('access', response.json()['token'])
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login(username='nobody').status_code, 401)
+        self.assertEqual(self.client.post('/api/auth/login/', {}, format='json').status_code, 400)
+
+    def test_login_token_carries_role(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        admin = create_user('admin', is_admin=True)
+        admin.set_password('secret-123')
+        admin.save()
+        response = self.login(username='admin')
+        token = AccessToken(response.json()['token']['access'])
+        self.assertEqual((token['is_admin'], token['role_version']), (True, 1))
+        self.assertTrue(response.json()['user']['is_admin'])
+
+    def test_goes_through_django_authenticate(self):
+        failed = []
+        handler = lambda sender, credentials, **kwargs: failed.append(credentials['username'])
+        user_login_failed.connect(handler)
+        try:
+            self.assertEqual(self.login('wrong').status_code, 401)
+        finally:
+            user_login_failed.disconnect(handler)
+        self.assertEqual(failed, ['client'])
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login().status_code, 401)
+        with override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend']):
+            self.assertEqual(self.login().status_code, 200)
+
+    def test_verified_credentials_skip_hashing(self):
+        self.assertEqual(self.login().status_code, 200)
+        with mock.patch('api.login.authenticate', wraps=authenticate) as check:
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(check.call_count, 1)
+
+        # Un nouveau mot de passe périme la vérification mémorisée
+        self.user.set_password('other-456')
+        self.user.save()
+        self.assertEqual(self.login().status_code, 401)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'login_ip': None, 'login_username': '2/min'}})
+    def test_attempts_throttled_per_username(self):
+        self.assertEqual(self.login('wrong', REMOTE_ADDR='10.0.0.1').status_code, 401)
+        self.assertEqual(self.login('wrong', REMOTE_ADDR='10.0.0.2').status_code, 401)
+        response = self.login(REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login(username='CLIENT').status_code, 429)
+        self.assertEqual(self.login(username='other').status_code, 401)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'login_ip': '2/min', 'login_username': None}})
+    def test_attempts_throttled_per_ip(self):
+        self.assertEqual(self.login('wrong', username='a').status_code, 401)
+        self.assertEqual(self.login('wrong', username='b').status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+    def test_saturated_hash_pool_sheds_load(self):
+        with mock.patch('api.login._hash_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_cancelled_login_keeps_its_slot_until_the_hash_ends(self):
+        release = threading.Event()
+
+        async def scenario():
+            task = asyncio.ensure_future(login.run_hash(release.wait, 5))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # Le hachage tourne encore : sa place reste prise
+            busy = not slots.acquire(blocking=False)
+            release.set()
+            for _ in range(100):
+                if slots.acquire(blocking=False):
+                    return busy, True
+                await asyncio.sleep(0.01)
+            return busy, False
+
+        with mock.patch('api.login._hash_slots', threading.BoundedSemaphore(1)) as slots:
+            self.assertEqual(asyncio.run(scenario()), (True, True))
+
+
+class AsyncViewTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('client')
+        self.schedules = create_schedules(3)
+        create_reservations(3, self.schedules[0], [self.user, create_user('autre')])
+        self.token = f"Bearer {tokens_for_user(self.user)['access']}"
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+
+    def test_current_user_reads_user_and_profile_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['username'], response.json()['is_admin']), ('client', False))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalide')
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+    def test_user_reservations_and_profile(self):
+        response = self.client.get('/api/reservations/user/', {'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
+
+        self.assertEqual(self.client.get('/api/users/me/').json()['full_name'], 'client')
+        response = self.client.patch('/api/users/me/', {'phone': '0611111111'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserProfile.objects.get(user=self.user).phone, '0611111111')
+
+        admin = create_user('admin', is_admin=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(admin)['access']}")
+        self.assertEqual(len(self.client.get('/api/users/me/').json()), 3)
+        self.assertEqual(len(self.client.get('/api/reservations/user/').json()['results']), 3)
+
+    def test_search_rebuilds_index_outside_the_loop(self):
+        search_index.invalidate()
+        response = self.client.get('/api/search/schedules/', {'departure': 'Casablanca'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        search_index.invalidate()
+        self.assertIsNone(search_index.search_schedules(build=False))
+
+    async def test_served_by_asgi_handler(self):
+        response = await self.async_client.get('/api/auth/user/', headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'client')
+        response = await self.async_client.get('/api/search/schedules/', headers={'Authorization': self.token})
+        self.assertEqual(response.json()['count'], 3)
+
+
+class ConcurrentBenchmarkTests(TransactionTestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        search_index.invalidate()
+
+    def test_wsgi_and_asgi_serve_the_same_requests(self):
+        rng = random.Random(1)
+        cities = benchmark.seed(rng, locations=6, buses=3, routes=6, schedules=60, users=5, reservations=20, days=3)
+        report = benchmark.run_concurrent(rng, cities, requests=6, concurrency=3, warmup=1, days=3)
+        self.assertEqual(len(report), 2 * len(benchmark.Scenarios.CONCURRENT_NAMES))
+        self.assertEqual(sum(result['errors'] for result in report.values()), 0)
+        self.assertEqual(report['current_user@asgi']['requests'], 6)
+
+
+class SyncTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user('admin', is_admin=True)
+        self.user = create_user('client')
+        self.client.force_authenticate(self.admin)
+
+    def sync(self, resource, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(f'/api/{resource}/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_buses_changes_and_tombstones(self):
+        buses = [Bus.objects.create(plate_number=f'BUS-{i}', capacity=50, model='Irizar') for i in range(3)]
+        first = self.sync('buses', limit=2)
+        self.assertEqual([row['id'] for row in first['changes']], [buses[0].pk, buses[1].pk])
+        self.assertTrue(first['has_more'])
+        second = self.sync('buses', first['watermark'], limit=2)
+        self.assertEqual([row['id'] for row in second['changes']], [buses[2].pk])
+        self.assertFalse(second['has_more'])
+
+        # Jeton de fin de liste reculé : on recule ici les lignes pour isoler les changements
+        Bus.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        buses[0].capacity = 60
+        buses[0].save()
+        buses[1].delete()
+        with override_settings(SYNC_WATERMARK_LAG_SECONDS=0):
+            watermark = self.sync('buses', second['watermark'])['watermark']
+        Bus.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(minutes=1))
+        deleted_id = buses[2].pk
+        buses[2].delete()
+        Bus.objects.filter(pk=buses[0].pk).update(capacity=70, updated_at=timezone.now())
+        delta = self.sync('buses', watermark)
+        self.assertEqual([(row['id'], row['capacity']) for row in delta['changes']], [(buses[0].pk, 70)])
+        self.assertEqual(delta['deleted'], [deleted_id])
+
+    def test_reservation_changes_are_scoped_to_their_owner(self):
+        schedule = create_schedules(1)[0]
+        create_reservations(2, schedule, [self.user, self.admin])
+        mine = Reservation.objects.get(user=self.user).pk
+        self.client.force_authenticate(self.user)
+        initial = self.sync('reservations')
+        self.assertEqual([row['id'] for row in initial['changes']], [mine])
+
+        for reservation in Reservation.objects.all():
+            reservation.delete()
+        self.assertEqual(self.sync('reservations', initial['watermark'])['deleted'], [mine])
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(len(self.sync('reservations', initial['watermark'])['deleted']), 2)
+
+    def test_invalid_and_expired_watermarks(self):
+        self.assertEqual(self.client.get('/api/locations/changes/', {'since': 'abc'}).status_code, 400)
+        old = sync.encode_watermark(timezone.now() - timedelta(days=31))
+        self.assertEqual(self.client.get('/api/locations/changes/', {'since': old}).status_code, 410)
+        self.assertEqual(sync.decode_watermark(sync.encode_watermark(self.user.date_joined, 7)), (self.user.date_joined, 7))
+
+    def test_purge_tombstones(self):
+        Location.objects.create(city='Fès', address='Gare').delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=40))
+        Location.objects.create(city='Fès', address='Gare').delete()
+        out = io.StringIO()
+        call_command('purge_tombstones', stdout=out)
+        self.assertEqual(Tombstone.objects.count(), 1)
+
+
+@override_settings(PUSH_COALESCE_MS=0)
+class SeatPushTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('client')
+        self.schedule = create_schedules(1, seats=10)[0]
+        self.token = tokens_for_user(self.user)['access']
+
+    def test_broker_coalesces_updates(self):
+        async def scenario():
+            broker = push.InProcessBroker()
+            subscription = broker.subscribe([1, 2])
+            broker.publish({1: 5})
+            broker.publish({1: 4, 3: 9})
+            changes = await subscription.next(timeout=1, coalesce=0.01)
+            idle = await subscription.next(timeout=0.01, coalesce=0)
+            watched = broker.watched([1, 2, 3])
+            subscription.close()
+            return changes, idle, watched, broker.watched([1, 2, 3])
+
+        self.assertEqual(asyncio.run(scenario()), ({1: 4}, {}, [1, 2], []))
+
+    def test_reservations_publish_seat_counts(self):
+        loop = asyncio.new_event_loop()
+        try:
+            subscription = loop.run_until_complete(self.subscribe())
+            self.client.force_authenticate(self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/reservations/', {'schedule': self.schedule.pk, 'number_of_seats': 3})
+            self.assertEqual(response.status_code, 201)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f"/api/reservations/{response.json()['id']}/cancel/")
+            self.assertEqual(loop.run_until_complete(subscription.next(1, 0)), {self.schedule.pk: 10})
+            subscription.close()
+        finally:
+            loop.close()
+
+    async def subscribe(self):
+        return push.seat_broker().subscribe([self.schedule.pk])
+
+    def test_stream_outside_asgi_sends_current_state(self):
+        response = self.client.get('/api/push/seats/', {'schedules': str(self.schedule.pk), 'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('retry: 10000', body)
+        self.assertIn(f'data: {{"{self.schedule.pk}":10}}', body)
+        self.assertEqual(self.client.get('/api/push/seats/', {'schedules': 'x', 'token': self.token}).status_code, 400)
+        self.assertEqual(self.client.get('/api/push/seats/', {'schedules': '1'}).status_code, 401)
+
+    @sync_to_async
+    def close(self, response):
+        # Comme le client de test : request_finished fermerait la connexion du test
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+
+    async def test_stream_pushes_changes_under_asgi(self):
+        response = await self.async_client.get(
+            '/api/push/seats/', {'schedules': f'{self.schedule.pk},999', 'token': self.token}
+        )
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), f'event: seats\ndata: {{"{self.schedule.pk}":10}}\n\n'.encode())
+        push.seat_broker().publish({self.schedule.pk: 7})
+        self.assertEqual(await anext(events), f'event: seats\ndata: {{"{self.schedule.pk}":7}}\n\n'.encode())
+        # Comme le gestionnaire ASGI en fin de connexion
+        await events.aclose()
+        await self.close(response)
+        self.assertEqual(push.seat_broker().watched([self.schedule.pk]), [])
+
+    async def test_unread_stream_unsubscribes_on_close(self):
+        response = await self.async_client.get('/api/push/seats/', {'schedules': self.schedule.pk, 'token': self.token})
+        self.assertEqual(push.seat_broker().watched([self.schedule.pk]), [self.schedule.pk])
+        await self.close(response)
+        self.assertEqual(push.seat_broker().watched([self.schedule.pk]), [])
@@ -0,0 +1,126 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import search_cache, timetable_check_key
+from .fleet import batch_conflicts, conflict_message
+from .models import Schedule, ScheduleTemplate
+from .signals import schedules_written
+
+logger = logging.getLogger(__name__)
+
+# Au-delà, une recherche ne matérialise pas : elle reste bornée en coût
+LAZY_MAX_DAYS = 31
+
+
+def _dates(start, end):
+    """Dates de start à end inclus."""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def create_occurrences(pairs):
+    """
+    Crée les Schedule manquants pour des couples (modèle, date) et retourne leurs ids.
+    Les départs existants (y compris insérés en parallèle par un autre worker) sont
+    ignorés grâce à la contrainte unique (template, departure_time) ; ceux qui
+    mettraient un car sur deux horaires à la fois sont écartés et journalisés.
+    """
+    occurrences = [template.occurrence(date) for template, date in pairs]
+    if not occurrences:
+        return []
+    template_ids = {schedule.template_id for schedule in occurrences}
+    departures = {schedule.departure_time for schedule in occurrences}
+    window = Schedule.objects.filter(
+        template_id__in=template_ids,
+        departure_time__gte=min(departures),
+        departure_time__lte=max(departures),
+    )
+    existing = set(window.values_list('template_id', 'departure_time'))
+    missing = [s for s in occurrences if (s.template_id, s.departure_time) not in existing]
+    # Un car n'assure qu'un horaire à la fois (fleet.py) : les départs qui chevauchent
+    # un horaire du car, ou un autre départ du lot, ne sont pas créés
+    conflicts = dict(batch_conflicts([
+        (index, s.bus_id, s.departure_time, s.arrival_time) for index, s in enumerate(missing)
+    ]))
+    for index, key in conflicts.items():
+        schedule = missing[index]
+        logger.warning(
+            "Départ du modèle %s le %s non créé : %s", schedule.template_id,
+            timezone.localtime(schedule.departure_time).strftime('%Y-%m-%d %H:%M'),
+            conflict_message(key) if key[0] == 'schedule' else "le car assure un autre départ de modèle sur ce créneau.",
+        )
+    missing = [s for index, s in enumerate(missing) if index not in conflicts]
+    if not missing:
+        return []
+
+    with transaction.atomic():
+        # ignore_conflicts : pas de pk renseignée en retour, on relit les ids créés
+        Schedule.objects.bulk_create(missing, batch_size=1000, ignore_conflicts=True)
+        wanted = {(s.template_id, s.departure_time) for s in missing}
+        ids = [
+            pk for pk, template_id, departure_time in window.values_list('id', 'template_id', 'departure_time')
+            if (template_id, departure_time) in wanted
+        ]
+        schedules_written.send(sender=Schedule, schedule_ids=ids, previous=None)
+    return ids
+
+
+def materialize(days, today=None):
+    """
+    Matérialise les départs des modèles actifs jusqu'à `days` jours à l'avance et
+    avance leur materialized_until. Appelée par la commande materialize_schedules.
+    Retourne le nombre d'horaires créés.
+    """
+    today = today or timezone.localdate()
+    horizon = today + timedelta(days=days)
+    templates = ScheduleTemplate.objects.select_related('route', 'bus').filter(
+        Q(materialized_until__isnull=True) | Q(materialized_until__lt=horizon),
+        Q(valid_until__isnull=True) | Q(valid_until__gte=today),
+        is_active=True,
+        valid_from__lte=horizon,
+    ).order_by('id')  # Le modèle le plus ancien garde le car en cas de chevauchement
+    created = 0
+    for template in templates:
+        start = max(today, template.valid_from)
+        if template.materialized_until:
+            start = max(start, template.materialized_until + timedelta(days=1))
+        end = min(horizon, template.valid_until or horizon)
+        pairs = [(template, date) for date in _dates(start, end) if template.runs_on(date)]
+        created += len(create_occurrences(pairs))
+        ScheduleTemplate.objects.filter(pk=template.pk).update(materialized_until=end)
+    return created
+
+
+def ensure_materialized(start, end=None):
+    """
+    Matérialise à la volée les départs des dates start à end (incluses) qui sont
+    au-delà de l'horizon de la commande, par exemple pour une recherche lointaine.
+    Une plage vérifiée est mémorisée dans le cache de recherche (le temps de son
+    TIMEOUT, ou jusqu'à la modification d'un modèle) : les recherches répétées
+    ne font aucune requête.
+    """
+    start = max(start, timezone.localdate())
+    end = min(end or start, start + timedelta(days=LAZY_MAX_DAYS - 1))
+    if end < start:
+        return []
+    cache, key = search_cache(), timetable_check_key(start, end)
+    if cache.get(key):
+        return []
+    templates = list(ScheduleTemplate.objects.select_related('route', 'bus').filter(
+        Q(materialized_until__isnull=True) | Q(materialized_until__lt=end),
+        Q(valid_until__isnull=True) | Q(valid_until__gte=start),
+        is_active=True,
+        valid_from__lte=end,
+    ))
+    pairs = [
+        (template, date)
+        for template in templates
+        for date in _dates(start, end)
+        if template.runs_on(date) and (template.materialized_until is None or date > template.materialized_until)
+    ]
+    ids = create_occurrences(pairs)
+    cache.set(key, True)
+    return ids
@@ -7,6 +7,7 @@ router.register(r'buses', views.BusViewSet)
 router.register(r'locations', views.LocationViewSet)
 router.register(r'routes', views.RouteViewSet)
 router.register(r'schedules', views.ScheduleViewSet)
+router.register(r'schedule-templates', views.ScheduleTemplateViewSet)
 router.register(r'reservations', views.ReservationViewSet, basename='reservation')
 router.register(r'users', views.UserViewSet, basename='user')
 
@@ -17,4 +18,12 @@ urlpatterns = [
     path('users/me/', views.UserProfileView.as_view(), name='user-profile'),
     path('users/profile/', views.UserProfileView.as_view(), name='user-profile-detail'),
     path('reservations/user/', views.UserReservationsView.as_view(), name='user-reservations'),
+    path('search/schedules/', views.ScheduleSearchView.as_view(), name='search-schedules'),
+    path('search/routes/', views.RouteSearchView.as_view(), name='search-routes'),
+    path('journeys/', views.JourneyView.as_view(), name='journeys'),
+    path('push/seats/', views.SeatStreamView.as_view(), name='seat-stream'),
+    path('exports/<slug:kind>.<slug:extension>', views.ExportView.as_view(), name='export'),
+    path('stats/dashboard/', views.DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('stats/fleet/', views.FleetUtilizationView.as_view(), name='fleet-stats'),
+    path('stats/requests/', views.RequestMetricsView.as_view(), name='request-stats'),
 ] + router.urls 
\ No newline at end of file
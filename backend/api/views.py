@@ -3,40 +3,106 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ParseError, ValidationError
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Bus, Location, Route, Schedule, Reservation, UserProfile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from functools import partial
+from decimal import Decimal, InvalidOperation
+from .models import Bus, Location, Route, Schedule, ScheduleTemplate, Reservation, UserProfile
 from .serializers import (
     BusSerializer, LocationSerializer, RouteSerializer, ScheduleSerializer,
     UserSerializer, ReservationSerializer, CreateReservationSerializer,
-    UserProfileSerializer, CreateUpdateScheduleSerializer
+    UserProfileSerializer, CreateUpdateScheduleSerializer, BulkScheduleSerializer,
+    BulkBusSerializer, ScheduleTemplateSerializer, ScheduleListSerializer,
+    ReservationListSerializer
 )
 from rest_framework.views import APIView
-from .permissions import IsAdminOrReadOnly, IsAdminUser, IsOwnerOrAdmin
+from asgiref.sync import sync_to_async
+from .asynchronous import AsyncAPIView
+from .permissions import IsAdminOrReadOnly, IsAdminUser, IsOwnerOrAdmin, user_is_admin
+from .authentication import QueryTokenAuthentication, StatelessJWTAuthentication, tokens_for_user
+from .pagination import SchedulePagination, ReservationPagination
+from .cache import normalize_search, search_cache, search_cache_key
+from .search import day_range, search_index
+from .journeys import journey_graph
+from .bulk import BulkMixin
+from .conditional import ConditionalListMixin
+from .sync import SyncMixin
+from .cache import schedule_snapshots
+from .signals import schedules_written, catalog_written
+from .timetables import ensure_materialized
+from .instrumentation import request_metrics
+from .push import seat_broker
+from .seats import taken_seats
+from .fleet import batch_conflicts, conflict_message, fleet_utilization
+from .idempotency import idempotent
+from .exports import EXPORTS, EXPORT_FORMATS, aexport_lines, export_filters, export_lines, export_queryset
+from .login import HashPoolBusy, LoginIPThrottle, LoginUsernameThrottle, verify_credentials
+from .renderers import FastJSONParser
+import io
+import json
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 
-class BusViewSet(viewsets.ModelViewSet):
-    queryset = Bus.objects.all()
+class BusViewSet(ConditionalListMixin, SyncMixin, BulkMixin, viewsets.ModelViewSet):
+    queryset = Bus.objects.order_by('id')
+    authentication_classes = [StatelessJWTAuthentication]
     serializer_class = BusSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
-
-class LocationViewSet(viewsets.ModelViewSet):
-    queryset = Location.objects.all()
+    bulk_serializer_class = BulkBusSerializer
+
+    def validate_batch(self, items):
+        # Unicité des immatriculations : une requête pour tout le lot
+        errors, seen = [], {}
+        plates = {data['plate_number'] for _, _, data in items if 'plate_number' in data}
+        taken = dict(Bus.objects.filter(plate_number__in=plates).values_list('plate_number', 'id'))
+        for index, instance, data in items:
+            plate = data.get('plate_number')
+            if plate is None:
+                continue
+            owner = taken.get(plate)
+            if (owner is not None and (instance is None or owner != instance.pk)) or plate in seen:
+                errors.append({'row': index, 'errors': {'plate_number': ['Cette immatriculation existe déjà.']}})
+            seen[plate] = index
+        return errors
+
+    def bulk_written(self, objects, previous=None):
+        catalog_written.send(sender=Bus)
+
+class LocationViewSet(ConditionalListMixin, SyncMixin, BulkMixin, viewsets.ModelViewSet):
+    queryset = Location.objects.order_by('id')
+    authentication_classes = [StatelessJWTAuthentication]
     serializer_class = LocationSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    bulk_serializer_class = LocationSerializer
+
+    def bulk_written(self, objects, previous=None):
+        catalog_written.send(sender=Location)
 
-class RouteViewSet(viewsets.ModelViewSet):
-    queryset = Route.objects.all()
+class RouteViewSet(ConditionalListMixin, SyncMixin, viewsets.ModelViewSet):
+    queryset = Route.objects.with_details().order_by('id')
+    authentication_classes = [StatelessJWTAuthentication]
     serializer_class = RouteSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    # Les lieux sont imbriqués dans chaque trajet
+    conditional_fields = ('updated_at', 'departure_location__updated_at', 'arrival_location__updated_at')
 
     def get_queryset(self):
-        queryset = Route.objects.all()
+        queryset = Route.objects.with_details().order_by('id')
         departure = self.request.query_params.get('departure', None)
         arrival = self.request.query_params.get('arrival', None)
 
@@ -47,33 +113,428 @@ class RouteViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-class ScheduleViewSet(viewsets.ModelViewSet):
-    queryset = Schedule.objects.all()
+    def get_sync_queryset(self):
+        # La copie locale porte sur tous les trajets, sans les filtres de la liste
+        return Route.objects.with_details()
+
+class ScheduleViewSet(SyncMixin, BulkMixin, viewsets.ModelViewSet):
+    queryset = Schedule.objects.with_details()
+    authentication_classes = [StatelessJWTAuthentication]
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = SchedulePagination
+    bulk_serializer_class = BulkScheduleSerializer
+    sync_serializer_class = ScheduleListSerializer
+    bulk_related = {'bus': Bus, 'departure_location': Location, 'arrival_location': Location}
+
+    def validate_batch(self, items):
+        # Chevauchements des cars, entre lignes du lot et avec la base (fleet.py)
+        slots, moved = [], []
+        for index, instance, data in items:
+            if not {'bus', 'departure_time', 'arrival_time'} & set(data):
+                continue
+            bus, departure, arrival = (
+                data.get(name, getattr(instance, name, None)) for name in ('bus', 'departure_time', 'arrival_time')
+            )
+            if bus is not None and departure and arrival:
+                slots.append((index, bus.pk, departure, arrival))
+                if instance is not None:
+                    moved.append(instance.pk)
+        # Seuls les anciens créneaux des lignes vérifiées sont ignorés : un horaire
+        # modifié sans toucher au car ni aux heures garde le sien
+        return [
+            {'row': index, 'errors': {'bus': [conflict_message(key)]}}
+            for index, key in batch_conflicts(slots, exclude=moved)
+        ]
+
+    def snapshot(self, instances):
+        return schedule_snapshots([schedule.pk for schedule in instances])
+
+    def bulk_written(self, objects, previous=None):
+        schedules_written.send(
+            sender=Schedule, schedule_ids=[schedule.pk for schedule in objects], previous=previous
+        )
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return CreateUpdateScheduleSerializer
+        if self.action == 'list':
+            return ScheduleListSerializer
         return ScheduleSerializer
 
     def get_queryset(self):
-        queryset = Schedule.objects.all()
-        departure = self.request.query_params.get('departure', None)
-        arrival = self.request.query_params.get('arrival', None)
-        date = self.request.query_params.get('date', None)
+        queryset = Schedule.objects.with_details()
+        # Mêmes valeurs que la clé de cache (search_cache_key) : ' Casablanca' et
+        # 'Casablanca' partagent une entrée, elles doivent filtrer pareil
+        departure, arrival, date = normalize_search(self.request.query_params)
 
         if departure:
             queryset = queryset.filter(departure_location__city=departure)
         if arrival:
             queryset = queryset.filter(arrival_location__city=arrival)
         if date:
-            queryset = queryset.filter(departure_time__date=date)
+            start, end = day_range(date)
+            queryset = queryset.filter(departure_time__gte=start, departure_time__lt=end)
 
         return queryset
 
+    def get_sync_queryset(self):
+        return Schedule.objects.with_details()
+
+    def list(self, request, *args, **kwargs):
+        date = normalize_search(request.query_params)[2]
+        if date:
+            # Avant la clé de cache : créer des départs invalide les recherches concernées
+            ensure_materialized(timezone.localdate(day_range(date)[0]))
+        # Les mêmes recherches reviennent en boucle : on sert la page déjà sérialisée,
+        # invalidée par les écritures sur les horaires concernés (voir receivers.py)
+        cache = search_cache()
+        key = search_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data)
+            return response
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def seats(self, request, pk=None):
+        """Plan des places : capacité du car, places libres et numéros des places prises."""
+        schedule = self.get_object()
+        return Response({
+            'schedule': schedule.pk,
+            'capacity': schedule.bus.capacity,
+            'available_seats': schedule.available_seats,
+            'taken': taken_seats(schedule.seat_map),
+        })
+
+class ScheduleTemplateViewSet(viewsets.ModelViewSet):
+    """Horaires récurrents ; leurs départs sont créés par materialize_schedules ou à la recherche."""
+    queryset = ScheduleTemplate.objects.select_related('route', 'bus').order_by('id')
+    serializer_class = ScheduleTemplateSerializer
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+
+def _positive_param(params, name, default, maximum=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Nombre entier attendu.'})
+    if value < 0:
+        raise ValidationError({name: 'Doit être positif.'})
+    return min(value, maximum) if maximum else value
+
+
+def _price_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        amount = None
+    # NaN et Infinity passent Decimal() mais ne se comparent pas à un prix
+    if amount is None or not amount.is_finite():
+        raise ValidationError({name: 'Montant invalide.'})
+    return amount
+
+
+def _ordering_param(params, allowed, default):
+    ordering = params.get('ordering') or default
+    if ordering.lstrip('-') not in allowed:
+        raise ValidationError({'ordering': f"Valeurs possibles : {', '.join(allowed)} (préfixe '-' pour inverser)."})
+    return ordering
+
+
+class ScheduleSearchView(AsyncAPIView):
+    """
+    Recherche d'horaires à venir servie par l'index en mémoire (search.py).
+    Paramètres : departure, arrival, date ou date_from/date_to (inclusifs),
+    max_price, min_seats, ordering (departure, price, duration), limit.
+    Vue asynchrone : la base n'est lue, hors de la boucle, que pour matérialiser
+    des dates lointaines ou reconstruire l'index.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        params = request.query_params
+        start = end = None
+        if params.get('date'):
+            start, end = day_range(params['date'])
+        if params.get('date_from'):
+            start = day_range(params['date_from'])[0]
+        if params.get('date_to'):
+            end = day_range(params['date_to'])[1]
+        if start:
+            await sync_to_async(ensure_materialized)(
+                timezone.localdate(start), timezone.localdate(end - timedelta(days=1)) if end else None
+            )
+        search = partial(
+            search_index.search_schedules,
+            departure=(params.get('departure') or '').strip() or None,
+            arrival=(params.get('arrival') or '').strip() or None,
+            start=start,
+            end=end,
+            max_price=_price_param(params, 'max_price'),
+            min_seats=_positive_param(params, 'min_seats', 1),
+            ordering=_ordering_param(params, ('departure', 'price', 'duration'), 'departure'),
+            limit=_positive_param(params, 'limit', 50, maximum=500),
+        )
+        found = search(build=False)
+        if found is None:
+            found = await sync_to_async(search)()
+        count, results = found
+        return Response({'count': count, 'results': results})
+
+
+class RouteSearchView(APIView):
+    """
+    Recherche de trajets par villes, servie par l'index en mémoire.
+    Paramètres : departure, arrival, max_price, ordering (price, duration, distance, name).
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        results = search_index.search_routes(
+            departure=(params.get('departure') or '').strip() or None,
+            arrival=(params.get('arrival') or '').strip() or None,
+            max_price=_price_param(params, 'max_price'),
+            ordering=_ordering_param(params, ('price', 'duration', 'distance', 'name'), 'price'),
+        )
+        return Response({'count': len(results), 'results': results})
+
+
+class JourneyView(APIView):
+    """
+    Itinéraires avec correspondances entre deux villes (journeys.py).
+    Paramètres : departure, arrival, departure_after (date-heure ISO) ou date,
+    max_legs (1-5), min_connection (minutes), objective (earliest, cheapest),
+    seats, limit (1-10), horizon (heures, 72 max).
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        departure = (params.get('departure') or '').strip()
+        arrival = (params.get('arrival') or '').strip()
+        if not departure or not arrival:
+            raise ValidationError({'departure': 'Les villes de départ et d\'arrivée sont requises.'})
+        objective = params.get('objective') or 'earliest'
+        if objective not in ('earliest', 'cheapest'):
+            raise ValidationError({'objective': 'Valeurs possibles : earliest, cheapest.'})
+
+        depart_after = timezone.now()
+        if params.get('departure_after'):
+            depart_after = parse_datetime(params['departure_after'])
+            if depart_after is None:
+                raise ValidationError({'departure_after': 'Date-heure ISO attendue.'})
+            if timezone.is_naive(depart_after):
+                depart_after = timezone.make_aware(depart_after)
+        elif params.get('date'):
+            depart_after = max(day_range(params['date'])[0], depart_after)
+
+        horizon = max(1, _positive_param(params, 'horizon', 24, maximum=72)) * 3600
+        ensure_materialized(
+            timezone.localdate(depart_after), timezone.localdate(depart_after + timedelta(seconds=horizon))
+        )
+        itineraries = journey_graph.plan(
+            departure,
+            arrival,
+            depart_after,
+            max_legs=max(1, _positive_param(params, 'max_legs', 3, maximum=5)),
+            min_connection=_positive_param(params, 'min_connection', 15, maximum=24 * 60) * 60,
+            objective=objective,
+            seats=max(1, _positive_param(params, 'seats', 1)),
+            limit=max(1, _positive_param(params, 'limit', 5, maximum=10)),
+            horizon=horizon,
+        )
+        return Response({'count': len(itineraries), 'results': itineraries})
+
+
+class ExportView(APIView):
+    """
+    Export en flux de /exports/reservations.csv, /exports/schedules.ndjson...
+    Paramètres : date_from, date_to (création des réservations, départ des horaires)
+    et status (réservations). La réponse est écrite au fil de la lecture de la base.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, kind, extension):
+        if kind not in EXPORTS or extension not in EXPORT_FORMATS:
+            raise Http404
+        params = request.query_params
+        start, end, statuses = export_filters(
+            kind, params.get('date_from'), params.get('date_to'), params.get('status')
+        )
+        queryset = export_queryset(kind, start, end, statuses)
+        stream = aexport_lines if isinstance(request._request, ASGIRequest) else export_lines
+        response = StreamingHttpResponse(stream(kind, queryset, extension), content_type=EXPORT_FORMATS[extension])
+        filename = f"{kind}-{timezone.localdate():%Y%m%d}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class SeatEvents:
+    """
+    Flux d'une SeatStreamView. StreamingHttpResponse appelle close() à la fin de la
+    réponse : l'abonnement est libéré même si le flux n'a jamais été parcouru
+    (sinon c'est le finally de events() qui s'en charge).
+    """
+
+    def __init__(self, events, subscription):
+        self.events = events
+        self.subscription = subscription
+
+    def __aiter__(self):
+        return self.events
+
+    def close(self):
+        self.subscription.close()
+
+
+class SeatStreamView(AsyncAPIView):
+    """
+    Places disponibles en Server-Sent Events (push.py) :
+    GET /push/seats/?schedules=1,2,3&token=<jeton d'accès>. Le premier événement
+    `seats` donne les places actuelles {id: places}, les suivants les changements,
+    regroupés sur PUSH_COALESCE_MS ; un commentaire toutes les PUSH_KEEPALIVE_SECONDS
+    garde la connexion ouverte. Hors ASGI, seul l'état actuel est envoyé, avec un
+    délai de reconnexion : EventSource se replie alors sur une interrogation périodique.
+    """
+    authentication_classes = [QueryTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        try:
+            schedule_ids = sorted({int(value) for value in request.query_params.get('schedules', '').split(',') if value})
+        except ValueError:
+            raise ValidationError({'schedules': 'Liste d\'identifiants séparés par des virgules attendue.'})
+        maximum = getattr(settings, 'PUSH_MAX_SCHEDULES', 100)
+        if not 0 < len(schedule_ids) <= maximum:
+            raise ValidationError({'schedules': f'Entre 1 et {maximum} horaires.'})
+
+        streaming = isinstance(request._request, ASGIRequest)
+        # Abonné avant la lecture de l'état : aucun changement ne tombe entre les deux
+        subscription = seat_broker().subscribe(schedule_ids) if streaming else None
+        try:
+            current = {
+                schedule_id: seats
+                async for schedule_id, seats in Schedule.objects.filter(pk__in=schedule_ids).values_list('id', 'available_seats')
+            }
+        except BaseException:
+            if subscription:
+                subscription.close()
+            raise
+        events = SeatEvents(self.events(subscription, current), subscription) if streaming else [
+            b'retry: 10000\n\n', server_sent_event('seats', current),
+        ]
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, subscription, current):
+        keepalive = getattr(settings, 'PUSH_KEEPALIVE_SECONDS', 15)
+        coalesce = getattr(settings, 'PUSH_COALESCE_MS', 250) / 1000
+        try:
+            yield server_sent_event('seats', current)
+            while True:
+                changes = await subscription.next(keepalive, coalesce)
+                yield server_sent_event('seats', changes) if changes else b': ping\n\n'
+        finally:
+            subscription.close()
+
+
+DASHBOARD_STATS_CACHE_KEY = 'dashboard-stats'
+DASHBOARD_STATS_TIMEOUT = 30
+
+
+def dashboard_stats():
+    """Compteurs et agrégats du tableau de bord, calculés par la base (7 requêtes)."""
+    holding = Q(status__in=Reservation.HOLDING_STATUSES)
+    reservations = Reservation.objects.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        confirmed=Count('id', filter=Q(status='confirmed')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+        revenue=Sum('total_price', filter=Q(status='confirmed')),
+        pending_revenue=Sum('total_price', filter=Q(status='pending')),
+        seats_sold=Sum('number_of_seats', filter=holding),
+    )
+    upcoming = Schedule.objects.filter(departure_time__gte=timezone.now()).aggregate(
+        count=Count('id'),
+        capacity=Sum('bus__capacity'),
+        available=Sum('available_seats'),
+    )
+    capacity = upcoming['capacity'] or 0
+    booked = capacity - (upcoming['available'] or 0)
+    return {
+        'buses': Bus.objects.count(),
+        'locations': Location.objects.count(),
+        'schedules': Schedule.objects.count(),
+        'upcoming_schedules': upcoming['count'],
+        'users': User.objects.count(),
+        'reservations': {
+            'total': reservations['total'],
+            'pending': reservations['pending'],
+            'confirmed': reservations['confirmed'],
+            'cancelled': reservations['cancelled'],
+        },
+        # Montants en chaînes, comme les DecimalField des serializers
+        'revenue': f"{reservations['revenue'] or 0:.2f}",
+        'pending_revenue': f"{reservations['pending_revenue'] or 0:.2f}",
+        'seats_sold': reservations['seats_sold'] or 0,
+        'upcoming_capacity': capacity,
+        'upcoming_booked_seats': booked,
+        'upcoming_occupancy_rate': round(booked / capacity, 4) if capacity else 0,
+        'generated_at': timezone.now(),
+    }
+
+
+class DashboardStatsView(APIView):
+    """
+    Statistiques du tableau de bord admin en une requête HTTP, mises en cache
+    DASHBOARD_STATS_TIMEOUT secondes.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        stats = cache.get(DASHBOARD_STATS_CACHE_KEY)
+        if stats is None:
+            stats = dashboard_stats()
+            cache.set(DASHBOARD_STATS_CACHE_KEY, stats, DASHBOARD_STATS_TIMEOUT)
+        return Response(stats)
+
+
+class FleetUtilizationView(APIView):
+    """
+    Utilisation de la flotte par car (fleet.py) pour les départs du jour date_from au
+    jour date_to inclus, AAAA-MM-JJ (par défaut les 7 prochains jours).
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        today = timezone.localdate()
+        start = day_range(params.get('date_from') or today.isoformat())[0]
+        end = day_range(params.get('date_to') or (today + timedelta(days=6)).isoformat())[1]
+        if end <= start:
+            raise ValidationError({'date_to': 'La fin de période doit suivre son début.'})
+        return Response({'date_from': start, 'date_to': end, 'buses': fleet_utilization(start, end)})
+
+
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('profile').order_by('id')
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
@@ -82,21 +543,23 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
-class UserProfileView(APIView):
+class UserProfileView(AsyncAPIView):
+    """Profil de l'utilisateur courant (tous les profils pour un administrateur). Vue asynchrone."""
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    async def get(self, request):
         try:
-            profile = UserProfile.objects.get(user=request.user)
+            # Profil lu avec l'utilisateur par JWTRoleAuthentication.aauthenticate
+            profile = request.user.profile
             if profile.is_admin:
-                profiles = UserProfile.objects.all()
+                profiles = [item async for item in UserProfile.objects.select_related('user')]
                 serializer = UserProfileSerializer(profiles, many=True)
             else:
                 serializer = UserProfileSerializer(profile)
             return Response(serializer.data)
         except UserProfile.DoesNotExist:
             logger.info(f"Creating profile for user {request.user.username}")
-            profile = UserProfile.objects.create(
+            profile = await UserProfile.objects.acreate(
                 user=request.user,
                 full_name=f"{request.user.first_name} {request.user.last_name}",
                 phone="",
@@ -111,9 +574,12 @@ class UserProfileView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def patch(self, request):
+    async def patch(self, request):
+        return await sync_to_async(self.update_profile)(request)
+
+    def update_profile(self, request):
         try:
-            if request.user.profile.is_admin:
+            if user_is_admin(request.user):
                 profile = get_object_or_404(UserProfile, user_id=request.data.get('user_id'))
             else:
                 profile = get_object_or_404(UserProfile, user=request.user)
@@ -128,28 +594,43 @@ class UserProfileView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class CurrentUserView(APIView):
+class CurrentUserView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    async def get(self, request):
+        # Utilisateur et rôle déjà lus par l'authentification : aucune autre requête
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
 
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(SyncMixin, viewsets.ModelViewSet):
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReservationPagination
+    sync_serializer_class = ReservationListSerializer
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Reservation.objects.all()
-        return Reservation.objects.filter(user=user)
+            return Reservation.objects.with_details()
+        return Reservation.objects.with_details().filter(user=user)
+
+    def get_sync_tombstones(self):
+        tombstones = super().get_sync_tombstones()
+        if self.request.user.is_staff:
+            return tombstones
+        return tombstones.filter(owner_id=self.request.user.pk)
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateReservationSerializer
+        if self.action == 'list':
+            return ReservationListSerializer
         return ReservationSerializer
 
+    def create(self, request, *args, **kwargs):
+        # Idempotency-Key : un renvoi de la même requête rejoue la première réponse
+        return idempotent(request, partial(super().create, request, *args, **kwargs))
+
     def perform_create(self, serializer):
         user = self.request.user
         if user.is_staff and 'user' in serializer.validated_data:
@@ -159,29 +640,44 @@ class ReservationViewSet(viewsets.ModelViewSet):
             # Sinon, utiliser l'utilisateur actuel
             serializer.save(user=user)
 
-class UserReservationsView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        if request.user.profile.is_admin:
-            reservations = Reservation.objects.all()
-        else:
-            reservations = Reservation.objects.filter(user=request.user)
-        serializer = ReservationSerializer(reservations, many=True)
-        return Response(serializer.data)
+    def perform_destroy(self, instance):
+        # Rendre les places avant de supprimer une réservation encore active
+        instance.cancel()
+        instance.delete()
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         reservation = self.get_object()
-        if reservation.status == 'confirmed':
-            reservation.status = 'cancelled'
-            reservation.save()
+        if reservation.cancel():
             return Response({'status': 'reservation cancelled'})
         return Response(
             {'error': 'Cannot cancel this reservation'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        reservation = self.get_object()
+        if reservation.confirm():
+            return Response(ReservationSerializer(reservation).data)
+        return Response(
+            {'error': 'La réservation a expiré ou n\'est plus en attente'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+class UserReservationsView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        if user_is_admin(request.user):
+            reservations = Reservation.objects.with_details()
+        else:
+            reservations = Reservation.objects.with_details().filter(user=request.user)
+        paginator = ReservationPagination()
+        page = await paginator.apaginate_queryset(reservations, request, view=self)
+        serializer = ReservationListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
@@ -196,58 +692,108 @@ class RegisterView(APIView):
                 phone=request.data.get('phone', '')
             )
             # Générer le token
-            refresh = RefreshToken.for_user(user)
             return Response({
                 'user': serializer.data,
-                'token': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                }
+                'token': tokens_for_user(user),
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class LoginView(APIView):
-    permission_classes = [AllowAny]
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """
+    Connexion asynchrone : le hachage du mot de passe tourne dans le pool borné de
+    login.py, pas dans le thread ni la boucle de la requête. Tentatives limitées par
+    adresse IP et par nom d'utilisateur (taux login_ip et login_username de
+    DEFAULT_THROTTLE_RATES) ; pool saturé : 503 avec Retry-After.
+    """
+    http_method_names = ['post', 'options']
+
+    @staticmethod
+    def read_credentials(request):
+        if request.content_type == 'application/json':
+            try:
+                data = FastJSONParser().parse(io.BytesIO(request.body))
+            except ParseError:
+                data = None
+            if not isinstance(data, dict):
+                return None, None
+        else:
+            data = request.POST
+        return data.get('username'), data.get('password')
+
+    @staticmethod
+    def throttled(throttle):
+        wait = throttle.wait()
+        response = JsonResponse({
+            'error': 'Trop de tentatives de connexion, réessayez plus tard'
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        if wait is not None:
+            response['Retry-After'] = str(math.ceil(wait))
+        return response
+
+    async def post(self, request):
+        username, password = self.read_credentials(request)
+        if not username or not password or not isinstance(username, str) or not isinstance(password, str):
+            return JsonResponse({
+                'error': 'Veuillez fournir un nom d\'utilisateur et un mot de passe'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        request.login_username = username
+        for throttle in (LoginIPThrottle(), LoginUsernameThrottle()):
+            if not throttle.allow_request(request, self):
+                return self.throttled(throttle)
 
-    def post(self, request):
         try:
-            username = request.data.get('username')
-            password = request.data.get('password')
-            
-            if not username or not password:
-                return Response({
-                    'error': 'Veuillez fournir un nom d\'utilisateur et un mot de passe'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            user = authenticate(username=username, password=password)
-            
-            if user:
-                # Créer le profil utilisateur s'il n'existe pas
-                try:
-                    profile = UserProfile.objects.get(user=user)
-                except UserProfile.DoesNotExist:
-                    profile = UserProfile.objects.create(
-                        user=user,
-                        full_name=f"{user.first_name} {user.last_name}",
-                        phone="",
-                        is_admin=user.is_superuser
-                    )
-
-                refresh = RefreshToken.for_user(user)
-                serializer = UserSerializer(user)
-                return Response({
-                    'user': serializer.data,
-                    'token': {
-                        'refresh': str(refresh),
-                        'access': str(refresh.access_token),
-                    }
-                })
-            
-            return Response({
-                'error': 'Identifiants invalides'
-            }, status=status.HTTP_401_UNAUTHORIZED)
+            user = await verify_credentials(request, username, password)
+            if user is None:
+                return JsonResponse({
+                    'error': 'Identifiants invalides'
+                }, status=status.HTTP_401_UNAUTHORIZED)
+
+            # Créer le profil utilisateur s'il n'existe pas
+            try:
+                profile = user.profile
+            except UserProfile.DoesNotExist:
+                profile = await UserProfile.objects.acreate(
+                    user=user,
+                    full_name=f"{user.first_name} {user.last_name}",
+                    phone="",
+                    is_admin=user.is_superuser
+                )
+
+            token = tokens_for_user(user, profile)
+            # Profil déjà chargé : UserSerializer n'a pas à le relire
+            user.token_role = profile.is_admin
+            return JsonResponse({
+                'user': UserSerializer(user).data,
+                'token': token,
+            })
+        except HashPoolBusy:
+            response = JsonResponse({
+                'error': 'Trop de connexions en cours, réessayez dans un instant'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
         except Exception as e:
             logger.error(f"Error in LoginView: {str(e)}")
-            return Response({
+            return JsonResponse({
                 'error': 'Une erreur est survenue lors de la connexion'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class RequestMetricsView(APIView):
+    """
+    Percentiles de durée, de temps base et de nombre de requêtes SQL par vue,
+    mesurés par InstrumentationMiddleware dans ce worker. DELETE remet à zéro.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': getattr(settings, 'API_INSTRUMENTATION', False),
+            'views': request_metrics.summary(),
+        })
+
+    def delete(self, request):
+        request_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
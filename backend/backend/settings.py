@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # En premier pour mesurer toute la requête ; inactif sauf si API_INSTRUMENTATION
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -82,10 +84,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE : les transactions d'écriture prennent le verrou dès le début
+            # au lieu d'échouer en « database is locked » lors de la promotion du verrou
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # Base fichier (et non en mémoire partagée) pour que les tests concurrents
+            # attendent le verrou au lieu d'échouer en « table is locked »
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# Le cache 'search' garde les résultats de recherche d'horaires : TIMEOUT est la durée
+# de vie de chaque entrée et locmem évince les entrées les moins récemment lues (LRU)
+# au-delà de MAX_ENTRIES. En production, pointer ces alias vers un backend partagé
+# (Redis avec maxmemory-policy allkeys-lru) pour que l'invalidation touche tous les workers.
+# 'default' garde aussi le rôle des utilisateurs (api/authentication.py) : avec locmem,
+# chaque worker le garde au plus 5 s après un changement de rôle fait par un autre ;
+# avec un backend partagé, l'invalidation est immédiate et ROLE_CACHE_TIMEOUT s'applique.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'schedule-search',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,6 +170,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# Lisibles par le frontend (Server-Timing quand API_INSTRUMENTATION est activé)
+CORS_EXPOSE_HEADERS = ['Server-Timing', 'ETag', 'Last-Modified', 'Retry-After', 'Idempotent-Replayed']
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -148,6 +186,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -157,15 +196,27 @@ CORS_ALLOW_HEADERS = [
 # Configuration REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.JWTRoleAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson si installé (api/renderers.py) ; l'API navigable seulement en DEBUG
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.StandardPagination',
+    'PAGE_SIZE': 50,
+    # Tentatives de connexion (api/login.py) : par adresse IP et par compte visé
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_username': '10/min',
+    },
 }
 
 # Configuration JWT
@@ -184,6 +235,37 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Durée de vie (s) du rôle en cache avec un cache 'default' partagé (voir CACHES)
+ROLE_CACHE_TIMEOUT = 24 * 3600
+
+# Instrumentation des requêtes (api/instrumentation.py) : en-tête Server-Timing,
+# journal des requêtes lentes et percentiles par vue sur /api/stats/requests/
+API_INSTRUMENTATION = False
+API_SLOW_REQUEST_MS = 500
+
+# Connexion (api/login.py) : threads de hachage, file d'attente au-delà de laquelle
+# la connexion répond 503, et durée (s) de mémorisation d'une vérification réussie
+LOGIN_HASH_WORKERS = 4
+LOGIN_HASH_QUEUE = 32
+LOGIN_CREDENTIAL_CACHE_TTL = 300
+
+# Synchronisation incrémentale (api/sync.py) : recul du jeton de fin de liste (s) et
+# rétention des suppressions (jours), au-delà de laquelle un jeton répond 410
+SYNC_WATERMARK_LAG_SECONDS = 5
+SYNC_TOMBSTONE_DAYS = 30
+
+# Diffusion des places (api/push.py) : courtier, regroupement des mises à jour (ms),
+# commentaire de maintien de connexion (s) et nombre d'horaires par abonnement
+SEAT_BROKER = 'api.push.InProcessBroker'
+PUSH_COALESCE_MS = 250
+PUSH_KEEPALIVE_SECONDS = 15
+PUSH_MAX_SCHEDULES = 100
+
+# Clés d'idempotence des réservations (api/idempotency.py) : durée de conservation
+# des réponses (heures) et délai (s) avant de reprendre une clé restée en cours
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_LOCK_SECONDS = 60
+
 # Configuration du logging
 LOGGING = {
     'version': 1,
@@ -1,11 +1,12 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
-import { getSchedules, createReservation } from '../services/api';
+import { fetchNextPage, getSchedules, createReservation, reservationService } from '../services/api';
 import { useAuth } from '../contexts/AuthContext';
 
 const AdminCreateReservation = () => {
   const [schedules, setSchedules] = useState([]);
+  const [next, setNext] = useState(null);
   const [selectedSchedule, setSelectedSchedule] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -21,8 +22,9 @@ const AdminCreateReservation = () => {
   useEffect(() => {
     const fetchSchedules = async () => {
       try {
-        const response = await getSchedules();
-        setSchedules(response);
+        const page = await getSchedules();
+        setSchedules(page.results);
+        setNext(page.next);
         setLoading(false);
       } catch (err) {
         setError('Erreur lors du chargement des horaires');
@@ -33,6 +35,16 @@ const AdminCreateReservation = () => {
     fetchSchedules();
   }, []);
 
+  const loadMoreSchedules = async () => {
+    try {
+      const page = await fetchNextPage(next);
+      setSchedules(prev => [...prev, ...page.results]);
+      setNext(page.next);
+    } catch (err) {
+      setError('Erreur lors du chargement des horaires');
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError(null);
@@ -50,10 +62,12 @@ const AdminCreateReservation = () => {
 
     try {
       setLoading(true);
-      await createReservation({
+      const reservation = await createReservation({
         ...formData,
         schedule: selectedSchedule.id
       });
+      // Saisie admin : réservation confirmée directement, sans délai d'expiration
+      await reservationService.confirm(reservation.id);
       setSuccess(true);
       setTimeout(() => {
         navigate('/admin/reservations');
@@ -125,6 +139,15 @@ const AdminCreateReservation = () => {
               </option>
             ))}
           </select>
+          {next && (
+            <button
+              type="button"
+              onClick={loadMoreSchedules}
+              className="mt-2 text-sm text-blue-600 hover:text-blue-800"
+            >
+              Afficher plus d'horaires
+            </button>
+          )}
         </div>
 
         {selectedSchedule && (
@@ -1,13 +1,15 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
-import { getSchedules, createReservation, getLocations } from '../services/api';
+import { fetchNextPage, getSchedules, createReservation, getLocations, pushService, reservationService } from '../services/api';
 import { useTheme } from '../contexts/ThemeContext';
 
 export function NewReservation() {
     const { darkMode } = useTheme();
     const [schedules, setSchedules] = useState([]);
     const [filteredSchedules, setFilteredSchedules] = useState([]);
+    const [next, setNext] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [locations, setLocations] = useState([]);
     const [selectedSchedule, setSelectedSchedule] = useState(null);
     const [loading, setLoading] = useState(true);
@@ -38,12 +40,13 @@ export function NewReservation() {
     const fetchData = async () => {
         try {
             setLoading(true);
-            const [schedulesData, locationsData] = await Promise.all([
+            const [schedulesPage, locationsData] = await Promise.all([
                 getSchedules(),
                 getLocations()
             ]);
-            setSchedules(schedulesData || []);
-            setFilteredSchedules(schedulesData || []);
+            setSchedules(schedulesPage.results);
+            setFilteredSchedules(schedulesPage.results);
+            setNext(schedulesPage.next);
             setLocations(locationsData || []);
         } catch (err) {
             setError('Erreur lors du chargement des données');
@@ -53,6 +56,21 @@ export function NewReservation() {
         }
     };
 
+    // Horaires suivants à la demande (liste paginée par l'API)
+    const loadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const page = await fetchNextPage(next);
+            setSchedules(prev => [...prev, ...page.results]);
+            setNext(page.next);
+        } catch (err) {
+            setError('Erreur lors du chargement des données');
+            console.error(err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleFilterChange = (e) => {
         const { name, value } = e.target;
         setFilter(prev => ({
@@ -89,7 +107,25 @@ export function NewReservation() {
 
     useEffect(() => {
         applyFilters();
-    }, [filter]);
+    }, [filter, schedules]);
+
+    // Places des horaires affichés tenues à jour par le serveur, sans rechargement
+    const watchedIds = filteredSchedules.map(schedule => schedule.id).join(',');
+    useEffect(() => {
+        if (!watchedIds) {
+            return undefined;
+        }
+        const applySeats = (seats) => (schedule) => (
+            schedule && seats[schedule.id] !== undefined
+                ? { ...schedule, available_seats: seats[schedule.id] }
+                : schedule
+        );
+        return pushService.watchSeats(watchedIds.split(','), (seats) => {
+            setSchedules(prev => prev.map(applySeats(seats)));
+            setFilteredSchedules(prev => prev.map(applySeats(seats)));
+            setSelectedSchedule(prev => applySeats(seats)(prev));
+        });
+    }, [watchedIds]);
 
     const handlePaymentDetailsChange = (e) => {
         const { name, value } = e.target;
@@ -148,11 +184,13 @@ export function NewReservation() {
 
         try {
             setLoading(true);
-            await createReservation({
+            const reservation = await createReservation({
                 schedule: selectedSchedule.id,
                 number_of_seats: numberOfSeats,
                 special_requests: `Méthode de paiement: ${paymentMethod}`
             });
+            // Paiement validé : la réservation ne reste pas en attente (expirée sinon)
+            await reservationService.confirm(reservation.id);
             setSuccess(true);
             setTimeout(() => {
                 navigate('/dashboard');
@@ -248,6 +286,18 @@ export function NewReservation() {
                                             ))}
                                         </div>
                                     )}
+                                    {next && (
+                                        <div className="mt-4 text-center">
+                                            <button
+                                                type="button"
+                                                onClick={loadMore}
+                                                disabled={loadingMore}
+                                                className={`px-4 py-2 text-sm font-medium rounded-md border disabled:opacity-50 ${darkMode ? 'border-blue-400 text-blue-400 hover:bg-gray-700' : 'border-blue-600 text-blue-600 hover:bg-blue-50'}`}
+                                            >
+                                                {loadingMore ? 'Chargement...' : "Afficher plus d'horaires"}
+                                            </button>
+                                        </div>
+                                    )}
                             </div>
                             )}
 
@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { createReservation } from '../services/api';
+import { createReservation, reservationService } from '../services/api';
 import { useNavigate } from 'react-router-dom';
 
 const ReservationForm = ({ schedule }) => {
@@ -25,10 +25,12 @@ const ReservationForm = ({ schedule }) => {
         setError(null);
 
         try {
-            await createReservation({
+            const reservation = await createReservation({
                 schedule: schedule.id,
                 ...formData
             });
+            // Sans confirmation, la réservation expire après le délai de retenue
+            await reservationService.confirm(reservation.id);
             navigate('/reservations');
         } catch (err) {
             setError(err.response?.data?.message || 'Erreur lors de la réservation');
@@ -1,8 +1,10 @@
 import React, { useState, useEffect } from 'react';
-import { getSchedules } from '../services/api';
+import { fetchNextPage, getSchedules } from '../services/api';
 
 const ScheduleList = () => {
     const [schedules, setSchedules] = useState([]);
+    const [next, setNext] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
     const [filters, setFilters] = useState({
@@ -18,8 +20,10 @@ const ScheduleList = () => {
     const fetchSchedules = async () => {
         try {
             setLoading(true);
-            const response = await getSchedules(filters);
-            setSchedules(response.data);
+            // Filtres appliqués par l'API, première page seulement
+            const page = await getSchedules(filters);
+            setSchedules(page.results);
+            setNext(page.next);
             setError(null);
         } catch (err) {
             setError('Erreur lors du chargement des horaires');
@@ -28,6 +32,19 @@ const ScheduleList = () => {
         }
     };
 
+    const loadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const page = await fetchNextPage(next);
+            setSchedules(prev => [...prev, ...page.results]);
+            setNext(page.next);
+        } catch (err) {
+            setError('Erreur lors du chargement des horaires');
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleFilterChange = (e) => {
         const { name, value } = e.target;
         setFilters(prev => ({
@@ -101,6 +118,17 @@ const ScheduleList = () => {
                     </div>
                 ))}
             </div>
+            {next && (
+                <div className="mt-4 text-center">
+                    <button
+                        className="border border-blue-500 text-blue-500 px-4 py-2 rounded hover:bg-blue-50 disabled:opacity-50"
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                    >
+                        {loadingMore ? 'Chargement...' : 'Charger plus'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
@@ -3,11 +3,13 @@ import { motion } from 'framer-motion';
 import { Link, useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { useTheme } from '../contexts/ThemeContext';
-import { getReservations, getUserProfile, reservationService } from '../services/api';
+import { fetchNextPage, getReservations, getUserProfile, reservationService } from '../services/api';
 
 export function UserDashboard() {
     const { darkMode } = useTheme();
     const [reservations, setReservations] = useState([]);
+    const [next, setNext] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [userProfile, setUserProfile] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
@@ -19,14 +21,14 @@ export function UserDashboard() {
     useEffect(() => {
         const fetchData = async () => {
             try {
-                const [reservationsData, profileData] = await Promise.all([
+                const [reservationsPage, profileData] = await Promise.all([
                     getReservations(),
                     getUserProfile()
                 ]);
 
-                console.log("Réservations récupérées:", reservationsData);
-                // Assurez-vous d'accéder correctement aux données selon la structure de la réponse API
-                setReservations(Array.isArray(reservationsData) ? reservationsData : reservationsData?.data || []);
+                // Première page seulement, les suivantes à la demande
+                setReservations(reservationsPage.results);
+                setNext(reservationsPage.next);
                 setUserProfile(profileData || null);
             } catch (err) {
                 setError('Erreur lors du chargement des données');
@@ -43,6 +45,20 @@ export function UserDashboard() {
         }
     }, [user, navigate]);
 
+    const loadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const page = await fetchNextPage(next);
+            setReservations(prev => [...prev, ...page.results]);
+            setNext(page.next);
+        } catch (err) {
+            setError('Erreur lors du chargement des données');
+            console.error(err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleLogout = () => {
         logout();
         navigate('/login');
@@ -284,6 +300,17 @@ export function UserDashboard() {
                                         </div>
                                     </motion.div>
                                 ))}
+                                {next && (
+                                    <div className="text-center">
+                                        <button
+                                            onClick={loadMore}
+                                            disabled={loadingMore}
+                                            className={`px-4 py-2 text-sm font-medium rounded-md border disabled:opacity-50 ${darkMode ? 'border-blue-400 text-blue-400 hover:bg-gray-700' : 'border-blue-600 text-blue-600 hover:bg-blue-50'}`}
+                                        >
+                                            {loadingMore ? 'Chargement...' : 'Charger plus'}
+                                        </button>
+                                    </div>
+                                )}
                             </div>
                         )}
                     </div>
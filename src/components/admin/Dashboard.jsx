@@ -3,13 +3,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { Navigate, Link, useNavigate } from 'react-router-dom';
 import { useTheme } from '../../contexts/ThemeContext';
 import { useAuth } from '../../contexts/AuthContext';
-import { 
-    getBuses, 
-    getLocations, 
-    getSchedules, 
-    getReservations,
-    getUserProfile
-} from '../../services/api';
+import { getDashboardStats } from '../../services/api';
 
 // Composant Header du Dashboard
 const DashboardHeader = ({ toggleSidebar, isSidebarOpen }) => {
@@ -554,22 +548,16 @@ export function Dashboard() {
     const fetchStats = async () => {
       try {
         setLoading(true);
-        const [buses, locations, schedules, reservations, profile] = await Promise.all([
-          getBuses(),
-          getLocations(),
-          getSchedules(),
-          getReservations(),
-          getUserProfile()
-        ]);
+        // Un seul appel : les compteurs sont agrégés côté serveur
+        const data = await getDashboardStats();
 
         setStats({
-          totalBuses: Array.isArray(buses) ? buses.length : 0,
-          totalLocations: Array.isArray(locations) ? locations.length : 0,
-          totalSchedules: Array.isArray(schedules) ? schedules.length : 0,
-          totalReservations: Array.isArray(reservations) ? reservations.length : 0,
-          activeReservations: Array.isArray(reservations) ? 
-            reservations.filter(r => r.status === 'confirmed').length : 0,
-          totalUsers: Array.isArray(profile) ? profile.length : 1
+          totalBuses: data.buses,
+          totalLocations: data.locations,
+          totalSchedules: data.schedules,
+          totalReservations: data.reservations.total,
+          activeReservations: data.reservations.confirmed,
+          totalUsers: data.users
         });
         
         setError(null);
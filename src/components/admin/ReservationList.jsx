@@ -2,12 +2,14 @@ import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { Link } from 'react-router-dom';
 import { useTheme } from '../../contexts/ThemeContext';
-import { reservationService } from '../../services/api';
+import { fetchNextPage, reservationService } from '../../services/api';
 
 export function ReservationList() {
     const [reservations, setReservations] = useState([]);
     const [filteredReservations, setFilteredReservations] = useState([]);
+    const [next, setNext] = useState(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState(null);
     const [filter, setFilter] = useState({
         status: '',
@@ -23,9 +25,9 @@ export function ReservationList() {
 
     const fetchReservations = async () => {
         try {
-            const data = await reservationService.getAll();
-            setReservations(data);
-            setFilteredReservations(data);
+            const page = await reservationService.getPage();
+            setReservations(page.results);
+            setNext(page.next);
         } catch (err) {
             setError('Erreur lors du chargement des réservations');
             console.error(err);
@@ -34,6 +36,21 @@ export function ReservationList() {
         }
     };
 
+    // Page suivante à la demande : la liste complète n'est jamais téléchargée d'un coup
+    const loadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const page = await fetchNextPage(next);
+            setReservations(prev => [...prev, ...page.results]);
+            setNext(page.next);
+        } catch (err) {
+            setError('Erreur lors du chargement des réservations');
+            console.error(err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         applyFilters();
     }, [filter, reservations]);
@@ -243,7 +260,7 @@ export function ReservationList() {
                     </div>
                     <div className="mt-4 flex justify-between items-center">
                         <div className={`text-sm ${darkMode ? 'text-gray-400' : 'text-gray-500'}`}>
-                            {filteredReservations.length} réservation(s) trouvée(s)
+                            {filteredReservations.length} réservation(s) trouvée(s){next ? ' parmi les pages chargées' : ''}
                         </div>
                         <button
                             onClick={() => setFilter({ status: '', searchTerm: '' })}
@@ -355,6 +372,17 @@ export function ReservationList() {
                                 </table>
                             </div>
                         )}
+                        {next && (
+                            <div className="p-4 text-center">
+                                <button
+                                    onClick={loadMore}
+                                    disabled={loadingMore}
+                                    className={`px-4 py-2 text-sm font-medium rounded-md border disabled:opacity-50 ${darkMode ? 'border-blue-400 text-blue-400 hover:bg-gray-700' : 'border-blue-600 text-blue-600 hover:bg-blue-50'}`}
+                                >
+                                    {loadingMore ? 'Chargement...' : 'Charger plus'}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 </motion.div>
             </main>
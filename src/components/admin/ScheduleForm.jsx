@@ -106,11 +106,6 @@ export const ScheduleForm = () => {
       return;
     }
     
-    if (parseInt(formData.available_seats, 10) <= 0) {
-      setError("Le nombre de sièges disponibles doit être supérieur à 0");
-      return;
-    }
-    
     try {
       setLoading(true);
       setError(null);
@@ -121,8 +116,7 @@ export const ScheduleForm = () => {
         bus_id: parseInt(formData.bus, 10),
         departure_time: new Date(formData.departure_time).toISOString(),
         arrival_time: new Date(formData.arrival_time).toISOString(),
-        price: parseFloat(formData.price),
-        available_seats: parseInt(formData.available_seats, 10)
+        price: parseFloat(formData.price)
       };
       
       // Essayons un format alternatif si le premier échoue
@@ -132,8 +126,7 @@ export const ScheduleForm = () => {
         bus: parseInt(formData.bus, 10),
         departure_time: new Date(formData.departure_time).toISOString(),
         arrival_time: new Date(formData.arrival_time).toISOString(),
-        price: parseFloat(formData.price),
-        available_seats: parseInt(formData.available_seats, 10)
+        price: parseFloat(formData.price)
       };
       
       console.log("Tentative d'envoi des données:", alternateData);
@@ -309,6 +302,8 @@ export const ScheduleForm = () => {
                 </div>
               </div>
 
+              {/* Déduits de la capacité du car et des réservations : affichés, non modifiables */}
+              {isEditMode && (
               <div>
                 <label htmlFor="available_seats" className={`block text-sm font-medium ${darkMode ? 'text-gray-200' : 'text-gray-700'}`}>
                   Sièges disponibles
@@ -318,14 +313,13 @@ export const ScheduleForm = () => {
                     type="number"
                     name="available_seats"
                     id="available_seats"
-                    required
-                    min="1"
+                    readOnly
                     value={formData.available_seats}
-                    onChange={handleChange}
                     className={`shadow-sm focus:ring-blue-500 focus:border-blue-500 block w-full sm:text-sm border-gray-300 rounded-md ${darkMode ? 'bg-gray-700 text-white border-gray-600' : ''}`}
                   />
                 </div>
               </div>
+              )}
             </div>
 
             <div className="mt-6 flex items-center justify-end space-x-3">
@@ -2,11 +2,13 @@ import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { Link } from 'react-router-dom';
 import { useTheme } from '../../contexts/ThemeContext';
-import { scheduleService } from '../../services/api';
+import { fetchNextPage, scheduleService } from '../../services/api';
 
 export function ScheduleList() {
     const [schedules, setSchedules] = useState([]);
+    const [next, setNext] = useState(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState(null);
     const { darkMode } = useTheme();
 
@@ -16,8 +18,9 @@ export function ScheduleList() {
 
     const fetchSchedules = async () => {
         try {
-            const data = await scheduleService.getAll();
-            setSchedules(data);
+            const page = await scheduleService.getPage();
+            setSchedules(page.results);
+            setNext(page.next);
         } catch (err) {
             setError('Erreur lors du chargement des horaires');
             console.error(err);
@@ -26,6 +29,21 @@ export function ScheduleList() {
         }
     };
 
+    // Page suivante à la demande : la liste complète n'est jamais téléchargée d'un coup
+    const loadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const page = await fetchNextPage(next);
+            setSchedules(prev => [...prev, ...page.results]);
+            setNext(page.next);
+        } catch (err) {
+            setError('Erreur lors du chargement des horaires');
+            console.error(err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleDelete = async (id) => {
         if (window.confirm('Êtes-vous sûr de vouloir supprimer cet horaire ?')) {
             try {
@@ -156,6 +174,17 @@ export function ScheduleList() {
                                 </tbody>
                             </table>
                         </div>
+                        {next && (
+                            <div className="mt-4 text-center">
+                                <button
+                                    onClick={loadMore}
+                                    disabled={loadingMore}
+                                    className="px-4 py-2 text-sm font-medium rounded-md text-blue-600 border border-blue-600 hover:bg-blue-50 disabled:opacity-50"
+                                >
+                                    {loadingMore ? 'Chargement...' : 'Charger plus'}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 </div>
             </main>
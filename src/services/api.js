@@ -36,6 +36,37 @@ api.interceptors.response.use(
     }
 );
 
+// Catalogues (bus, lieux, trajets, utilisateurs), courts et utilisés par les formulaires :
+// on suit les liens `next` pour tout récupérer
+const fetchAll = async (url, params) => {
+    const results = [];
+    let response = await api.get(url, { params });
+    while (true) {
+        const data = response.data;
+        if (!data || !Array.isArray(data.results)) {
+            return data;
+        }
+        results.push(...data.results);
+        if (!data.next) {
+            return results;
+        }
+        response = await api.get(data.next);
+    }
+};
+
+// Horaires et réservations : une page à la fois, chargée à la demande.
+// Retourne { results, next } ; `next` (URL de la page suivante, null à la fin) est passé à fetchNextPage.
+const fetchPage = async (url, params) => {
+    const response = await api.get(url, { params });
+    const data = response.data;
+    if (!data || !Array.isArray(data.results)) {
+        return { results: data || [], next: null };
+    }
+    return { results: data.results, next: data.next };
+};
+
+export const fetchNextPage = (next) => fetchPage(next);
+
 // Services d'authentification
 export const authService = {
     login: async (credentials) => {
@@ -55,8 +86,7 @@ export const authService = {
 // Services pour les bus
 export const busService = {
     getAll: async () => {
-        const response = await api.get('/buses/');
-        return response.data;
+        return fetchAll('/buses/');
     },
     getById: async (id) => {
         const response = await api.get(`/buses/${id}/`);
@@ -79,8 +109,7 @@ export const busService = {
 // Services pour les locations
 export const locationService = {
     getAll: async () => {
-        const response = await api.get('/locations/');
-        return response.data;
+        return fetchAll('/locations/');
     },
     getById: async (id) => {
         const response = await api.get(`/locations/${id}/`);
@@ -106,9 +135,8 @@ export const locationService = {
 
 // Services pour les horaires
 export const scheduleService = {
-    getAll: async () => {
-        const response = await api.get('/schedules/');
-        return response.data;
+    getPage: async (params) => {
+        return fetchPage('/schedules/', params);
     },
     getById: async (id) => {
         const response = await api.get(`/schedules/${id}/`);
@@ -130,13 +158,11 @@ export const scheduleService = {
 
 // Services pour les réservations
 export const reservationService = {
-    getAll: async () => {
-        const response = await api.get('/reservations/');
-        return response.data;
+    getPage: async (params) => {
+        return fetchPage('/reservations/', params);
     },
-    getUserReservations: async () => {
-        const response = await api.get('/reservations/user/');
-        return response.data;
+    getUserReservations: async (params) => {
+        return fetchPage('/reservations/user/', params);
     },
     getById: async (id) => {
         const response = await api.get(`/reservations/${id}/`);
@@ -157,14 +183,17 @@ export const reservationService = {
     cancel: async (id) => {
         const response = await api.post(`/reservations/${id}/cancel/`);
         return response.data;
+    },
+    confirm: async (id) => {
+        const response = await api.post(`/reservations/${id}/confirm/`);
+        return response.data;
     }
 };
 
 // Services pour les utilisateurs
 export const userService = {
     getAll: async () => {
-        const response = await api.get('/users/');
-        return response.data;
+        return fetchAll('/users/');
     },
     getById: async (id) => {
         const response = await api.get(`/users/${id}/`);
@@ -199,8 +228,7 @@ export const searchService = {
         return response.data;
     },
     getAllRoutes: async () => {
-        const response = await api.get('/routes/');
-        return response.data;
+        return fetchAll('/routes/');
     },
     getRouteById: async (id) => {
         const response = await api.get(`/routes/${id}/`);
@@ -220,11 +248,53 @@ export const searchService = {
     }
 };
 
+// Synchronisation incrémentale d'une copie locale (buses, locations, routes, schedules, reservations)
+// `rows` : objet { id: ligne } ; retourne les lignes à jour et le jeton à conserver pour l'appel suivant.
+// Jeton expiré (410) : on repart de la liste complète.
+export const syncService = {
+    changes: async (resource, rows = {}, since = null) => {
+        const updated = { ...rows };
+        let watermark = since;
+        while (true) {
+            let response;
+            try {
+                response = await api.get(`/${resource}/changes/`, { params: watermark ? { since: watermark } : {} });
+            } catch (error) {
+                if (error.response?.status === 410 && watermark) {
+                    return syncService.changes(resource);
+                }
+                throw error;
+            }
+            const data = response.data;
+            data.deleted.forEach((id) => delete updated[id]);
+            data.changes.forEach((row) => { updated[row.id] = row; });
+            watermark = data.watermark;
+            if (!data.has_more) {
+                return { rows: updated, watermark };
+            }
+        }
+    }
+};
+
+// Places disponibles en direct (Server-Sent Events) pour une liste d'horaires
+// onSeats reçoit { id: places } ; retourne la fonction de fermeture du flux.
+export const pushService = {
+    watchSeats: (scheduleIds, onSeats) => {
+        const token = localStorage.getItem('token');
+        if (!token || !scheduleIds.length || typeof EventSource === 'undefined') {
+            return () => {};
+        }
+        const params = new URLSearchParams({ schedules: scheduleIds.slice(0, 100).join(','), token });
+        const source = new EventSource(`${API_URL}/push/seats/?${params}`);
+        source.addEventListener('seats', (event) => onSeats(JSON.parse(event.data)));
+        return () => source.close();
+    }
+};
+
 // Direct exports for components
-export const getReservations = async () => {
+export const getReservations = async (params) => {
     try {
-        const response = await api.get('/reservations/user/');
-        return response.data;
+        return await fetchPage('/reservations/user/', params);
     } catch (error) {
         console.error('Error fetching reservations:', error);
         throw error;
@@ -237,25 +307,33 @@ export const getUserProfile = async () => {
 };
 
 export const getBuses = async () => {
-    const response = await api.get('/buses/');
-    return response.data;
+    return fetchAll('/buses/');
 };
 
 export const getLocations = async () => {
-    const response = await api.get('/locations/');
-    return response.data;
+    return fetchAll('/locations/');
 };
 
-export const getSchedules = async () => {
+export const getSchedules = async (params) => {
     try {
-        const response = await api.get('/schedules/');
-        return response.data;
+        return await fetchPage('/schedules/', params);
     } catch (error) {
         console.error('Error fetching schedules:', error);
         throw error;
     }
 };
 
+export const getDashboardStats = async () => {
+    const response = await api.get('/stats/dashboard/');
+    return response.data;
+};
+
+// Utilisation de la flotte par car : { date_from, date_to } au format AAAA-MM-JJ (7 prochains jours par défaut)
+export const getFleetStats = async (params = {}) => {
+    const response = await api.get('/stats/fleet/', { params });
+    return response.data;
+};
+
 export const updateUserProfile = async (userData) => {
     try {
         const response = await api.patch('/users/profile/', userData);
@@ -266,13 +344,22 @@ export const updateUserProfile = async (userData) => {
     }
 };
 
-export const createReservation = async (reservationData) => {
-    try {
-        const response = await api.post('/reservations/', reservationData);
-        return response.data;
-    } catch (error) {
-        console.error('Error creating reservation:', error);
-        throw error;
+// Une clé Idempotency-Key par réservation : les renvois après une coupure réseau
+// (ou un 409, requête encore en cours) rejouent la première réponse sans doublon
+export const createReservation = async (reservationData, attempts = 3) => {
+    const headers = { 'Idempotency-Key': crypto.randomUUID() };
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await api.post('/reservations/', reservationData, { headers });
+            return response.data;
+        } catch (error) {
+            const retry = !error.response || error.response.status === 409;
+            if (!retry || attempt >= attempts) {
+                console.error('Error creating reservation:', error);
+                throw error;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 1000 * attempt));
+        }
     }
 };
 